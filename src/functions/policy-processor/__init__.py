@@ -1,290 +1,885 @@
 # azure-governance-guardian/src/functions/policy-processor/__init__.py
 
+import asyncio
+import atexit
 import json
 import logging
 import os
-import requests
+from typing import Dict, Iterable, List, Tuple, Union
 import azure.functions as func
-from azure.identity import DefaultAzureCredential
-from azure.mgmt.resourcegraph import ResourceGraphClient
-from azure.mgmt.automation import AutomationClient
-from msrestazure.azure_exceptions import CloudError
+from . import async_io, clients, metrics, rate_limit
+from .dedup import EventCoalescer, idempotency_key
+from .digest import create_notification_digest
+from .log_sink import create_log_sink
+from .models import MISSING_RESOURCE, NOT_AVAILABLE, PolicyEvent, ResourceSummary
+from .reconcile import Reconciler, parse_scopes
+from .resource_cache import ResourceDetailsCache
+from .retry_queue import create_retry_queue
+from .scheduler import create_scheduler, job_status_name
+from .routing import definition_name_from_id, load_routing_table, merge_projections, projection_columns
+from .state_store import InMemoryStateStore, create_state_store
 
 # Configure logging for the Azure Function
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Azure SDKs, requests and aiohttp are imported lazily (see clients.py) so a cold start
+# only pays for what the first batch of events actually needs.
+
 # Environment variables (set in Terraform)
 AUTOMATION_ACCOUNT_ID = os.environ.get('AUTOMATION_ACCOUNT_ID')
 LOG_ANALYTICS_WORKSPACE_ID = os.environ.get('LOG_ANALYTICS_WORKSPACE_ID') # Not directly used for sending logs, but for context
 SUBSCRIPTION_ID = os.environ.get('SUBSCRIPTION_ID')
 LOGIC_APP_HTTP_TRIGGER_URL = os.environ.get('LOGIC_APP_HTTP_TRIGGER_URL')
 
-# Initialize Azure SDK clients with Managed Identity
-# These clients will use the Function App's System-Assigned Managed Identity
+# Batch enrichment settings
+# Resource IDs are sent to Resource Graph in chunks of this size ('where id in~ (...)'),
+# and each chunk's results are paged with this page size (Resource Graph caps 'top' at 1000).
+RESOURCE_GRAPH_BATCH_SIZE = int(os.environ.get('RESOURCE_GRAPH_BATCH_SIZE', '100'))
+RESOURCE_GRAPH_PAGE_SIZE = int(os.environ.get('RESOURCE_GRAPH_PAGE_SIZE', '1000'))
+
+# In-process resource details cache (shared across invocations on a warm instance).
+# Set RESOURCE_CACHE_MAX_SIZE or RESOURCE_CACHE_TTL_SECONDS to 0 to disable caching.
+resource_details_cache = ResourceDetailsCache(
+    max_size=int(os.environ.get('RESOURCE_CACHE_MAX_SIZE', '5000')),
+    ttl_seconds=float(os.environ.get('RESOURCE_CACHE_TTL_SECONDS', '300'))
+)
+
+# Action kinds returned by build_policy_actions()
+RUNBOOK_ACTION = "runbook"
+NOTIFICATION_ACTION = "notification"
+
+# Policy routing table (routes.json + initiative metadata), compiled once per instance
+with clients.profiled("init:routing_table"):
+    routing_table = load_routing_table()
+
+def _create_state_store():
+    try:
+        return create_state_store()
+    except Exception as e:
+        logger.error(f"Failed to initialize state store, falling back to in-memory de-duplication: {e}")
+        return InMemoryStateStore()
+
+# Event coalescing / remediation idempotency (see dedup.py).
+# STATE_STORE_BACKEND=file|table shares de-duplication state across scaled-out instances.
+# The store (and its Table Storage connection) is created on the first event that needs it.
+clients.register('state_store', _create_state_store)
+# Handled violations are also marked for RECONCILE_SEEN_TTL_SECONDS so the reconciliation
+# sweep does not reprocess them (0 disables the markers).
+event_coalescer = EventCoalescer(
+    store_factory=lambda: clients.get('state_store'),
+    window_seconds=float(os.environ.get('DEDUP_WINDOW_SECONDS', '600')),
+    seen_ttl_seconds=float(os.environ.get('RECONCILE_SEEN_TTL_SECONDS', '172800'))
+)
+
+# Direct, batched ingestion into Log Analytics (Logs Ingestion API through a DCR
+# that targets LOG_ANALYTICS_WORKSPACE_ID). None when not configured.
+# The Managed Identity credential and HTTP session are only created on the first flush.
+# Records are shipped once LOGS_INGESTION_MAX_AGE_SECONDS old, by the batch or by _arm_sink_timer().
+log_sink = None
 try:
-    credential = DefaultAzureCredential()
-    resource_graph_client = ResourceGraphClient(credential, subscription_id=SUBSCRIPTION_ID)
-    # AutomationClient requires the base URL for the Automation Account
-    # You might need to derive this from AUTOMATION_ACCOUNT_ID or pass it as another env var
-    # For now, we'll assume we can create it with the subscription ID.
-    automation_client = AutomationClient(credential, SUBSCRIPTION_ID)
-    logger.info("Azure SDK clients initialized successfully.")
+    with clients.profiled("init:log_sink"):
+        log_sink = create_log_sink(clients.get_credential, clients.get_http_session)
+    if log_sink is not None:
+        atexit.register(log_sink.flush)
 except Exception as e:
-    logger.error(f"Failed to initialize Azure SDK clients: {e}")
-    # This might indicate a problem with Managed Identity setup or permissions.
-    # The function will still attempt to process events, but won't be able to use SDKs.
+    logger.error(f"Failed to initialize Log Analytics sink: {e}")
+_sink_timer = None
+
+# Runbook starts and notifications that still fail after in-line retries (see rate_limit.py)
+# are persisted here and re-driven in batches by drain_retry_queue().
+RUNBOOK_RETRY = "runbook"
+NOTIFICATION_RETRY = "notification"
+RETRY_DRAIN_BATCH_SIZE = int(os.environ.get('RETRY_DRAIN_BATCH_SIZE', '50'))
+retry_queue = create_retry_queue()
+
+# Notification digests (see digest.py): NonCompliant notifications are summarised per
+# (policy, resource group, severity) over NOTIFICATION_DIGEST_WINDOW_SECONDS instead of one
+# Logic App run per violation. Policies whose effect is in NOTIFICATION_IMMEDIATE_EFFECTS
+# (and routes with "immediate": true) bypass the window. Open groups are journaled in
+# NOTIFICATION_DIGEST_DIR at the end of each invocation (see settle_notification_digests()).
+notification_digest = create_notification_digest()
+IMMEDIATE_NOTIFICATION_EFFECTS = {
+    effect.strip().lower() for effect in os.environ.get('NOTIFICATION_IMMEDIATE_EFFECTS', 'deny').split(',') if effect.strip()
+}
+_digest_timer = None
+
+# The startup profile (POLICY_PROCESSOR_STARTUP_PROFILE=1) is logged after the first batch,
+# once the lazy imports and clients it needed have been created.
+_startup_profile_logged = False
 
 
 def log_compliance_event_to_la(log_data: dict):
     """
     Logs structured compliance event data.
-    In a production scenario, you'd send this to a custom Log Analytics table
-    using the Azure Monitor Data Collector API for better querying and reporting.
-    For simplicity in this example, we'll log it as a structured message
-    that can be parsed by Log Analytics.
+    When direct ingestion is configured (LOGS_INGESTION_ENDPOINT / LOGS_INGESTION_DCR_ID)
+    the record is buffered in the Log Analytics sink and shipped to the custom table
+    in compressed batches at the end of the invocation. Otherwise it is logged as a
+    structured message that can be parsed by Log Analytics.
     """
     try:
+        if log_sink is not None:
+            log_sink.add(log_data)
+            return
         # Log to Application Insights/Log Analytics via standard logging
         # Log Analytics will ingest this if configured for the Function App
         logger.info(f"ComplianceEvent: {json.dumps(log_data)}")
     except Exception as e:
         logger.error(f"Failed to log compliance event: {e}")
 
-def get_resource_details(resource_id: str) -> dict:
+def _chunked(items: List[str], size: int) -> Iterable[List[str]]:
+    """Yields successive fixed-size chunks from a list."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _query_resources_page(query: str, skip_token: str = None, subscriptions: List[str] = None,
+                          management_groups: List[str] = None) -> tuple:
     """
-    Fetches additional details about a resource using Azure Resource Graph.
-    This helps enrich the notification payload.
+    Runs one page of a Resource Graph query and returns (rows, next skip token).
+    Defaults to the Function's own subscription when no scope is given.
     """
-    try:
-        query = f"resources | where id == '{resource_id}'"
-        response = resource_graph_client.resources(query=query)
-        if response.data:
-            return response.data[0]
-        return {}
-    except CloudError as e:
-        logger.error(f"Resource Graph query failed for {resource_id}: {e.message}")
-        return {}
-    except Exception as e:
-        logger.error(f"An unexpected error occurred during Resource Graph query for {resource_id}: {e}")
-        return {}
+    models = clients.lazy_import('azure.mgmt.resourcegraph.models')
+    if subscriptions is None and management_groups is None and SUBSCRIPTION_ID:
+        subscriptions = [SUBSCRIPTION_ID]
+    request = models.QueryRequest(
+        subscriptions=subscriptions,
+        management_groups=management_groups,
+        query=query,
+        options=models.QueryRequestOptions(
+            top=RESOURCE_GRAPH_PAGE_SIZE,
+            skip_token=skip_token,
+            result_format="objectArray"
+        )
+    )
+    limiter = rate_limit.get_limiter('resource-graph')
+    response = rate_limit.call_with_retry(
+        'resource-graph', clients.get_resource_graph_client().resources, request,
+        raw_response_hook=limiter.response_hook
+    )
+    return response.data or [], response.skip_token
 
-def invoke_automation_runbook(runbook_name: str, parameters: dict):
+def _query_resources_paged(query: str) -> Iterable[dict]:
     """
-    Invokes an Azure Automation runbook.
-    Requires Automation Account ID and the Function App's Managed Identity
-    to have 'Automation Operator' role on the Automation Account.
+    Runs a Resource Graph query and yields result rows page by page,
+    following the skip token until the result set is exhausted.
     """
-    try:
-        # The AutomationClient needs the resource group name and automation account name
-        # You'll need to pass these as environment variables or derive them from AUTOMATION_ACCOUNT_ID
-        # For simplicity, let's assume a hardcoded or derived resource group name for the Automation Account
-        automation_account_rg = os.environ.get('AUTOMATION_ACCOUNT_RESOURCE_GROUP', 'rg-azgovguardian-common') # IMPORTANT: Adjust this if your AA is in a different RG
-        automation_account_name = os.environ.get('AUTOMATION_ACCOUNT_NAME', 'auto-azgovguardian') # IMPORTANT: Adjust this if your AA has a different name
+    skip_token = None
+    while True:
+        rows, skip_token = _query_resources_page(query, skip_token)
+        for row in rows:
+            yield row
+        if not skip_token:
+            break
 
-        logger.info(f"Attempting to start runbook '{runbook_name}' in Automation Account '{automation_account_name}' with parameters: {json.dumps(parameters)}")
+def get_resource_details_batch(resource_ids: List[str], event_times: Dict[str, str] = None,
+                               projections: Dict[str, Tuple[str, ...]] = None) -> Dict[str, ResourceSummary]:
+    """
+    Fetches details for many resources using Azure Resource Graph.
+    Resource IDs are de-duplicated and first looked up in the in-process cache;
+    the remainder are queried in chunks with one paged 'where id in~ (...) | project ...'
+    query per chunk, so the number of ARM calls grows with the number of
+    chunks rather than the number of events.
+    event_times optionally maps lower-cased resource IDs to the newest eventTime
+    seen for them; cached entries older than that event are refetched.
+    projections optionally maps lower-cased resource IDs to the project clauses
+    their routes need (see PolicyRoute.projection); other resources use the default
+    route's. A cached entry must hold its resource's columns; the misses are fetched
+    together with the union of their projections, so routes with extra columns
+    do not add queries.
+    Returns a dict keyed by lower-cased resource ID; resources that could not
+    be found (or whose chunk failed) are simply absent from the result.
+    """
+    unique_ids = list(dict.fromkeys(rid.lower() for rid in resource_ids if rid and rid != NOT_AVAILABLE))
+    event_times = event_times or {}
+    projections = projections or {}
+    default_projection = routing_table.default_route.projection
+    details_by_id = {}
+
+    ids_to_fetch = []
+    columns_by_projection: Dict[Tuple[str, ...], frozenset] = {}
+    for rid in unique_ids:
+        projection = projections.get(rid, default_projection)
+        columns = columns_by_projection.get(projection)
+        if columns is None:
+            columns = columns_by_projection[projection] = projection_columns(projection)
+        cached = resource_details_cache.get(rid, event_times.get(rid), columns)
+        if cached is not None:
+            details_by_id[rid] = cached
+        else:
+            ids_to_fetch.append(rid)
+    metrics.increment('enrichment.cache_hits', len(unique_ids) - len(ids_to_fetch))
+    metrics.increment('enrichment.cache_misses', len(ids_to_fetch))
+
+    if ids_to_fetch:
+        projection = merge_projections(*{projections.get(rid, default_projection): None for rid in ids_to_fetch})
+        columns = projection_columns(projection)
+        project_clause = ", ".join(projection)
+        for chunk in _chunked(ids_to_fetch, RESOURCE_GRAPH_BATCH_SIZE):
+            id_list = ", ".join("'" + rid.replace("'", "\\'") + "'" for rid in chunk)
+            query = f"resources | where id in~ ({id_list}) | project {project_clause}"
+            try:
+                with metrics.span('outbound.resource_graph'):
+                    for row in _query_resources_paged(query):
+                        row_id = row.get('id')
+                        if row_id:
+                            summary = ResourceSummary.from_row(row, columns)
+                            details_by_id[row_id.lower()] = summary
+                            resource_details_cache.put(row_id, summary)
+            except clients.azure_http_error() as e:
+                logger.error(f"Resource Graph batch query failed for {len(chunk)} resources: {e.message}")
+            except Exception as e:
+                logger.error(f"An unexpected error occurred during Resource Graph batch query for {len(chunk)} resources: {e}")
 
+    logger.info(f"Resource Graph enrichment resolved {len(details_by_id)} of {len(unique_ids)} resources "
+                f"({len(unique_ids) - len(ids_to_fetch)} from cache).")
+    return details_by_id
+
+def get_resource_details(resource_id: str, event_time: str = None, projection: Tuple[str, ...] = None) -> ResourceSummary:
+    """
+    Fetches additional details about a resource using Azure Resource Graph.
+    This helps enrich the notification payload. Returns MISSING_RESOURCE when
+    the resource cannot be resolved.
+    """
+    if not resource_id:
+        return MISSING_RESOURCE
+    key = resource_id.lower()
+    event_times = {key: event_time} if event_time else None
+    projections = {key: projection} if projection else None
+    return get_resource_details_batch([resource_id], event_times, projections).get(key, MISSING_RESOURCE)
+
+def _automation_account() -> tuple:
+    """Returns (resource group, account name) of the Automation Account."""
+    # The AutomationClient needs the resource group name and automation account name
+    # You'll need to pass these as environment variables or derive them from AUTOMATION_ACCOUNT_ID
+    # For simplicity, let's assume a hardcoded or derived resource group name for the Automation Account
+    automation_account_rg = os.environ.get('AUTOMATION_ACCOUNT_RESOURCE_GROUP', 'rg-azgovguardian-common') # IMPORTANT: Adjust this if your AA is in a different RG
+    automation_account_name = os.environ.get('AUTOMATION_ACCOUNT_NAME', 'auto-azgovguardian') # IMPORTANT: Adjust this if your AA has a different name
+    return automation_account_rg, automation_account_name
+
+def start_automation_job(runbook_name: str, job_name: str, parameters: dict):
+    """
+    Creates an Automation job under the shared 'automation' rate limiter, retrying
+    throttled / transient failures. Returns the job, or None if a job with this
+    (deterministic) name already exists. Other failures are raised.
+    """
+    automation_account_rg, automation_account_name = _automation_account()
+    logger.info(f"Attempting to start runbook '{runbook_name}' in Automation Account '{automation_account_name}' as job '{job_name}'.")
+    try:
         # Start the runbook job
         # Note: The 'start_job' method might vary slightly based on SDK version.
         # This is a conceptual call.
-        job = automation_client.jobs.create(
-            resource_group_name=automation_account_rg,
-            automation_account_name=automation_account_name,
-            job_name=f"{runbook_name}-{os.urandom(4).hex()}", # Unique job name
-            parameters=parameters
-        )
-        logger.info(f"Automation job '{job.name}' for runbook '{runbook_name}' started. Job ID: {job.id}")
+        with metrics.span('outbound.automation', runbook=runbook_name):
+            job = rate_limit.call_with_retry(
+                'automation', clients.get_automation_client().jobs.create,
+                resource_group_name=automation_account_rg,
+                automation_account_name=automation_account_name,
+                job_name=job_name,
+                parameters=parameters,
+                raw_response_hook=rate_limit.get_limiter('automation').response_hook
+            )
+    except clients.azure_http_error() as e:
+        if e.status_code == 409:
+            # Another instance created the same deterministic job name first
+            logger.info(f"Automation job '{job_name}' already exists. Skipping duplicate.")
+            return None
+        raise
+    logger.info(f"Automation job '{job.name}' for runbook '{runbook_name}' started. Job ID: {job.id}")
+    return job
+
+def get_automation_job_status(job_name: str) -> str:
+    """Returns the lower-cased status of an Automation job (e.g. 'running', 'completed', 'failed')."""
+    automation_account_rg, automation_account_name = _automation_account()
+    job = rate_limit.call_with_retry(
+        'automation-status', clients.get_automation_client().jobs.get,
+        resource_group_name=automation_account_rg,
+        automation_account_name=automation_account_name,
+        job_name=job_name
+    )
+    return job_status_name(job.status)
+
+def _post_logic_app_notification(body: str):
+    response = clients.get_http_session().post(
+        LOGIC_APP_HTTP_TRIGGER_URL, data=body.encode('utf-8'),
+        headers={"Content-Type": "application/json"}, timeout=async_io.HTTP_TIMEOUT_SECONDS
+    )
+    response.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
+    return response
+
+def send_logic_app_notification(payload: dict, queue_on_failure: bool = True):
+    """
+    Sends a notification payload to the Logic App HTTP trigger.
+    Throttled / transient failures are retried under the shared 'logic-app'
+    rate limiter; if they persist the notification is queued in the retry queue.
+
+    Returns True once the notification is delivered or durably queued for retry.
+    """
+    if not LOGIC_APP_HTTP_TRIGGER_URL:
+        logger.warning("LOGIC_APP_HTTP_TRIGGER_URL is not configured. Skipping Logic App notification.")
+        return False
+
+    try:
+        body = json.dumps(payload)
+        logger.info(f"Sending notification to Logic App: {body}")
+        with metrics.span('outbound.logic_app', policy=definition_name_from_id(payload.get('policyName'))):
+            response = rate_limit.call_with_retry('logic-app', _post_logic_app_notification, body)
+        metrics.increment('outbound.logic_app.bytes', len(body))
+        logger.info(f"Successfully sent notification to Logic App. Status: {response.status_code}")
         return True
-    except CloudError as e:
-        logger.error(f"Failed to invoke Automation runbook '{runbook_name}': {e.message}")
+    except clients.requests_error() as e:
+        logger.error(f"Failed to send notification to Logic App: {e}", exc_info=True)
+        if queue_on_failure and rate_limit.is_retryable(e):
+            return retry_queue.enqueue(NOTIFICATION_RETRY, payload, str(e))
         return False
     except Exception as e:
-        logger.error(f"An unexpected error occurred while invoking runbook '{runbook_name}': {e}", exc_info=True)
+        logger.error(f"An unexpected error occurred during Logic App notification: {e}", exc_info=True)
         return False
 
-def send_logic_app_notification(payload: dict):
+async def _start_scheduled_job(runbook_name: str, job_name: str, parameters: dict):
+    return await async_io.run_blocking('automation', start_automation_job, runbook_name, job_name, parameters)
+
+async def _get_scheduled_job_status(job_name: str) -> str:
+    return await async_io.run_blocking('automation-status', get_automation_job_status, job_name)
+
+def _requeue_runbook_jobs(jobs: list, error: Exception = None) -> bool:
     """
-    Sends a notification payload to the Logic App HTTP trigger.
+    Releases the idempotency claims of every job the scheduler could not start and
+    persists the ones submitted with requeue_on_failure in the retry queue: always
+    when they were deferred for lack of an Automation slot (error is None), and for
+    retryable start failures. Retry queue redrives are not re-enqueued here; the
+    drain reschedules their existing entry instead.
+    """
+    requeued = True
+    for job in jobs:
+        if job.job_key:
+            event_coalescer.release_job(job.job_key)
+        if not job.requeue_on_failure:
+            continue
+        if error is not None and not rate_limit.is_retryable(error):
+            requeued = False
+            continue
+        requeued = retry_queue.enqueue(RUNBOOK_RETRY, {
+            "runbook": job.runbook,
+            "parameters": job.parameters,
+            "jobKey": job.job_key,
+            "priority": job.priority,
+            "resourceId": job.resource_id,
+            "policyName": job.policy_name
+        }, str(error) if error is not None else "Deferred: no Automation job slot available.") and requeued
+    return requeued
+
+async def _requeue_scheduled_jobs(jobs: list, error: Exception = None) -> bool:
+    return await async_io.run_blocking('state-store', _requeue_runbook_jobs, jobs, error)
+
+# Remediation job scheduler (see scheduler.py): priority classes, per-runbook and
+# account-wide concurrency caps and multi-resource batch jobs, configured in the
+# 'runbooks' section of routes.json and the SCHEDULER_* / AUTOMATION_MAX_RUNNING_JOBS settings.
+remediation_scheduler = create_scheduler(
+    _start_scheduled_job, _get_scheduled_job_status, _requeue_scheduled_jobs, routing_table.runbooks
+)
+
+async def invoke_automation_runbook_async(runbook_name: str, parameters: dict, job_key: str = None,
+                                          queue_on_failure: bool = True, priority: str = None,
+                                          resource_id: str = None, policy_name: str = None):
+    """
+    Claims the job key and hands the runbook start to the remediation scheduler,
+    which starts it (possibly merged with other violations for the same runbook)
+    by priority within the Automation account's concurrency caps. The SDK calls
+    run on the I/O thread pool, capped by AUTOMATION_MAX_CONCURRENCY.
+    """
+    if job_key and not await async_io.run_blocking('state-store', event_coalescer.claim_job, job_key):
+        logger.info(f"Automation job for runbook '{runbook_name}' with key {job_key} already started. Skipping duplicate.")
+        return True
+    return await remediation_scheduler.submit(
+        runbook_name, parameters, job_key, priority, resource_id, policy_name, requeue_on_failure=queue_on_failure
+    )
+
+async def send_logic_app_notification_async(payload: dict, queue_on_failure: bool = True):
+    """
+    Sends a notification payload to the Logic App HTTP trigger over the pooled
+    aiohttp session, capped by LOGIC_APP_MAX_CONCURRENCY and paced by the shared
+    'logic-app' rate limiter. Persistent failures are queued in the retry queue.
+    Returns True once the notification is delivered or durably queued for retry.
     """
     if not LOGIC_APP_HTTP_TRIGGER_URL:
         logger.warning("LOGIC_APP_HTTP_TRIGGER_URL is not configured. Skipping Logic App notification.")
         return False
 
     try:
-        logger.info(f"Sending notification to Logic App: {json.dumps(payload)}")
-        response = requests.post(LOGIC_APP_HTTP_TRIGGER_URL, json=payload, timeout=10)
-        response.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
-        logger.info(f"Successfully sent notification to Logic App. Status: {response.status_code}")
+        body = json.dumps(payload)
+        logger.info(f"Sending notification to Logic App: {body}")
+        with metrics.span('outbound.logic_app', policy=definition_name_from_id(payload.get('policyName'))):
+            status = await rate_limit.call_with_retry_async(
+                'logic-app', async_io.post_json, 'logic-app', LOGIC_APP_HTTP_TRIGGER_URL, body
+            )
+        metrics.increment('outbound.logic_app.bytes', len(body))
+        logger.info(f"Successfully sent notification to Logic App. Status: {status}")
         return True
-    except requests.exceptions.RequestException as e:
+    except async_io.http_errors() as e:
         logger.error(f"Failed to send notification to Logic App: {e}", exc_info=True)
+        if queue_on_failure and rate_limit.is_retryable(e):
+            return await async_io.run_blocking('state-store', retry_queue.enqueue, NOTIFICATION_RETRY, payload, str(e))
         return False
     except Exception as e:
         logger.error(f"An unexpected error occurred during Logic App notification: {e}", exc_info=True)
         return False
 
-def main(event: func.EventGridEvent):
+def flush_notification_digests(force: bool = False) -> int:
     """
-    Main entry point for the Azure Function.
-    Processes Event Grid events from Azure Policy evaluations.
+    Sends the due (with force, all) notification digests one after another.
+    Returns the number of payloads delivered or queued; failures are queued like single notifications.
     """
-    logger.info(f"Python Event Grid trigger function processed an event: {event.id}")
+    payloads = notification_digest.take_all() if force else notification_digest.take_due()
+    sent = sum(1 for payload in payloads if send_logic_app_notification(payload))
+    if payloads:
+        logger.info(f"Sent or queued {sent} of {len(payloads)} notification digest payload(s).")
+        notification_digest.save()
+    return sent
 
+async def flush_notification_digests_async(force: bool = False) -> int:
+    """Async variant of flush_notification_digests(); the digests are posted concurrently."""
+    payloads = notification_digest.take_all() if force else notification_digest.take_due()
+    if not payloads:
+        return 0
+    results = await asyncio.gather(*(send_logic_app_notification_async(payload) for payload in payloads))
+    sent = sum(1 for result in results if result)
+    logger.info(f"Sent or queued {sent} of {len(payloads)} notification digest payload(s).")
+    await async_io.run_blocking('state-store', notification_digest.save)
+    return sent
+
+async def settle_notification_digests():
+    """
+    Sends the due digests and persists the open ones in the digest journal
+    (merging in those of recycled instances), then arms the flush timer.
+    Runs at the end of every invocation, before the host is told it succeeded.
+    """
+    if notification_digest.flush_due:
+        with metrics.span('stage.digest'):
+            await flush_notification_digests_async()
+    await async_io.run_blocking('state-store', notification_digest.save)
+    _arm_digest_timer()
+
+async def _flush_digests_later(delay: float):
+    global _digest_timer
+    await asyncio.sleep(delay)
     try:
-        event_data = event.get_json()
-
-        # Extract core information from the Event Grid event (Activity Log format)
-        resource_id = event_data.get('subject', 'N/A')
-        policy_assignment_id = event_data.get('data', {}).get('policyAssignmentId', 'N/A')
-        policy_definition_id = event_data.get('data', {}).get('policyDefinitionId', 'N/A')
-        compliance_state = event_data.get('data', {}).get('complianceState', 'N/A') # e.g., 'Compliant', 'NonCompliant'
-        policy_effect = event_data.get('data', {}).get('policyDefinitionEffect', 'N/A') # e.g., 'audit', 'deny', 'deployIfNotExists'
-        event_time = event_data.get('eventTime', 'N/A')
-        correlation_id = event_data.get('data', {}).get('correlationId', 'N/A')
-
-        logger.info(f"Processing policy event for Resource: {resource_id}, Policy: {policy_definition_id}, State: {compliance_state}")
-
-        # Prepare base log data for Log Analytics
-        base_log_data = {
-            "TimeGenerated": event_time,
-            "ResourceId": resource_id,
-            "PolicyAssignmentId": policy_assignment_id,
-            "PolicyDefinitionId": policy_definition_id,
-            "ComplianceState": compliance_state,
-            "PolicyEffect": policy_effect,
-            "CorrelationId": correlation_id,
-            "Source": "AzureGovernanceGuardian",
-            "EventType": "PolicyEvaluation"
-        }
+        await flush_notification_digests_async()
+    except Exception as e:
+        logger.error(f"Failed to flush notification digests: {e}", exc_info=True)
+    _digest_timer = None
+    _arm_digest_timer()
+
+def _arm_digest_timer():
+    """
+    Schedules a flush for when the oldest open digest group is due, so a warm
+    instance sends it even if no further events arrive.
+    """
+    global _digest_timer
+    if _digest_timer is not None and not _digest_timer.done():
+        return
+    delay = notification_digest.seconds_until_due()
+    _digest_timer = asyncio.ensure_future(_flush_digests_later(delay)) if delay is not None else None
+
+# Digests still open when the worker shuts down are sent rather than dropped
+atexit.register(flush_notification_digests, True)
+
+async def _flush_sink_later(delay: float):
+    global _sink_timer
+    await asyncio.sleep(delay)
+    try:
+        await async_io.run_blocking('log-analytics', log_sink.flush_if_due)
+    except Exception as e:
+        logger.error(f"Failed to flush compliance records to Log Analytics: {e}", exc_info=True)
+    _sink_timer = None
+    _arm_sink_timer()
+
+def _arm_sink_timer():
+    """
+    Schedules a flush for when the oldest buffered compliance record reaches
+    LOGS_INGESTION_MAX_AGE_SECONDS, so a warm instance ships it even if no
+    further events arrive.
+    """
+    global _sink_timer
+    if _sink_timer is not None and not _sink_timer.done():
+        return
+    delay = log_sink.seconds_until_due()
+    _sink_timer = asyncio.ensure_future(_flush_sink_later(delay)) if delay is not None else None
+
+async def drain_retry_queue(max_items: int = RETRY_DRAIN_BATCH_SIZE) -> int:
+    """
+    Re-drives up to max_items due entries from the retry queue concurrently
+    (still bounded by the per-target caps and rate limiters). Entries that fail
+    again are rescheduled with backoff. Returns the number that succeeded.
+    """
+    entries = await async_io.run_blocking('state-store', retry_queue.claim_due, max_items)
+    if not entries:
+        return 0
+
+    async def redrive(entry: dict) -> bool:
+        payload = entry.get("payload", {})
+        if entry.get("kind") == RUNBOOK_RETRY:
+            return await invoke_automation_runbook_async(
+                payload.get("runbook"), payload.get("parameters"), payload.get("jobKey"), queue_on_failure=False,
+                priority=payload.get("priority"), resource_id=payload.get("resourceId"), policy_name=payload.get("policyName")
+            )
+        return await send_logic_app_notification_async(payload, queue_on_failure=False)
 
-        # --- Conditional Logic for Remediation / Notification ---
-        if compliance_state == "NonCompliant":
-            # Get enriched resource details for notifications/remediation context
-            resource_details = get_resource_details(resource_id)
-            logger.info(f"Enriched resource details: {json.dumps(resource_details)}")
-
-            # Add enriched details to log data
-            enriched_log_data = {**base_log_data, "ResourceDetails": resource_details}
-            log_compliance_event_to_la(enriched_log_data)
-
-            # --- Policy-specific actions ---
-
-            # 1. Enforce Mandatory Tags (Audit/Modify effect)
-            if "enforce-mandatory-tags" in policy_definition_id:
-                logger.info(f"Non-compliant: Missing mandatory tag for {resource_id}. Triggering remediation.")
-                # Assuming the policy definition itself has a 'modify' effect that adds tags,
-                # or we trigger an Automation runbook.
-                # If using Automation runbook for remediation:
-                # invoke_automation_runbook(
-                #     runbook_name="remediate-missing-tags",
-                #     parameters={
-                #         "WebhookData": json.dumps({
-                #             "resourceId": resource_id,
-                #             "policyName": policy_definition_id,
-                #             "missingTagKey": "Environment" # Or derive from policy details
-                #         })
-                #     }
-                # )
-                # Send a basic notification about remediation attempt
-                send_logic_app_notification({
-                    "resourceId": resource_id,
-                    "policyName": policy_definition_id,
-                    "complianceState": compliance_state,
-                    "message": "Resource is missing mandatory tags. Remediation initiated.",
-                    "vmName": resource_details.get('name'), # Pass basic details if available
-                    "resourceGroup": resource_details.get('resourceGroup'),
-                    "location": resource_details.get('location')
-                })
-
-            # 2. Deny Public IP on Specific Subnets (Deny effect)
-            elif "deny-public-ip-on-subnets" in policy_definition_id:
-                logger.info(f"Non-compliant: Attempted Public IP on sensitive subnet for {resource_id}. Policy denied deployment.")
-                # No remediation needed as it was denied. Just alert.
-                send_logic_app_notification({
-                    "resourceId": resource_id,
-                    "policyName": policy_definition_id,
-                    "complianceState": compliance_state,
-                    "message": "Attempted to deploy Public IP on a sensitive subnet. Deployment was DENIED by policy. No remediation needed.",
-                    "vmName": resource_details.get('name'),
-                    "resourceGroup": resource_details.get('resourceGroup'),
-                    "location": resource_details.get('location')
-                })
-
-            # 3. Enforce Allowed Locations (Deny effect)
-            elif "enforce-allowed-locations" in policy_definition_id:
-                logger.info(f"Non-compliant: Resource deployed in unauthorized location for {resource_id}. Policy denied deployment.")
-                # No remediation needed as it was denied. Just alert.
-                send_logic_app_notification({
-                    "resourceId": resource_id,
-                    "policyName": policy_definition_id,
-                    "complianceState": compliance_state,
-                    "message": "Resource deployed in an unauthorized location. Deployment was DENIED by policy. No remediation needed.",
-                    "vmName": resource_details.get('name'),
-                    "resourceGroup": resource_details.get('resourceGroup'),
-                    "location": resource_details.get('location')
-                })
-
-            # 4. Enforce Storage Account HTTPS Only (Audit/Modify effect)
-            elif "enforce-storage-https-only" in policy_definition_id:
-                logger.info(f"Non-compliant: Storage Account not enforcing HTTPS-only for {resource_id}. Triggering remediation.")
-                # Trigger Automation runbook for remediation
-                invoke_automation_runbook(
-                    runbook_name="enforce-storage-https-only",
-                    parameters={
-                        "WebhookData": json.dumps({
-                            "resourceId": resource_id,
-                            "policyName": policy_definition_id
-                        })
-                    }
-                )
-                # Send a notification about remediation attempt
-                send_logic_app_notification({
-                    "resourceId": resource_id,
-                    "policyName": policy_definition_id,
-                    "complianceState": compliance_state,
-                    "message": "Storage Account not enforcing HTTPS-only. Remediation initiated.",
-                    "vmName": resource_details.get('name'), # This might be a storage account name, adapt schema
-                    "resourceGroup": resource_details.get('resourceGroup'),
-                    "location": resource_details.get('location')
-                })
-
-            # 5. Audit VM Size Restrictions (Audit effect)
-            elif "audit-vm-size-restrictions" in policy_definition_id:
-                logger.info(f"Non-compliant: VM size restriction violation for {resource_id}. Triggering enhanced notification.")
-                # Trigger the enhanced notification runbook
-                invoke_automation_runbook(
-                    runbook_name="get-vm-details-and-notify",
-                    parameters={
-                        "WebhookData": json.dumps({
-                            "resourceId": resource_id,
-                            "policyName": policy_definition_id,
-                            "complianceState": compliance_state,
-                            "message": "VM size is not compliant with organizational standards. Please review."
-                        }),
-                        "LogicAppWebhookUrl": LOGIC_APP_HTTP_TRIGGER_URL # Pass Logic App URL to runbook
-                    }
-                )
-                # Note: The Logic App notification is handled by the runbook in this case.
-                # No direct Logic App call from here to avoid duplicate notifications.
-
-            # Default action for any other non-compliant policy (if not specifically handled above)
-            else:
-                logger.info(f"Non-compliant: Unhandled policy {policy_definition_id} for {resource_id}. Sending generic notification.")
-                send_logic_app_notification({
-                    "resourceId": resource_id,
-                    "policyName": policy_definition_id,
-                    "complianceState": compliance_state,
-                    "message": f"Resource is non-compliant with policy {policy_definition_id}. Manual review required.",
-                    "vmName": resource_details.get('name'),
-                    "resourceGroup": resource_details.get('resourceGroup'),
-                    "location": resource_details.get('location')
-                })
+    results = await asyncio.gather(*(redrive(entry) for _, entry in entries), return_exceptions=True)
+    succeeded = 0
+    for (claim_path, entry), result in zip(entries, results):
+        if result is True:
+            succeeded += 1
+            await async_io.run_blocking('state-store', retry_queue.complete, claim_path)
         else:
-            # Log compliant events as well, but no action needed
-            log_compliance_event_to_la(base_log_data)
-            logger.info(f"Resource {resource_id} is Compliant with policy {policy_definition_id}.")
+            error = str(result) if isinstance(result, Exception) else "retry failed"
+            await async_io.run_blocking('state-store', retry_queue.reschedule, claim_path, entry, error)
+    metrics.increment('retry_queue.drained', succeeded)
+    logger.info(f"Retry queue drain: {succeeded} of {len(entries)} queued actions succeeded. Stats: {json.dumps(retry_queue.stats())}")
+    return succeeded
+
+def build_policy_actions(event: Union[PolicyEvent, dict], resource: ResourceSummary = None) -> List[tuple]:
+    """
+    Logs a single policy evaluation event and works out the per-policy
+    remediation / notification actions it calls for.
+    Returns a list of (RUNBOOK_ACTION, runbook_name, parameters, job_key, priority)
+    and (NOTIFICATION_ACTION, payload, digest) tuples, where digest is
+    (severity, policy display name) for notifications to aggregate into a digest
+    and None for ones to send immediately; the caller decides how to run them.
+    resource is the pre-fetched, projected Resource Graph row for the event's
+    resource (see get_resource_details_batch); when it is None the details
+    are looked up individually.
+    """
+    if not isinstance(event, PolicyEvent):
+        event = PolicyEvent.from_event(event)
+    actions = []
+    resource_id = event.resource_id or NOT_AVAILABLE
+    policy_definition_id = event.policy_definition_id or NOT_AVAILABLE
+    compliance_state = event.compliance_state or NOT_AVAILABLE
+
+    logger.info(f"Processing policy event for Resource: {resource_id}, Policy: {policy_definition_id}, State: {compliance_state}")
+
+    # --- Conditional Logic for Remediation / Notification ---
+    if event.non_compliant:
+        # Actions are looked up in the routing table compiled from routes.json and the
+        # initiative at startup; unknown policies get the default (generic notification) route.
+        # Batches resolve the route before enrichment, so only its projected columns are fetched.
+        route = event.route or routing_table.resolve(event.policy_definition_id, event.policy_reference_id)
+        if resource is None:
+            resource = get_resource_details(event.resource_id, event.event_time, route.projection)
+
+        # The record (with the projected details) is serialized once, by the sink or the log line
+        log_compliance_event_to_la(event.log_record(resource))
 
+        # --- Policy-specific actions ---
+        fields = {
+            "resourceId": resource_id,
+            "policyName": policy_definition_id,
+            "policyDisplayName": route.display_name or policy_definition_id,
+            "complianceState": compliance_state,
+            "policyEffect": event.policy_effect or NOT_AVAILABLE,
+            "resourceName": resource.name,
+            "resourceGroup": resource.resource_group,
+            "location": resource.location
+        }
+        # Any other projected column (e.g. vmSize) is available to the route's templates
+        for column in route.projected_columns:
+            fields.setdefault(column, resource.get(column))
+        if route.log_message:
+            logger.info(route.render(route.log_message, fields))
+
+        if route.runbook:
+            webhook_data = {
+                "resourceId": resource_id,
+                "policyName": policy_definition_id,
+                "complianceState": compliance_state
+            }
+            if route.runbook_message:
+                webhook_data["message"] = route.render(route.runbook_message, fields)
+            runbook_parameters = {"WebhookData": json.dumps(webhook_data)}
+            if route.pass_logic_app_url:
+                # The runbook sends its own (enhanced) notification
+                runbook_parameters["LogicAppWebhookUrl"] = LOGIC_APP_HTTP_TRIGGER_URL
+            job_key = idempotency_key(route.runbook, resource_id, policy_definition_id, event.correlation_id or NOT_AVAILABLE)
+            actions.append((RUNBOOK_ACTION, route.runbook, runbook_parameters, job_key, route.priority))
+
+        if route.notification_message:
+            immediate = route.notification_immediate
+            if immediate is None:
+                immediate = (event.policy_effect or route.effect or '').lower() in IMMEDIATE_NOTIFICATION_EFFECTS
+            digest = None if immediate or not notification_digest.enabled else (route.notification_severity, route.display_name)
+            actions.append((NOTIFICATION_ACTION, {
+                "resourceId": resource_id,
+                "policyName": policy_definition_id,
+                "complianceState": compliance_state,
+                "message": route.render(route.notification_message, fields),
+                "vmName": resource.name, # Kept for the Logic App schema; holds any resource's name
+                "resourceGroup": resource.resource_group,
+                "location": resource.location
+            }, digest))
+    else:
+        # Log compliant events as well, but no action needed
+        log_compliance_event_to_la(event.log_record())
+        logger.info(f"Resource {resource_id} is Compliant with policy {policy_definition_id}.")
+
+    return actions
+
+async def process_policy_event_async(event: PolicyEvent, resource: ResourceSummary = None) -> bool:
+    """
+    Routes a single policy evaluation event to the per-policy remediation /
+    notification logic. The runbook start (through remediation_scheduler) and the
+    Logic App notification for an event are issued concurrently.
+    Digested notifications are only buffered; process_event_batch() flushes them.
+    Returns True when every action was carried out or durably queued for retry.
+    """
+    try:
+        with metrics.span('event', policy=event.definition_name, complianceState=event.compliance_state) as span:
+            calls = []
+            for action in build_policy_actions(event, resource):
+                if action[0] == RUNBOOK_ACTION:
+                    calls.append(invoke_automation_runbook_async(
+                        action[1], action[2], action[3], priority=action[4],
+                        resource_id=event.resource_id, policy_name=event.policy_definition_id
+                    ))
+                elif action[2] is not None:
+                    notification_digest.add(action[1], *action[2])
+                else:
+                    calls.append(send_logic_app_notification_async(action[1]))
+            results = await asyncio.gather(*calls)
+            if not all(results):
+                span.set('outcome', 'action_failed')
+                return False
+            return True
     except Exception as e:
         logger.error(f"An unhandled error occurred in the Policy Processor Function: {e}", exc_info=True)
-        # Consider sending an alert for function failures as well.
+        return False
+
+
+def coalesce_events(events: List[PolicyEvent]) -> List[PolicyEvent]:
+    """
+    Drops NonCompliant events whose (resource ID, policy definition, correlationId)
+    was already admitted within DEDUP_WINDOW_SECONDS, in this batch or (with a
+    shared state store) on another instance. Compliant events always pass through.
+    """
+    admitted = []
+    for event in events:
+        if event.non_compliant and not event_coalescer.admit(event.resource_id, event.policy_definition_id, event.correlation_id):
+            logger.info(f"Coalesced duplicate policy event for Resource: {event.resource_id}, Policy: {event.policy_definition_id}")
+            continue
+        admitted.append(event)
+    return admitted
+
+def settle_events(handled: List[PolicyEvent], failed: List[PolicyEvent]):
+    """
+    Records the outcome of routed NonCompliant events: handled violations are
+    marked seen for the reconciliation sweep, and failed events release their
+    coalescing claim so a redelivery or the next sweep can process them again.
+    """
+    for event in handled:
+        event_coalescer.mark_seen(event.resource_id, event.policy_definition_id, event.event_time)
+    for event in failed:
+        event_coalescer.release_event(event.resource_id, event.policy_definition_id, event.correlation_id)
+
+async def process_event_batch(events: List[PolicyEvent]):
+    """
+    Runs a batch of parsed policy events through coalescing, batched Resource
+    Graph enrichment and routing. Shared by the Event Grid webhook and the
+    reconciliation sweep, so both follow the same remediation / notification rules.
+    Returns the NonCompliant events whose actions neither completed nor were
+    durably queued; only the others are marked seen (see settle_events()).
+    """
+    if event_coalescer.enabled:
+        with metrics.span('stage.coalesce'):
+            parsed_count = len(events)
+            events = await async_io.run_blocking('state-store', coalesce_events, events)
+        metrics.increment('events.coalesced', parsed_count - len(events))
+
+    # Resolve each NonCompliant event's route once, and collect its resource along with
+    # the newest eventTime seen for it (so stale cache entries are refreshed before
+    # routing) and the columns its routes project.
+    latest_event_times = {}
+    projections = {}
+    for event in events:
+        if not event.non_compliant:
+            continue
+        event.route = routing_table.resolve(event.policy_definition_id, event.policy_reference_id)
+        key = event.resource_key
+        if key is None:
+            continue
+        event_time = event.event_time
+        previous = latest_event_times.get(key)
+        if key not in latest_event_times or (event_time and (not previous or event_time > previous)):
+            latest_event_times[key] = event_time
+        projection = projections.get(key)
+        if projection is None:
+            projections[key] = event.route.projection
+        elif projection is not event.route.projection:
+            projections[key] = merge_projections(projection, event.route.projection)
+
+    resources_by_id = {}
+    if latest_event_times:
+        with metrics.span('stage.enrich'):
+            resources_by_id = await async_io.run_blocking(
+                'resource-graph', get_resource_details_batch, list(latest_event_times), latest_event_times, projections
+            )
+
+    with metrics.span('stage.route'):
+        results = await asyncio.gather(*(
+            process_policy_event_async(event, resources_by_id.get(event.resource_key, MISSING_RESOURCE))
+            for event in events
+        ))
+
+    handled, failed = [], []
+    for event, result in zip(events, results):
+        if event.non_compliant:
+            (handled if result else failed).append(event)
+    if handled or failed:
+        metrics.increment('events.failed', len(failed))
+        await async_io.run_blocking('state-store', settle_events, handled, failed)
+
+    await settle_notification_digests()
+
+    if log_sink is not None:
+        if log_sink.flush_due:
+            with metrics.span('stage.flush'):
+                await async_io.run_blocking('log-analytics', log_sink.flush_if_due)
+        _arm_sink_timer()
+    return failed
+
+async def _await_drain(drain: asyncio.Future):
+    try:
+        await drain
+    except Exception as e:
+        logger.error(f"Retry queue drain failed: {e}", exc_info=True)
+
+def _log_invocation_stats():
+    logger.info(f"Resource details cache stats: {json.dumps(resource_details_cache.stats())}")
+    logger.info(f"Event coalescing stats: {json.dumps(event_coalescer.stats())}")
+    logger.info(f"Rate limiter stats: {json.dumps(rate_limit.limiter_stats())}")
+    logger.info(f"Remediation scheduler stats: {json.dumps(remediation_scheduler.stats())}")
+    logger.info(f"Notification digest stats: {json.dumps(notification_digest.stats())}")
+    # Hit counts accumulate over the instance's lifetime, so 'neverMatched' narrows down as events arrive
+    logger.info(f"Policy routing coverage: {json.dumps(routing_table.coverage_report())}")
+
+    if metrics.enabled() and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Metrics snapshot: {json.dumps(metrics.snapshot())}")
+
+    global _startup_profile_logged
+    if clients.STARTUP_PROFILE_ENABLED and not _startup_profile_logged:
+        _startup_profile_logged = True
+        logger.info(f"Startup profile (ms): {json.dumps(clients.startup_profile())}")
+
+# Event Grid posts this when a subscription to an Event Grid schema webhook is created
+SUBSCRIPTION_VALIDATION_EVENT = "Microsoft.EventGrid.SubscriptionValidationEvent"
+
+def _event_grid_handshake(req: func.HttpRequest) -> func.HttpResponse:
+    """Answers the CloudEvents v1.0 webhook abuse-protection handshake (an OPTIONS request)."""
+    origin = req.headers.get('WebHook-Request-Origin')
+    if not origin:
+        return func.HttpResponse(status_code=400)
+    logger.info(f"Accepting Event Grid webhook validation from origin {origin}.")
+    return func.HttpResponse(status_code=200, headers={"WebHook-Allowed-Origin": origin, "WebHook-Allowed-Rate": "*"})
+
+async def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Main entry point for the Azure Function: the webhook the Event Grid subscription
+    delivers Azure Policy evaluation events to (Event Grid or CloudEvents v1.0 schema).
+    Event Grid posts a JSON array of up to max_events_per_batch events per request;
+    the Event Grid trigger binding would invoke the function once per event instead,
+    so the batch is received over HTTP (see function.json).
+    Resource details for all NonCompliant events in the batch are fetched up
+    front with batched Resource Graph queries, then every event is routed
+    through process_policy_event_async() concurrently; per-target caps in
+    async_io keep the Automation account and Logic App from being flooded.
+    Each stage and outbound call is timed into the metrics exporter (see metrics.py),
+    and previously failed actions due for retry are re-driven alongside the batch.
+    """
+    if req.method == 'OPTIONS':
+        return _event_grid_handshake(req)
+    try:
+        events = req.get_json()
+    except ValueError:
+        logger.error("Rejected Event Grid delivery: the request body is not JSON.")
+        return func.HttpResponse("Expected a JSON array of Event Grid events.", status_code=400)
+    if isinstance(events, dict):
+        events = [events]
+    if not isinstance(events, list):
+        logger.error(f"Rejected Event Grid delivery: expected a JSON array, got {type(events).__name__}.")
+        return func.HttpResponse("Expected a JSON array of Event Grid events.", status_code=400)
+
+    for event in events:
+        if isinstance(event, dict) and event.get('eventType') == SUBSCRIPTION_VALIDATION_EVENT:
+            validation_code = (event.get('data') or {}).get('validationCode')
+            logger.info("Answering Event Grid subscription validation.")
+            return func.HttpResponse(json.dumps({"validationResponse": validation_code}), status_code=200,
+                                     mimetype="application/json")
+
+    logger.info(f"Python Event Grid webhook function received a batch of {len(events)} events.")
+
+    with metrics.span('invocation'):
+        metrics.increment('events.received', len(events))
+
+        with metrics.span('stage.parse'):
+            parsed_events = []
+            for event in events:
+                try:
+                    parsed_events.append(PolicyEvent.from_event(event))
+                except Exception as e:
+                    metrics.increment('events.parse_errors')
+                    logger.error(f"Failed to parse Event Grid event {event.get('id') if isinstance(event, dict) else event!r}: {e}", exc_info=True)
+
+        # Due retry-queue entries are re-driven in the background while this batch is processed
+        drain = asyncio.ensure_future(drain_retry_queue()) if retry_queue.has_due() else None
+
+        await process_event_batch(parsed_events)
+
+        if drain is not None:
+            await _await_drain(drain)
+
+    _log_invocation_stats()
+    return func.HttpResponse(status_code=200)
+
+async def _fetch_policy_states_page(scope, query: str, skip_token: str = None) -> tuple:
+    with metrics.span('outbound.resource_graph', scope=scope.kind):
+        return await async_io.run_blocking(
+            'resource-graph', _query_resources_page, query, skip_token, **scope.request_scope()
+        )
+
+# Reconciliation sweep (see reconcile.py): re-reads NonCompliant policy states from
+# Resource Graph for RECONCILE_SCOPES (subscription IDs and/or 'mg:<management group>')
+# and routes the ones the live Event Grid path missed.
+reconciler = Reconciler(
+    fetch_page=_fetch_policy_states_page,
+    process_batch=process_event_batch,
+    coalescer=event_coalescer,
+    run_blocking=async_io.run_blocking,
+    routed_keys=routing_table.routed_keys if os.environ.get('RECONCILE_ROUTED_ONLY', 'true').lower() == 'true' else None,
+    batch_size=int(os.environ.get('RECONCILE_BATCH_SIZE', '100')),
+    max_parallel=int(os.environ.get('RECONCILE_MAX_PARALLEL', '4')),
+    overlap_seconds=float(os.environ.get('RECONCILE_OVERLAP_SECONDS', '900')),
+    initial_lookback_seconds=float(os.environ.get('RECONCILE_INITIAL_LOOKBACK_SECONDS', '86400'))
+)
+
+async def reconcile(timer: func.TimerRequest):
+    """
+    Timer-triggered entry point (policy-reconciler/function.json) for the
+    reconciliation sweep. Each scope is swept in parallel and only advances
+    its watermark when the sweep completes.
+    """
+    scopes = parse_scopes(os.environ.get('RECONCILE_SCOPES'), SUBSCRIPTION_ID)
+    if not scopes:
+        logger.warning("No RECONCILE_SCOPES or SUBSCRIPTION_ID configured. Skipping reconciliation.")
+        return
+    if timer is not None and timer.past_due:
+        logger.warning("Reconciliation timer is running late.")
 
+    logger.info(f"Starting reconciliation sweep over {len(scopes)} scope(s).")
+    with metrics.span('reconcile'):
+        results = await reconciler.run(scopes)
+        # Also picks up the digests of recycled instances when no events arrive
+        await settle_notification_digests()
+        if retry_queue.has_due():
+            await _await_drain(asyncio.ensure_future(drain_retry_queue()))
+    for result in results:
+        metrics.increment('reconcile.scanned', result["scanned"])
+        metrics.increment('reconcile.reprocessed', result["reprocessed"])
+    logger.info(f"Reconciliation results: {json.dumps(results)}")
+    _log_invocation_stats()
@@ -0,0 +1,118 @@
+# azure-governance-guardian/src/functions/policy-processor/async_io.py
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+# Connection pool / timeout settings for outbound HTTP (Logic App)
+HTTP_TIMEOUT_SECONDS = float(os.environ.get('HTTP_TIMEOUT_SECONDS', '10'))
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '100'))
+
+# Maximum number of in-flight calls per remote target.
+# Blocking calls (Automation, Resource Graph, state store, log ingestion) run on a dedicated thread pool
+# sized to the sum of the blocking targets' caps.
+TARGET_CONCURRENCY = {
+    'logic-app': int(os.environ.get('LOGIC_APP_MAX_CONCURRENCY', '16')),
+    'automation': int(os.environ.get('AUTOMATION_MAX_CONCURRENCY', '8')),
+    'automation-status': int(os.environ.get('AUTOMATION_STATUS_MAX_CONCURRENCY', '4')),
+    'resource-graph': int(os.environ.get('RESOURCE_GRAPH_MAX_CONCURRENCY', '4')),
+    'state-store': int(os.environ.get('STATE_STORE_MAX_CONCURRENCY', '4')),
+    'log-analytics': int(os.environ.get('LOGS_INGESTION_MAX_CONCURRENCY', '2')),
+}
+DEFAULT_TARGET_CONCURRENCY = 8
+
+# aiohttp is imported on first use so invocations that never notify do not pay for it
+_aiohttp = None
+
+_executor = ThreadPoolExecutor(
+    max_workers=sum(TARGET_CONCURRENCY[target] for target in ('automation', 'resource-graph', 'state-store', 'log-analytics')),
+    thread_name_prefix='policy-processor-io'
+)
+
+# aiohttp sessions and asyncio semaphores are bound to the event loop that
+# created them, so they are rebuilt if the worker hands us a different loop.
+_loop = None
+_session = None
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def _import_aiohttp():
+    global _aiohttp
+    if _aiohttp is None:
+        from . import clients
+        _aiohttp = clients.lazy_import('aiohttp')
+    return _aiohttp
+
+
+def http_errors() -> tuple:
+    """Exceptions raised by post_json() for transport / HTTP status failures."""
+    return (_import_aiohttp().ClientError, asyncio.TimeoutError)
+
+
+def _bind_to_running_loop():
+    global _loop, _session, _semaphores
+    loop = asyncio.get_running_loop()
+    if loop is not _loop:
+        _loop = loop
+        _session = None
+        _semaphores = {}
+
+
+def target_limiter(target: str) -> asyncio.Semaphore:
+    """Returns the semaphore capping concurrent calls to the given target."""
+    _bind_to_running_loop()
+    semaphore = _semaphores.get(target)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(TARGET_CONCURRENCY.get(target, DEFAULT_TARGET_CONCURRENCY))
+        _semaphores[target] = semaphore
+    return semaphore
+
+
+def get_http_session():
+    """
+    Returns the pooled aiohttp session, creating it on first use.
+    The session is kept open across invocations on a warm instance so TLS
+    connections to the Logic App are reused.
+    """
+    global _session
+    _bind_to_running_loop()
+    if _session is None or _session.closed:
+        aiohttp = _import_aiohttp()
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=HTTP_POOL_SIZE, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT_SECONDS)
+        )
+    return _session
+
+
+async def post_json(target: str, url: str, body: str) -> int:
+    """
+    POSTs an already serialized JSON body through the pooled session, bounded by the
+    target's concurrency cap. Raises one of http_errors() on failure; returns the status code.
+    """
+    async with target_limiter(target):
+        async with get_http_session().post(url, data=body.encode('utf-8'), headers=_JSON_HEADERS) as response:
+            response.raise_for_status()
+            return response.status
+
+
+async def run_blocking(target: str, func: Callable, *args, **kwargs):
+    """
+    Runs a blocking call (e.g. an Azure SDK method) on the I/O thread pool,
+    bounded by the target's concurrency cap.
+    """
+    async with target_limiter(target):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+async def close():
+    """Closes the pooled HTTP session (used by local tooling; the Functions host never unloads us)."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
@@ -0,0 +1,43 @@
+# azure-governance-guardian/src/functions/policy-processor/bindings.py
+
+import inspect
+import json
+import os
+from typing import Callable, List
+
+FUNCTIONS_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def check_entry_point_bindings(function_dir: str, entry_point: Callable) -> List[str]:
+    """
+    Repeats the Python worker's load-time check for one function: every input /
+    trigger binding in its function.json must accept the entry point's parameter
+    annotation, and a '$return' output binding its return annotation. The worker
+    refuses to load a function that fails this (FunctionLoadError), which calling
+    the entry point directly (benchmark, tests) would not reveal.
+    Returns the list of problems (empty when the bindings load).
+    """
+    from azure.functions import meta
+
+    with open(os.path.join(function_dir, 'function.json'), encoding='utf-8') as f:
+        bindings = json.load(f).get('bindings', [])
+    registry = meta.get_binding_registry()
+    signature = inspect.signature(entry_point)
+    problems = []
+    for binding in bindings:
+        name, binding_type = binding.get('name'), binding.get('type')
+        converter = registry.get(binding_type)
+        if converter is None:
+            problems.append(f"Binding '{name}' has unknown type '{binding_type}'.")
+            continue
+        if binding.get('direction') == 'in':
+            parameter = signature.parameters.get(name)
+            if parameter is None:
+                problems.append(f"Binding '{name}' has no matching parameter on {entry_point.__name__}().")
+            elif parameter.annotation is not inspect.Parameter.empty and \
+                    not converter.check_input_type_annotation(parameter.annotation):
+                problems.append(f"Binding '{name}' ({binding_type}) does not accept annotation {parameter.annotation!r}.")
+        elif name == '$return' and signature.return_annotation is not inspect.Signature.empty and \
+                not converter.check_output_type_annotation(signature.return_annotation):
+            problems.append(f"Return binding ({binding_type}) does not accept annotation {signature.return_annotation!r}.")
+    return problems
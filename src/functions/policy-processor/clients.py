@@ -0,0 +1,163 @@
+# azure-governance-guardian/src/functions/policy-processor/clients.py
+
+import importlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Lazily created Azure SDK clients and other expensive singletons.
+#
+# Nothing here is imported or constructed at module load: each getter imports its
+# SDK and builds the object on first use (thread-safe, exactly once), and the same
+# instance is reused for every later invocation on a warm instance. Compliant-only
+# invocations therefore never pay for the management SDKs. Credentials are shared,
+# so their in-memory token cache is reused by every client.
+
+SUBSCRIPTION_ID = os.environ.get('SUBSCRIPTION_ID')
+
+# 'managedidentity' skips DefaultAzureCredential's probing chain on cold start;
+# 'default' (the default) keeps working locally with Azure CLI / environment credentials.
+AZURE_CREDENTIAL_KIND = os.environ.get('AZURE_CREDENTIAL_KIND', 'default').lower()
+
+# POLICY_PROCESSOR_STARTUP_PROFILE=1 records how long each lazy import / initialization takes
+STARTUP_PROFILE_ENABLED = os.environ.get('POLICY_PROCESSOR_STARTUP_PROFILE', '').lower() in ('1', 'true', 'yes')
+
+_startup_profile: Dict[str, float] = {}
+_profile_lock = threading.Lock()
+
+_instances: Dict[str, object] = {}
+_factories: Dict[str, Callable[[], object]] = {}
+_lock = threading.RLock()
+
+
+@contextmanager
+def profiled(name: str):
+    """Records the duration of the wrapped block in the startup profile (when enabled)."""
+    if not STARTUP_PROFILE_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        with _profile_lock:
+            _startup_profile[name] = round(_startup_profile.get(name, 0.0) + elapsed_ms, 3)
+
+
+def lazy_import(module_name: str):
+    """Imports a module, attributing the import time to it in the startup profile."""
+    with profiled(f"import:{module_name}"):
+        return importlib.import_module(module_name)
+
+
+def startup_profile() -> Dict[str, float]:
+    """Returns the recorded import / initialization timings in milliseconds, slowest first."""
+    with _profile_lock:
+        return dict(sorted(_startup_profile.items(), key=lambda item: item[1], reverse=True))
+
+
+def register(name: str, factory: Callable[[], object]):
+    """Registers a factory for a lazily created singleton."""
+    _factories[name] = factory
+
+
+def get(name: str):
+    """Returns the singleton called name, creating it on first use."""
+    try:
+        return _instances[name]
+    except KeyError:
+        pass
+    with _lock:
+        if name not in _instances:
+            with profiled(f"init:{name}"):
+                _instances[name] = _factories[name]()
+        return _instances[name]
+
+
+def set_instance(name: str, instance):
+    """Overrides a singleton (used by local tooling and the benchmark harness to inject fakes)."""
+    with _lock:
+        _instances[name] = instance
+
+
+def reset(name: str = None):
+    """Drops one (or every) cached singleton so it is rebuilt on next use."""
+    with _lock:
+        if name is None:
+            _instances.clear()
+        else:
+            _instances.pop(name, None)
+
+
+def _create_credential():
+    identity = lazy_import('azure.identity')
+    if AZURE_CREDENTIAL_KIND == 'managedidentity':
+        return identity.ManagedIdentityCredential()
+    return identity.DefaultAzureCredential()
+
+
+# The SDK clients are built with azure-core's RetryPolicy switched off (retry_total=0):
+# rate_limit.call_with_retry owns retries and backoff for every call, and the default
+# policy's own 10 retries would multiply with its attempts.
+SDK_RETRY_TOTAL = 0
+
+
+def _create_resource_graph_client():
+    resourcegraph = lazy_import('azure.mgmt.resourcegraph')
+    return resourcegraph.ResourceGraphClient(get_credential(), subscription_id=SUBSCRIPTION_ID,
+                                             retry_total=SDK_RETRY_TOTAL)
+
+
+def _create_automation_client():
+    automation = lazy_import('azure.mgmt.automation')
+    # AutomationClient requires the base URL for the Automation Account
+    # You might need to derive this from AUTOMATION_ACCOUNT_ID or pass it as another env var
+    # For now, we'll assume we can create it with the subscription ID.
+    return automation.AutomationClient(get_credential(), SUBSCRIPTION_ID, retry_total=SDK_RETRY_TOTAL)
+
+
+def _create_http_session():
+    requests = lazy_import('requests')
+    return requests.Session()
+
+
+register('credential', _create_credential)
+register('resource_graph', _create_resource_graph_client)
+register('automation', _create_automation_client)
+register('http_session', _create_http_session)
+
+
+def get_credential():
+    return get('credential')
+
+
+def get_resource_graph_client():
+    return get('resource_graph')
+
+
+def get_automation_client():
+    return get('automation')
+
+
+def get_http_session():
+    """Pooled requests.Session for synchronous HTTP calls."""
+    return get('http_session')
+
+
+# Exception types for except clauses. They are only evaluated once an exception is
+# being handled, by which point the SDK that raised it has already been imported.
+
+def azure_http_error():
+    """azure.core's HttpResponseError, raised by the management SDKs for failed ARM calls."""
+    return lazy_import('azure.core.exceptions').HttpResponseError
+
+
+def requests_error():
+    """requests' base RequestException."""
+    return lazy_import('requests').exceptions.RequestException
@@ -0,0 +1,141 @@
+# azure-governance-guardian/src/functions/policy-processor/dedup.py
+
+import hashlib
+import logging
+import threading
+from typing import Callable
+
+from .resource_cache import parse_event_time
+from .state_store import StateStore
+
+logger = logging.getLogger(__name__)
+
+
+def idempotency_key(*parts: str) -> str:
+    """
+    Deterministic key for a set of identifying values (case-insensitive).
+    Used both for event coalescing and for naming remediation jobs, so the same
+    violation always maps to the same key on every instance.
+    """
+    normalized = '|'.join((part or '').strip().lower() for part in parts)
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:32]
+
+
+class EventCoalescer:
+    """
+    Collapses repeated policy events for the same (resource ID, policy definition,
+    correlationId) within a time window, and guards remediation jobs so that a
+    given idempotency key starts at most one job per window.
+
+    All state lives in the configured StateStore, so with a shared backend
+    (file share or Table Storage) duplicates are suppressed across instances.
+    The store may be given directly or as store_factory, which is called on
+    first use so that a remote backend is not connected at import time.
+
+    With seen_ttl_seconds > 0, every NonCompliant event whose actions completed
+    (or were durably queued) also leaves a 'seen' marker per (resource ID, policy
+    definition) holding its event time, which the reconciliation sweep uses to
+    skip violations that were already handled.
+    """
+
+    def __init__(self, store: StateStore = None, window_seconds: float = 600.0,
+                 store_factory: Callable[[], StateStore] = None, seen_ttl_seconds: float = 0.0):
+        self._store = store
+        self._store_factory = store_factory
+        self.window_seconds = window_seconds
+        self.seen_ttl_seconds = seen_ttl_seconds
+        self.admitted = 0
+        self.coalesced = 0
+        self._lock = threading.Lock()
+
+    @property
+    def store(self) -> StateStore:
+        if self._store is None:
+            self._store = self._store_factory()
+        return self._store
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0
+
+    def event_key(self, resource_id: str, policy_definition_id: str, correlation_id: str) -> str:
+        return idempotency_key(resource_id, policy_definition_id, correlation_id)
+
+    def admit(self, resource_id: str, policy_definition_id: str, correlation_id: str) -> bool:
+        """
+        Returns True for the first event of a (resource, policy, correlationId)
+        group within the window and False for its duplicates.
+        State store failures fail open so events are never silently dropped.
+        """
+        if not self.enabled:
+            return True
+        key = self.event_key(resource_id, policy_definition_id, correlation_id)
+        try:
+            admitted = self.store.add(f"event:{key}", resource_id or '', self.window_seconds)
+        except Exception as e:
+            logger.error(f"De-duplication state store failed for {resource_id}; processing event anyway: {e}")
+            admitted = True
+        with self._lock:
+            if admitted:
+                self.admitted += 1
+            else:
+                self.coalesced += 1
+        return admitted
+
+    def release_event(self, resource_id: str, policy_definition_id: str, correlation_id: str):
+        """Forgets an admitted event whose actions failed, so its redelivery is not coalesced away."""
+        if not self.enabled:
+            return
+        try:
+            self.store.delete(f"event:{self.event_key(resource_id, policy_definition_id, correlation_id)}")
+        except Exception as e:
+            logger.error(f"Failed to release event claim for {resource_id}: {e}")
+
+    def claim_job(self, job_key: str) -> bool:
+        """
+        Claims a remediation job key. Only the first caller within the window gets
+        True; everyone else should treat the job as already started.
+        """
+        if not self.enabled:
+            return True
+        try:
+            return self.store.add(f"job:{job_key}", job_key, self.window_seconds)
+        except Exception as e:
+            logger.error(f"De-duplication state store failed for job {job_key}; starting job anyway: {e}")
+            return True
+
+    def mark_seen(self, resource_id: str, policy_definition_id: str, event_time: str):
+        """Records that a violation was handled at event_time (no-op unless seen_ttl_seconds > 0)."""
+        if self.seen_ttl_seconds <= 0 or not event_time:
+            return
+        key = idempotency_key(resource_id, policy_definition_id)
+        try:
+            self.store.set(f"seen:{key}", event_time, self.seen_ttl_seconds)
+        except Exception as e:
+            logger.error(f"Failed to record handled violation for {resource_id}: {e}")
+
+    def seen_since(self, resource_id: str, policy_definition_id: str, event_time: str, skew_seconds: float = 0.0) -> bool:
+        """
+        True if the violation was handled at or after event_time (minus skew_seconds).
+        State store failures report False, so the caller reprocesses rather than drops.
+        """
+        if self.seen_ttl_seconds <= 0:
+            return False
+        try:
+            seen_at = parse_event_time(self.store.get(f"seen:{idempotency_key(resource_id, policy_definition_id)}"))
+        except Exception as e:
+            logger.error(f"De-duplication state store failed for {resource_id}; reprocessing violation: {e}")
+            return False
+        event_at = parse_event_time(event_time)
+        return seen_at is not None and event_at is not None and seen_at >= event_at - skew_seconds
+
+    def release_job(self, job_key: str):
+        """Releases a claim so a failed job start can be retried by a later event."""
+        try:
+            self.store.delete(f"job:{job_key}")
+        except Exception as e:
+            logger.error(f"Failed to release job claim {job_key}: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"admitted": self.admitted, "coalesced": self.coalesced, "windowSeconds": self.window_seconds}
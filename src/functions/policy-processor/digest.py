@@ -0,0 +1,398 @@
+# azure-governance-guardian/src/functions/policy-processor/digest.py
+
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import metrics
+from .routing import DEFAULT_SEVERITY, SEVERITY_LEVELS
+
+logger = logging.getLogger(__name__)
+
+# Reserved for the 'part' / 'parts' fields, which are only known after splitting
+_PART_FIELDS_BYTES = len(', "part": 9999, "parts": 9999')
+
+
+def resource_group_from_id(resource_id: Optional[str]) -> Optional[str]:
+    """Extracts the resource group name from an ARM resource ID, or None."""
+    if not resource_id:
+        return None
+    segments = resource_id.split('/')
+    for index, segment in enumerate(segments[:-1]):
+        if segment.lower() == 'resourcegroups':
+            return segments[index + 1] or None
+    return None
+
+
+def _severity_rank(severity: str) -> int:
+    return SEVERITY_LEVELS.index(severity) if severity in SEVERITY_LEVELS else len(SEVERITY_LEVELS)
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class _DigestGroup:
+    __slots__ = ('policy_name', 'policy_display_name', 'resource_group', 'severity', 'message',
+                 'resource_ids', 'opened_at', 'last_added_at')
+
+    def __init__(self, policy_name: str, policy_display_name: str, resource_group: Optional[str],
+                 severity: str, message: Optional[str], opened_at: float):
+        self.policy_name = policy_name
+        self.policy_display_name = policy_display_name
+        self.resource_group = resource_group
+        self.severity = severity
+        self.message = message
+        self.resource_ids: Dict[str, None] = {}  # insertion-ordered set
+        self.opened_at = opened_at
+        self.last_added_at = opened_at
+
+
+class DigestJournal:
+    """
+    Persists one worker process' pending digest groups as JSON lines in directory,
+    so notifications buffered for the window survive an instance recycle.
+
+    Each line is a group record (see NotificationDigest._record); new notifications
+    are appended and the file is rewritten atomically (temp file + rename) after
+    groups are sent. A live process rewrites or appends to its journal at least once
+    per digest window while it holds open groups, so a journal untouched for
+    stale_seconds belongs to a recycled process. Another process claims it by
+    renaming it (only one can win that rename on a shared mount), merges its groups
+    and deletes it. If the old process was merely paused it may send the same
+    resources again: delivery is at-least-once.
+    """
+
+    def __init__(self, directory: str, stale_seconds: float = 600.0, instance_id: str = None,
+                 clock: Callable[[], float] = time.time):
+        self.directory = directory
+        self.stale_seconds = stale_seconds
+        self.instance_id = instance_id or f"{os.environ.get('WEBSITE_INSTANCE_ID', '')[:12] or os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.path = os.path.join(directory, f"digest-{self.instance_id}.jsonl")
+        self._clock = clock
+
+    def append(self, records: List[dict]):
+        if not records:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records))
+
+    def rewrite(self, records: List[dict]):
+        """Replaces the journal with records, or removes it when there are none."""
+        if not records:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records))
+        os.replace(tmp_path, self.path)
+
+    def claim_orphans(self) -> Tuple[List[dict], List[str]]:
+        """Claims the journals of recycled processes; returns their records and the claimed paths."""
+        cutoff = self._clock() - self.stale_seconds
+        records, claimed = [], []
+        for path in glob.glob(os.path.join(self.directory, 'digest-*.jsonl')):
+            if path == self.path:
+                continue
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    continue
+                claimed_path = f"{path}.claimed-{self.instance_id}"
+                os.rename(path, claimed_path)
+            except OSError:
+                continue  # Still in use, or claimed by another process first
+            claimed.append(claimed_path)
+            with open(claimed_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        logger.warning(f"Skipping a corrupt line in notification digest journal {path}.")
+        return records, claimed
+
+    def remove(self, paths: List[str]):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.error(f"Failed to remove recovered notification digest journal {path}: {e}")
+
+
+class NotificationDigest:
+    """
+    Aggregates per-violation Logic App notifications into one summary payload per
+    (policy, resource group, severity) group.
+
+    A group is sealed once it holds max_count resources, and the open group is due
+    once its first notification is older than window_seconds. Nothing is sent here:
+    take_due() / take_all() return the digest payloads and the caller posts them.
+    Digests larger than max_bytes (serialized) are split into parts, each listing
+    a slice of the group's resource IDs.
+
+    With a journal, save() persists the buffered groups (and merges in those of
+    recycled processes); the caller runs it off the event loop once per invocation.
+    """
+
+    def __init__(self, window_seconds: float = 300.0, max_count: int = 500, max_bytes: int = 64_000,
+                 journal: DigestJournal = None, clock: Callable[[], float] = time.time):
+        self.window_seconds = window_seconds
+        self.max_count = max(1, max_count)
+        self.max_bytes = max_bytes
+        self._journal = journal
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._groups: Dict[Tuple[str, str, str], _DigestGroup] = {}
+        self._sealed: List[_DigestGroup] = []
+        self._unsaved: List[dict] = []
+        self._compact = False
+        self._claimed: List[str] = []  # Recovered journals, removed once their groups are saved here
+        self._next_orphan_check = 0.0
+
+        self.notifications_digested = 0
+        self.digests_built = 0
+        self.payloads_built = 0
+        self.recovered = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_seconds > 0
+
+    def add(self, payload: dict, severity: str = DEFAULT_SEVERITY, policy_display_name: str = None):
+        """Adds one notification payload (as built for an immediate send) to its group."""
+        policy_name = payload.get('policyName')
+        resource_id = payload.get('resourceId')
+        resource_group = payload.get('resourceGroup') or resource_group_from_id(resource_id)
+        key = ((policy_name or '').lower(), (resource_group or '').lower(), severity)
+        now = self._clock()
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = _DigestGroup(
+                    policy_name, policy_display_name or policy_name, resource_group, severity, payload.get('message'), now
+                )
+            if resource_id:
+                group.resource_ids[resource_id] = None
+            group.last_added_at = now
+            self.notifications_digested += 1
+            if self._journal is not None:
+                self._unsaved.append(self._record(group, [resource_id] if resource_id else [], now))
+            if len(group.resource_ids) >= self.max_count:
+                self._sealed.append(self._groups.pop(key))
+        metrics.increment('notifications.digested', policy=policy_name, severity=severity)
+
+    @property
+    def flush_due(self) -> bool:
+        """True when a group was sealed by max_count or the oldest open group exceeded window_seconds."""
+        with self._lock:
+            if self._sealed:
+                return True
+            cutoff = self._clock() - self.window_seconds
+            return any(group.opened_at <= cutoff for group in self._groups.values())
+
+    def seconds_until_due(self) -> Optional[float]:
+        """Seconds until the oldest open group is due (0 if one already is), or None when nothing is buffered."""
+        with self._lock:
+            if self._sealed:
+                return 0.0
+            if not self._groups:
+                return None
+            oldest = min(group.opened_at for group in self._groups.values())
+            return max(0.0, oldest + self.window_seconds - self._clock())
+
+    def take_due(self) -> List[dict]:
+        """Removes sealed and expired groups and returns their digest payloads."""
+        with self._lock:
+            cutoff = self._clock() - self.window_seconds
+            due, self._sealed = self._sealed, []
+            for key in [key for key, group in self._groups.items() if group.opened_at <= cutoff]:
+                due.append(self._groups.pop(key))
+            self._compact = self._compact or bool(due)
+        return self._build(due)
+
+    def take_all(self) -> List[dict]:
+        """Removes every buffered group and returns the digest payloads (used on shutdown)."""
+        with self._lock:
+            due, self._sealed = self._sealed + list(self._groups.values()), []
+            self._groups = {}
+            self._compact = self._compact or bool(due)
+        return self._build(due)
+
+    @staticmethod
+    def _record(group: _DigestGroup, resource_ids: List[str], opened_at: float = None) -> dict:
+        return {
+            "policyName": group.policy_name,
+            "policyDisplayName": group.policy_display_name,
+            "resourceGroup": group.resource_group,
+            "severity": group.severity,
+            "message": group.message,
+            "resourceIds": resource_ids,
+            "openedAt": group.opened_at if opened_at is None else opened_at,
+            "lastAddedAt": group.last_added_at
+        }
+
+    def _restore(self, records: List[dict]) -> int:
+        """Merges journal records into the buffered groups; returns the number of resources restored."""
+        restored = 0
+        with self._lock:
+            for record in records:
+                policy_name, resource_group = record.get('policyName'), record.get('resourceGroup')
+                severity = record.get('severity') or DEFAULT_SEVERITY
+                opened_at = record.get('openedAt') or self._clock()
+                key = ((policy_name or '').lower(), (resource_group or '').lower(), severity)
+                group = self._groups.get(key)
+                if group is None:
+                    group = self._groups[key] = _DigestGroup(
+                        policy_name, record.get('policyDisplayName') or policy_name, resource_group, severity,
+                        record.get('message'), opened_at
+                    )
+                group.opened_at = min(group.opened_at, opened_at)
+                group.last_added_at = max(group.last_added_at, record.get('lastAddedAt') or opened_at)
+                for resource_id in record.get('resourceIds') or []:
+                    group.resource_ids[resource_id] = None
+                    restored += 1
+                if len(group.resource_ids) >= self.max_count:
+                    self._sealed.append(self._groups.pop(key))
+            self.recovered += restored
+        return restored
+
+    def save(self):
+        """
+        Persists the buffered groups to the journal: new notifications are appended,
+        and the journal is rewritten once groups were taken. Every stale_seconds / 2
+        the journals of recycled processes are merged in first. Blocking file I/O;
+        a no-op without a journal. A failed write is retried by the next save().
+        """
+        if self._journal is None:
+            return
+        with self._save_lock:
+            if self._clock() >= self._next_orphan_check:
+                self._next_orphan_check = self._clock() + self._journal.stale_seconds / 2
+                try:
+                    records, claimed = self._journal.claim_orphans()
+                except OSError as e:
+                    logger.error(f"Failed to recover orphaned notification digest journals: {e}")
+                    records, claimed = [], []
+                if claimed:
+                    restored = self._restore(records)
+                    self._claimed.extend(claimed)
+                    logger.info(f"Recovered {restored} pending notification(s) from {len(claimed)} orphaned digest journal(s).")
+            with self._lock:
+                rewrite = self._compact or bool(self._claimed)
+                if rewrite:
+                    records = [self._record(group, list(group.resource_ids))
+                               for group in self._sealed + list(self._groups.values())]
+                else:
+                    records = self._unsaved
+                self._unsaved, self._compact = [], False
+            try:
+                if rewrite:
+                    self._journal.rewrite(records)
+                else:
+                    self._journal.append(records)
+            except OSError as e:
+                logger.error(f"Failed to persist pending notification digests; retrying on the next save: {e}")
+                with self._lock:
+                    self._compact = True
+                return
+            self._journal.remove(self._claimed)
+            self._claimed = []
+
+    def _build(self, groups: List[_DigestGroup]) -> List[dict]:
+        payloads = []
+        # Most severe groups are sent first
+        for group in sorted(groups, key=lambda g: (_severity_rank(g.severity), g.opened_at)):
+            parts = self._split(group)
+            self.digests_built += 1
+            self.payloads_built += len(parts)
+            metrics.observe('notifications.digest_size', len(group.resource_ids), severity=group.severity)
+            payloads.extend(parts)
+        return payloads
+
+    def _split(self, group: _DigestGroup) -> List[dict]:
+        """Builds the group's payload(s), splitting the resource ID list so each part stays under max_bytes."""
+        resource_ids = list(group.resource_ids)
+        count = len(resource_ids)
+        location = f"resource group '{group.resource_group}'" if group.resource_group else "an unknown resource group"
+        summary = f"{count} resource(s) in {location} are non-compliant with policy '{group.policy_display_name}'."
+        base = {
+            "digest": True,
+            "policyName": group.policy_name,
+            "policyDisplayName": group.policy_display_name,
+            "resourceGroup": group.resource_group,
+            "severity": group.severity,
+            "complianceState": "NonCompliant",
+            "message": f"{summary} {group.message}" if group.message else summary,
+            "count": count,
+            "windowStart": _isoformat(group.opened_at),
+            "windowEnd": _isoformat(group.last_added_at),
+            "resourceIds": []
+        }
+        # json.dumps' default separators add ', ' between list items
+        budget = self.max_bytes - len(json.dumps(base)) - _PART_FIELDS_BYTES
+        slices, current, size = [], [], 0
+        for resource_id in resource_ids:
+            item_size = len(json.dumps(resource_id)) + 2
+            if current and size + item_size > budget:
+                slices.append(current)
+                current, size = [], 0
+            current.append(resource_id)
+            size += item_size
+        slices.append(current)
+
+        if len(slices) == 1:
+            return [dict(base, resourceIds=slices[0])]
+        logger.info(f"Splitting notification digest for policy '{group.policy_name}' ({count} resources) into {len(slices)} parts.")
+        return [
+            dict(base, resourceIds=part, part=index, parts=len(slices))
+            for index, part in enumerate(slices, start=1)
+        ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "openGroups": len(self._groups) + len(self._sealed),
+                "buffered": sum(len(group.resource_ids) for group in self._groups.values())
+                            + sum(len(group.resource_ids) for group in self._sealed),
+                "notificationsDigested": self.notifications_digested,
+                "digestsBuilt": self.digests_built,
+                "payloadsBuilt": self.payloads_built,
+                "recovered": self.recovered
+            }
+
+
+def create_notification_digest() -> NotificationDigest:
+    """
+    Builds the digest from NOTIFICATION_DIGEST_WINDOW_SECONDS (0 sends every
+    notification immediately), NOTIFICATION_DIGEST_MAX_COUNT and
+    NOTIFICATION_DIGEST_MAX_BYTES. Pending groups are journaled in
+    NOTIFICATION_DIGEST_DIR (defaults to a temp directory; point it at persistent
+    storage such as /home/data on App Service to survive instance recycling), and
+    journals untouched for NOTIFICATION_DIGEST_ORPHAN_SECONDS (default twice the
+    window) are recovered by another process.
+    """
+    window_seconds = float(os.environ.get('NOTIFICATION_DIGEST_WINDOW_SECONDS', '300'))
+    journal = None
+    if window_seconds > 0:
+        journal = DigestJournal(
+            directory=os.environ.get('NOTIFICATION_DIGEST_DIR', os.path.join(tempfile.gettempdir(), 'azgovguardian-notification-digests')),
+            stale_seconds=float(os.environ.get('NOTIFICATION_DIGEST_ORPHAN_SECONDS', str(max(2 * window_seconds, 60.0))))
+        )
+    return NotificationDigest(
+        window_seconds=window_seconds,
+        max_count=int(os.environ.get('NOTIFICATION_DIGEST_MAX_COUNT', '500')),
+        max_bytes=int(os.environ.get('NOTIFICATION_DIGEST_MAX_BYTES', '64000')),
+        journal=journal
+    )
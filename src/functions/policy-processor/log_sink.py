@@ -0,0 +1,319 @@
+# azure-governance-guardian/src/functions/policy-processor/log_sink.py
+
+import glob
+import gzip
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from typing import Callable, List, Optional
+
+from . import metrics, rate_limit
+
+logger = logging.getLogger(__name__)
+
+LOGS_INGESTION_SCOPE = "https://monitor.azure.com/.default"
+LOGS_INGESTION_API_VERSION = "2023-01-01"
+
+# The Logs Ingestion API rejects calls larger than 1 MB (measured uncompressed)
+MAX_REQUEST_BYTES = 1_000_000
+
+
+class ManagedIdentityTokenProvider:
+    """
+    Caches an AAD bearer token for the Logs Ingestion API and refreshes it shortly
+    before expiry. The credential is obtained from credential_factory on first use.
+    """
+
+    def __init__(self, credential_factory: Callable[[], object], scope: str = LOGS_INGESTION_SCOPE,
+                 refresh_margin_seconds: float = 300.0):
+        self._credential_factory = credential_factory
+        self._scope = scope
+        self._refresh_margin = refresh_margin_seconds
+        self._token = None
+        self._expires_on = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self) -> str:
+        with self._lock:
+            if self._token is None or time.time() >= self._expires_on - self._refresh_margin:
+                access_token = self._credential_factory().get_token(self._scope)
+                self._token = access_token.token
+                self._expires_on = float(access_token.expires_on)
+            return self._token
+
+
+class LogAnalyticsSink:
+    """
+    Buffers compliance records in memory and ships them to a Log Analytics custom
+    table through the Logs Ingestion API (DCE + DCR) as gzip-compressed JSON batches.
+
+    A batch is sealed when the buffer reaches max_records or max_bytes, and the open
+    buffer is flushed once its oldest record is older than max_age_seconds. Sending
+    happens in flush()/flush_if_due(), which callers run off the event loop, under
+    the shared 'log-analytics' rate limiter with jittered retries (see rate_limit.py).
+    Batches that still fail with a retryable error (429, 5xx, network errors) are
+    written to spool_dir and re-sent by replay_spool() on a later successful flush;
+    batches the endpoint rejects outright (other 4xx) go to spool_dir/dead-letter.
+    """
+
+    def __init__(self, endpoint: str, dcr_immutable_id: str, stream_name: str,
+                 token_provider: Callable[[], str], spool_dir: str,
+                 max_records: int = 500, max_bytes: int = 900_000, max_age_seconds: float = 10.0,
+                 timeout_seconds: float = 10.0, session_factory: Callable[[], object] = None,
+                 max_attempts: int = None, clock: Callable[[], float] = time.time):
+        self.url = (f"{endpoint.rstrip('/')}/dataCollectionRules/{dcr_immutable_id}"
+                    f"/streams/{stream_name}?api-version={LOGS_INGESTION_API_VERSION}")
+        self._token_provider = token_provider
+        self.spool_dir = spool_dir
+        self.dead_letter_dir = os.path.join(spool_dir, 'dead-letter')
+        self.max_records = max_records
+        self.max_bytes = min(max_bytes, MAX_REQUEST_BYTES)
+        self.max_age_seconds = max_age_seconds
+        self.timeout_seconds = timeout_seconds
+        self._session_factory = session_factory or _new_session
+        self.max_attempts = max_attempts
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buffer: List[bytes] = []
+        self._ready: List[List[bytes]] = []
+        self._buffer_bytes = 0
+        self._oldest = None
+        # Batches spooled by a previous process are picked up on the first successful flush
+        self._spool_pending = bool(glob.glob(os.path.join(spool_dir, '*.json.gz')))
+
+        self.records_sent = 0
+        self.batches_sent = 0
+        self.bytes_sent = 0
+        self.batches_spooled = 0
+        self.batches_replayed = 0
+        self.batches_dead_lettered = 0
+
+    def add(self, record: dict):
+        """
+        Serializes and buffers one record. Full buffers are sealed into ready
+        batches; nothing is sent here, so this is safe to call on the event loop.
+        """
+        encoded = json.dumps(record, separators=(',', ':'), default=str).encode('utf-8')
+        with self._lock:
+            # +1 accounts for the separating comma in the JSON array
+            if self._buffer and self._buffer_bytes + len(encoded) + 1 > self.max_bytes:
+                self._seal_locked()
+            self._buffer.append(encoded)
+            self._buffer_bytes += len(encoded) + 1
+            if self._oldest is None:
+                self._oldest = self._clock()
+            if len(self._buffer) >= self.max_records or self._buffer_bytes >= self.max_bytes:
+                self._seal_locked()
+
+    @property
+    def flush_due(self) -> bool:
+        """True when a batch is ready or the oldest buffered record exceeded max_age_seconds."""
+        with self._lock:
+            return bool(self._ready) or (
+                self._oldest is not None and self._clock() - self._oldest >= self.max_age_seconds
+            )
+
+    def seconds_until_due(self) -> Optional[float]:
+        """Seconds until the buffer is due (0 if it already is), or None when nothing is buffered."""
+        with self._lock:
+            if self._ready:
+                return 0.0
+            if self._oldest is None:
+                return None
+            return max(0.0, self._oldest + self.max_age_seconds - self._clock())
+
+    def flush_if_due(self):
+        """Sends ready batches, plus the open buffer if its oldest record exceeded max_age_seconds."""
+        with self._lock:
+            if self._oldest is not None and self._clock() - self._oldest >= self.max_age_seconds:
+                self._seal_locked()
+        if self._send_ready() and self._spool_pending:
+            self.replay_spool()
+
+    def flush(self):
+        """Sends everything buffered, then retries any spooled batches."""
+        with self._lock:
+            self._seal_locked()
+        if self._send_ready():
+            self.replay_spool()
+
+    def _seal_locked(self):
+        if not self._buffer:
+            return
+        self._ready.append(self._buffer)
+        self._buffer, self._buffer_bytes, self._oldest = [], 0, None
+
+    def _send_ready(self) -> bool:
+        """
+        Compresses and sends sealed batches; retryable failures are spooled and
+        rejected batches dead-lettered. Returns False if any batch was spooled.
+        """
+        with self._lock:
+            ready, self._ready = self._ready, []
+        all_sent = True
+        for records in ready:
+            body = gzip.compress(b'[' + b','.join(records) + b']')
+            error = self._send(body)
+            if error is None:
+                self.records_sent += len(records)
+                self.batches_sent += 1
+            elif _rejected(error):
+                self._dead_letter(body, error)
+            else:
+                self._spool(body)
+                all_sent = False
+        return all_sent
+
+    def _post(self, body: bytes):
+        response = self._session_factory().post(
+            self.url,
+            data=body,
+            headers={
+                "Authorization": f"Bearer {self._token_provider()}",
+                "Content-Type": "application/json",
+                "Content-Encoding": "gzip"
+            },
+            timeout=self.timeout_seconds
+        )
+        response.raise_for_status()
+        return response
+
+    def _send(self, body: bytes) -> Optional[Exception]:
+        """Sends one compressed batch. Returns None once it is accepted, otherwise the error."""
+        import requests
+
+        try:
+            with metrics.span('outbound.log_analytics'):
+                rate_limit.call_with_retry('log-analytics', self._post, body, max_attempts=self.max_attempts)
+            self.bytes_sent += len(body)
+            metrics.increment('outbound.log_analytics.bytes', len(body))
+            return None
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Failed to send compliance batch to Log Analytics: {e}")
+            return e
+        except Exception as e:
+            logger.error(f"An unexpected error occurred while sending compliance batch to Log Analytics: {e}", exc_info=True)
+            return e
+
+    def _write_batch(self, directory: str, body: bytes) -> str:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{int(self._clock() * 1000):015d}-{uuid.uuid4().hex}.json.gz")
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+        return path
+
+    def _dead_letter(self, body: bytes, error: Exception, path: str = None):
+        """Keeps a batch Log Analytics rejected (moving it out of the spool when path is given) for inspection."""
+        try:
+            if path is None:
+                self._write_batch(self.dead_letter_dir, body)
+            else:
+                os.makedirs(self.dead_letter_dir, exist_ok=True)
+                os.replace(path, os.path.join(self.dead_letter_dir, os.path.basename(path)))
+            self.batches_dead_lettered += 1
+            metrics.increment('log_sink.dead_lettered')
+            logger.error(f"Log Analytics rejected a compliance batch (HTTP {rate_limit.error_status(error)}); "
+                         f"dead-lettered it under {self.dead_letter_dir}: {error}")
+        except OSError as e:
+            logger.error(f"Failed to dead-letter rejected compliance batch; records are lost: {e}")
+
+    def _spool(self, body: bytes):
+        try:
+            path = self._write_batch(self.spool_dir, body)
+            self.batches_spooled += 1
+            self._spool_pending = True
+            logger.warning(f"Spooled compliance batch to {path} for later delivery.")
+        except OSError as e:
+            logger.error(f"Failed to spool compliance batch; records are lost: {e}")
+
+    def replay_spool(self, max_batches: int = 10) -> int:
+        """
+        Re-sends up to max_batches spooled batches, oldest first. A rejected batch is
+        dead-lettered and skipped; replay stops at the first retryable failure.
+        """
+        replayed = 0
+        removed = 0
+        spooled = sorted(glob.glob(os.path.join(self.spool_dir, '*.json.gz')))
+        for path in spooled[:max_batches]:
+            try:
+                with open(path, 'rb') as f:
+                    body = f.read()
+            except OSError:
+                continue
+            error = self._send(body)
+            if error is None:
+                os.remove(path)
+                replayed += 1
+            elif _rejected(error):
+                self._dead_letter(body, error, path)
+            else:
+                break
+            removed += 1
+        self.batches_replayed += replayed
+        self._spool_pending = removed < len(spooled)
+        return replayed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "buffered": len(self._buffer) + sum(len(batch) for batch in self._ready),
+                "bufferedBytes": self._buffer_bytes,
+                "recordsSent": self.records_sent,
+                "batchesSent": self.batches_sent,
+                "bytesSent": self.bytes_sent,
+                "batchesSpooled": self.batches_spooled,
+                "batchesReplayed": self.batches_replayed,
+                "batchesDeadLettered": self.batches_dead_lettered
+            }
+
+
+def _rejected(error: Exception) -> bool:
+    """True when the endpoint refused the batch itself (a 4xx other than 408/429), so resending cannot help."""
+    status = rate_limit.error_status(error)
+    return isinstance(status, int) and status < 500 and status not in rate_limit.RETRYABLE_STATUSES
+
+
+def _new_session():
+    import requests
+
+    return requests.Session()
+
+
+def create_log_sink(credential_factory: Callable[[], object] = None,
+                    session_factory: Callable[[], object] = None) -> Optional[LogAnalyticsSink]:
+    """
+    Builds the sink from LOGS_INGESTION_ENDPOINT / LOGS_INGESTION_DCR_ID /
+    LOGS_INGESTION_STREAM. Returns None when direct ingestion is not configured.
+    LOGS_INGESTION_STATIC_TOKEN bypasses AAD for local HTTP stand-ins.
+    """
+    endpoint = os.environ.get('LOGS_INGESTION_ENDPOINT')
+    dcr_immutable_id = os.environ.get('LOGS_INGESTION_DCR_ID')
+    if not endpoint or not dcr_immutable_id:
+        return None
+
+    static_token = os.environ.get('LOGS_INGESTION_STATIC_TOKEN')
+    if static_token:
+        token_provider = lambda: static_token
+    elif credential_factory is not None:
+        token_provider = ManagedIdentityTokenProvider(credential_factory)
+    else:
+        logger.error("Logs ingestion is configured but no credential is available. Direct ingestion disabled.")
+        return None
+
+    return LogAnalyticsSink(
+        endpoint=endpoint,
+        dcr_immutable_id=dcr_immutable_id,
+        stream_name=os.environ.get('LOGS_INGESTION_STREAM', 'Custom-PolicyCompliance_CL'),
+        token_provider=token_provider,
+        spool_dir=os.environ.get('LOGS_INGESTION_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'azgovguardian-la-spool')),
+        max_records=int(os.environ.get('LOGS_INGESTION_MAX_RECORDS', '500')),
+        max_bytes=int(os.environ.get('LOGS_INGESTION_MAX_BYTES', '900000')),
+        max_age_seconds=float(os.environ.get('LOGS_INGESTION_MAX_AGE_SECONDS', '10')),
+        session_factory=session_factory
+    )
@@ -0,0 +1,321 @@
+# azure-governance-guardian/src/functions/policy-processor/metrics.py
+
+import bisect
+import logging
+import os
+import threading
+import time
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Hot-path instrumentation for the policy processor.
+#
+# Stages of main() and every outbound call are wrapped in timing spans, tagged with
+# low-cardinality attributes (target, policy definition name, outcome). Durations go
+# to histograms and events (cache hits, throttles, bytes sent, ...) to counters, both
+# handled by a pluggable exporter selected with METRICS_EXPORTER:
+#   - 'none' (default): instrumentation is disabled; span() returns a shared no-op
+#     object, so the cost is one attribute lookup and a method call per span.
+#   - 'memory': in-process histograms and counters, read back with snapshot()
+#     (used by tests and the benchmark harness).
+#   - 'otel': OpenTelemetry instruments from the global MeterProvider. When
+#     azure-monitor-opentelemetry is installed and APPLICATIONINSIGHTS_CONNECTION_STRING
+#     is set, the provider is configured to export to Application Insights.
+
+METRIC_PREFIX = "policy_processor"
+
+# Upper bounds (ms) of the in-memory histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class _NoopSpan:
+    """Shared span used when instrumentation is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, key: str, value):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """
+    Times a block and records it in the '<name>.duration_ms' histogram on exit.
+    Attributes can be added while the span is open (span.set(key, value)). Unless set
+    explicitly, outcome is 'ok', or derived from the escaping exception with
+    status_outcome(); throttled calls also bump the 'throttles' counter.
+    """
+
+    __slots__ = ('_exporter', '_name', '_attributes', '_started')
+
+    def __init__(self, exporter, name: str, attributes: dict):
+        self._exporter = exporter
+        self._name = name
+        self._attributes = attributes
+        self._started = 0.0
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed_ms = (time.perf_counter() - self._started) * 1000.0
+        outcome = self._attributes.setdefault('outcome', 'ok' if exc is None else status_outcome(exc))
+        self._exporter.record(f"{self._name}.duration_ms", elapsed_ms, self._attributes)
+        if outcome == 'throttled':
+            self._exporter.add("throttles", 1, {"span": self._name})
+        return False
+
+    def set(self, key: str, value):
+        self._attributes[key] = value
+
+
+class NoopExporter:
+    """Discards everything. enabled=False lets callers skip building attributes."""
+
+    enabled = False
+
+    def record(self, name: str, value: float, attributes: dict = None):
+        pass
+
+    def add(self, name: str, value: float = 1, attributes: dict = None):
+        pass
+
+    def snapshot(self) -> dict:
+        return {}
+
+
+class _Histogram:
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, value)] += 1
+
+    def percentile(self, pct: float) -> float:
+        """Upper bound of the bucket holding the pct-th percentile (capped at the observed max)."""
+        if not self.count:
+            return 0.0
+        rank = self.count * pct / 100.0
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                bound = LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else self.max
+                return round(min(bound, self.max), 3)
+        return round(self.max, 3)
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "mean": round(self.total / self.count, 3) if self.count else 0.0,
+            "max": round(self.max, 3),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99)
+        }
+
+
+def _series_key(name: str, attributes: dict) -> Tuple[str, tuple]:
+    return name, tuple(sorted(attributes.items())) if attributes else ()
+
+
+def _format_series(key: Tuple[str, tuple]) -> str:
+    name, attributes = key
+    if not attributes:
+        return name
+    return name + '{' + ','.join(f"{k}={v}" for k, v in attributes) + '}'
+
+
+class InMemoryExporter:
+    """
+    Keeps histograms and counters in process, keyed by metric name and attribute set.
+    Histograms use fixed latency buckets, so memory stays constant per series.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, tuple], _Histogram] = {}
+        self._counters: Dict[Tuple[str, tuple], float] = {}
+
+    def record(self, name: str, value: float, attributes: dict = None):
+        key = _series_key(name, attributes)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(value)
+
+    def add(self, name: str, value: float = 1, attributes: dict = None):
+        key = _series_key(name, attributes)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def snapshot(self) -> dict:
+        """Returns {'histograms': {series: summary}, 'counters': {series: total}}."""
+        with self._lock:
+            return {
+                "histograms": {_format_series(key): histogram.summary() for key, histogram in sorted(self._histograms.items())},
+                "counters": {_format_series(key): value for key, value in sorted(self._counters.items())}
+            }
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+class OpenTelemetryExporter:
+    """
+    Records into OpenTelemetry histograms / counters created from the global
+    MeterProvider. Instruments are created on first use of each metric name.
+    """
+
+    enabled = True
+
+    def __init__(self, meter=None):
+        if meter is None:
+            from opentelemetry import metrics as otel_metrics
+            meter = otel_metrics.get_meter(METRIC_PREFIX)
+        self._meter = meter
+        self._lock = threading.Lock()
+        self._instruments = {}
+
+    def _instrument(self, name: str, kind: str):
+        instrument = self._instruments.get(name)
+        if instrument is None:
+            with self._lock:
+                instrument = self._instruments.get(name)
+                if instrument is None:
+                    full_name = f"{METRIC_PREFIX}.{name}"
+                    if kind == 'histogram':
+                        instrument = self._meter.create_histogram(full_name, unit='ms' if name.endswith('_ms') else '1')
+                    else:
+                        instrument = self._meter.create_counter(full_name)
+                    self._instruments[name] = instrument
+        return instrument
+
+    def record(self, name: str, value: float, attributes: dict = None):
+        self._instrument(name, 'histogram').record(value, attributes=attributes or {})
+
+    def add(self, name: str, value: float = 1, attributes: dict = None):
+        self._instrument(name, 'counter').add(value, attributes=attributes or {})
+
+    def snapshot(self) -> dict:
+        return {}
+
+
+def _configure_azure_monitor():
+    """Points the global MeterProvider at Application Insights when the distro is installed."""
+    if not os.environ.get('APPLICATIONINSIGHTS_CONNECTION_STRING'):
+        return
+    try:
+        from azure.monitor.opentelemetry import configure_azure_monitor
+    except ImportError:
+        logger.info("azure-monitor-opentelemetry is not installed; using the existing OpenTelemetry MeterProvider.")
+        return
+    configure_azure_monitor()
+
+
+def create_exporter(kind: str = None):
+    """
+    Builds the exporter named by kind (defaults to METRICS_EXPORTER).
+    Falls back to the no-op exporter if OpenTelemetry is unavailable.
+    """
+    kind = (kind or os.environ.get('METRICS_EXPORTER', 'none')).lower()
+    if kind == 'memory':
+        return InMemoryExporter()
+    if kind == 'otel':
+        try:
+            _configure_azure_monitor()
+            return OpenTelemetryExporter()
+        except Exception as e:
+            logger.error(f"Failed to initialize OpenTelemetry metrics exporter, instrumentation disabled: {e}")
+            return NoopExporter()
+    if kind not in ('none', ''):
+        logger.warning(f"Unknown METRICS_EXPORTER '{kind}', instrumentation disabled.")
+    return NoopExporter()
+
+
+_exporter = create_exporter()
+
+
+def get_exporter():
+    return _exporter
+
+
+def set_exporter(exporter):
+    """Swaps the active exporter (tests and the benchmark harness use InMemoryExporter)."""
+    global _exporter
+    _exporter = exporter
+
+
+def enabled() -> bool:
+    return _exporter.enabled
+
+
+def span(name: str, **attributes):
+    """
+    Times the wrapped block into '<name>.duration_ms':
+
+        with metrics.span('outbound.logic_app', policy=route.key) as s:
+            ...
+            s.set('outcome', 'ok')
+    """
+    exporter = _exporter
+    if not exporter.enabled:
+        return _NOOP_SPAN
+    return Span(exporter, name, attributes)
+
+
+def increment(name: str, value: float = 1, **attributes):
+    """Adds value to the counter name."""
+    exporter = _exporter
+    if exporter.enabled:
+        exporter.add(name, value, attributes)
+
+
+def observe(name: str, value: float, **attributes):
+    """Records one value in the histogram name."""
+    exporter = _exporter
+    if exporter.enabled:
+        exporter.record(name, value, attributes)
+
+
+def snapshot() -> dict:
+    return _exporter.snapshot()
+
+
+def status_outcome(error) -> str:
+    """Maps an exception from an outbound call to a span outcome."""
+    response = getattr(error, 'response', None)
+    status = (getattr(error, 'status_code', None) or getattr(error, 'status', None)
+              or getattr(response, 'status_code', None))
+    if status == 429:
+        return 'throttled'
+    if isinstance(status, int) and status >= 500:
+        return 'server_error'
+    if isinstance(status, int) and status >= 400:
+        return 'client_error'
+    return 'error'
@@ -0,0 +1,150 @@
+# azure-governance-guardian/src/functions/policy-processor/models.py
+
+from typing import Iterable
+
+from .routing import definition_name_from_id
+
+NON_COMPLIANT = "NonCompliant"
+
+# Placeholder for fields missing from an event in log records and payloads
+NOT_AVAILABLE = 'N/A'
+
+# Resource Graph columns mapped onto ResourceSummary slots; everything else goes to 'extra'
+_SUMMARY_COLUMN_ORDER = ('id', 'name', 'resourceGroup', 'location')
+_SUMMARY_COLUMNS = frozenset(_SUMMARY_COLUMN_ORDER)
+
+
+class PolicyEvent:
+    """
+    One policy evaluation event, parsed once from the Event Grid payload.
+
+    Missing fields are kept as None (rendered as 'N/A' in log records). route is
+    the PolicyRoute resolved for NonCompliant events; the processor sets it before
+    enrichment so the Resource Graph projection and the actions use the same route.
+    """
+
+    __slots__ = (
+        'event_id', 'resource_id', 'resource_key', 'policy_assignment_id', 'policy_definition_id',
+        'policy_reference_id', 'compliance_state', 'policy_effect', 'event_time', 'correlation_id', 'route'
+    )
+
+    def __init__(self, event_id: str = None, resource_id: str = None, policy_assignment_id: str = None,
+                 policy_definition_id: str = None, policy_reference_id: str = None, compliance_state: str = None,
+                 policy_effect: str = None, event_time: str = None, correlation_id: str = None):
+        self.event_id = event_id
+        self.resource_id = resource_id
+        self.resource_key = resource_id.lower() if resource_id and resource_id != NOT_AVAILABLE else None
+        self.policy_assignment_id = policy_assignment_id
+        self.policy_definition_id = policy_definition_id
+        self.policy_reference_id = policy_reference_id
+        self.compliance_state = compliance_state
+        self.policy_effect = policy_effect
+        self.event_time = event_time
+        self.correlation_id = correlation_id
+        self.route = None
+
+    @classmethod
+    def from_event(cls, event_data: dict) -> 'PolicyEvent':
+        """
+        Parses one policy event from an Event Grid delivery, in the Event Grid
+        schema ('eventTime') or the CloudEvents v1.0 schema ('time').
+        """
+        data = event_data.get('data') or {}
+        return cls(
+            event_id=event_data.get('id'),
+            resource_id=event_data.get('subject'),
+            policy_assignment_id=data.get('policyAssignmentId'),
+            policy_definition_id=data.get('policyDefinitionId'),
+            policy_reference_id=data.get('policyDefinitionReferenceId'),
+            compliance_state=data.get('complianceState'), # e.g., 'Compliant', 'NonCompliant'
+            policy_effect=data.get('policyDefinitionEffect'), # e.g., 'audit', 'deny', 'deployIfNotExists'
+            event_time=event_data.get('eventTime') or event_data.get('time'),
+            correlation_id=data.get('correlationId')
+        )
+
+    @property
+    def non_compliant(self) -> bool:
+        return self.compliance_state == NON_COMPLIANT
+
+    @property
+    def definition_name(self) -> str:
+        return definition_name_from_id(self.policy_definition_id)
+
+    def log_record(self, resource: 'ResourceSummary' = None) -> dict:
+        """Builds the compliance record for Log Analytics; resource adds the projected ResourceDetails."""
+        record = {
+            "TimeGenerated": self.event_time or NOT_AVAILABLE,
+            "ResourceId": self.resource_id or NOT_AVAILABLE,
+            "PolicyAssignmentId": self.policy_assignment_id or NOT_AVAILABLE,
+            "PolicyDefinitionId": self.policy_definition_id or NOT_AVAILABLE,
+            "ComplianceState": self.compliance_state or NOT_AVAILABLE,
+            "PolicyEffect": self.policy_effect or NOT_AVAILABLE,
+            "CorrelationId": self.correlation_id or NOT_AVAILABLE,
+            "Source": "AzureGovernanceGuardian",
+            "EventType": "PolicyEvaluation"
+        }
+        if resource is not None:
+            record["ResourceDetails"] = resource.to_dict()
+        return record
+
+
+class ResourceSummary:
+    """
+    The projected Resource Graph columns for one resource.
+
+    name / resourceGroup / location are kept in slots; any other projected column
+    (e.g. 'vmSize = tostring(properties.hardwareProfile.vmSize)') is kept in extra.
+    columns is the (shared) set of column names the row was projected with, so a
+    cached summary can tell whether it satisfies a route that needs other columns.
+    """
+
+    __slots__ = ('id', 'name', 'resource_group', 'location', 'extra', 'columns')
+
+    def __init__(self, id: str = None, name: str = None, resource_group: str = None, location: str = None,
+                 extra: dict = None, columns: frozenset = frozenset()):
+        self.id = id
+        self.name = name
+        self.resource_group = resource_group
+        self.location = location
+        self.extra = extra
+        self.columns = columns
+
+    @classmethod
+    def from_row(cls, row: dict, columns: frozenset = None) -> 'ResourceSummary':
+        """Builds a summary from a Resource Graph row; columns defaults to the row's keys."""
+        if columns is None:
+            columns = frozenset(row)
+        extra = {key: value for key, value in row.items() if key not in _SUMMARY_COLUMNS} or None
+        return cls(row.get('id'), row.get('name'), row.get('resourceGroup'), row.get('location'), extra, columns)
+
+    @property
+    def found(self) -> bool:
+        return self.id is not None
+
+    def covers(self, columns: Iterable[str]) -> bool:
+        return self.columns.issuperset(columns)
+
+    def get(self, column: str, default=None):
+        """Looks up a projected column by its Resource Graph name."""
+        if column == 'name':
+            return self.name
+        if column == 'resourceGroup':
+            return self.resource_group
+        if column == 'location':
+            return self.location
+        if column == 'id':
+            return self.id
+        return self.extra.get(column, default) if self.extra else default
+
+    def to_dict(self) -> dict:
+        """Projected columns as a dict (empty when the resource was not found)."""
+        if not self.found:
+            return {}
+        details = {column: self.get(column) for column in _SUMMARY_COLUMN_ORDER if column in self.columns}
+        if self.extra:
+            details.update(self.extra)
+        return details
+
+
+# Shared stand-in for resources Resource Graph could not resolve
+MISSING_RESOURCE = ResourceSummary()
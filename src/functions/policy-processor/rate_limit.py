@@ -0,0 +1,294 @@
+# azure-governance-guardian/src/functions/policy-processor/rate_limit.py
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Per-endpoint request rates (requests/second) and bursts. Limiters start at the
+# configured rate, halve it when the endpoint throttles (at most once per
+# DECREASE_INTERVAL_SECONDS, never below 1/20th of it) and creep back up by 1/20th
+# per successful call.
+#   resource-graph: Resource Graph allows 15 queries per 5 seconds per user.
+#   automation:     ARM write token bucket for job creation (10/s refill, 200 burst).
+#   automation-status: ARM reads for job status polling by the remediation scheduler.
+#   logic-app:      Logic App HTTP trigger (mostly shaped by its 429 / Retry-After responses).
+DEFAULT_RATES = {
+    'resource-graph': (3.0, 15),
+    'automation': (10.0, 200),
+    'automation-status': (5.0, 20),
+    'logic-app': (200.0, 400),
+    'log-analytics': (10.0, 20),
+}
+DEFAULT_RATE = (10.0, 20)
+
+# Retries with exponential backoff and full jitter; Retry-After wins when it is longer.
+RETRY_MAX_ATTEMPTS = int(os.environ.get('RETRY_MAX_ATTEMPTS', '4'))
+RETRY_BASE_DELAY_SECONDS = float(os.environ.get('RETRY_BASE_DELAY_SECONDS', '0.5'))
+RETRY_MAX_DELAY_SECONDS = float(os.environ.get('RETRY_MAX_DELAY_SECONDS', '30'))
+
+# When fewer than this many calls remain in the quota window (x-ms-ratelimit-remaining-*,
+# x-ms-user-quota-remaining) the limiter slows down before ARM starts returning 429s.
+LOW_REMAINING_THRESHOLD = int(os.environ.get('RATE_LIMIT_LOW_REMAINING', '10'))
+
+# Throttles closer together than this reduce the rate only once
+DECREASE_INTERVAL_SECONDS = float(os.environ.get('RATE_LIMIT_DECREASE_INTERVAL_SECONDS', '1'))
+
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+
+# Transport-level failures (no HTTP status) that are worth retrying, by class name so
+# that requests / aiohttp / azure-core do not have to be imported to classify them.
+_RETRYABLE_ERROR_NAMES = {
+    'ServiceRequestError', 'ServiceResponseError', 'ConnectionError', 'Timeout', 'TimeoutError',
+    'ClientConnectionError', 'ServerDisconnectedError', 'ClientPayloadError'
+}
+
+
+def error_status(error) -> Optional[int]:
+    """HTTP status carried by an azure-core, requests or aiohttp exception, if any."""
+    response = getattr(error, 'response', None)
+    return (getattr(error, 'status_code', None) or getattr(error, 'status', None)
+            or getattr(response, 'status_code', None))
+
+
+def error_headers(error) -> dict:
+    """Response headers carried by an azure-core, requests or aiohttp exception, if any."""
+    headers = getattr(error, 'headers', None)
+    if headers is None:
+        headers = getattr(getattr(error, 'response', None), 'headers', None)
+    return headers or {}
+
+
+def is_retryable(error) -> bool:
+    status = error_status(error)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUSES
+    return any(cls.__name__ in _RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    """
+    Parses Retry-After (seconds or HTTP date) or Resource Graph's
+    x-ms-user-quota-resets-after (hh:mm:ss). Returns None when absent.
+    """
+    value = headers.get('Retry-After') or headers.get('retry-after')
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    value = headers.get('x-ms-user-quota-resets-after')
+    if value:
+        try:
+            hours, minutes, seconds = value.split(':')
+            return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+        except ValueError:
+            pass
+    return None
+
+
+def remaining_quota(headers) -> Optional[int]:
+    """Smallest x-ms-ratelimit-remaining-* / x-ms-user-quota-remaining value in the headers."""
+    remaining = None
+    for name, value in headers.items():
+        name = name.lower()
+        if name.startswith('x-ms-ratelimit-remaining-') or name == 'x-ms-user-quota-remaining':
+            try:
+                count = int(value)
+            except (TypeError, ValueError):
+                continue
+            remaining = count if remaining is None else min(remaining, count)
+    return remaining
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket shared by every caller of one endpoint, usable from worker threads
+    (wait()) and the event loop (wait_async()). reserve() never blocks: it takes a
+    token, possibly going into debt, and returns how long the caller must wait.
+
+    The rate adapts to the endpoint (AIMD): throttling halves it and a Retry-After
+    pauses the bucket, a low remaining-quota header trims it, and every success
+    adds max_rate / 20 back.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, min_rate: float = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.max_rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 20.0
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._clock = clock
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._last_decrease = float('-inf')
+        self._lock = threading.Lock()
+        self.throttled = 0
+
+    def _refill_locked(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Takes one token and returns the delay (seconds) before the call may proceed."""
+        with self._lock:
+            now = self._clock()
+            self._refill_locked(now)
+            self._tokens -= 1.0
+            debt_delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(debt_delay, self._blocked_until - now, 0.0)
+
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            metrics.observe('rate_limit.wait_ms', delay * 1000.0, target=self.name)
+            time.sleep(delay)
+
+    async def wait_async(self):
+        delay = self.reserve()
+        if delay > 0:
+            metrics.observe('rate_limit.wait_ms', delay * 1000.0, target=self.name)
+            await asyncio.sleep(delay)
+
+    def on_throttled(self, retry_after: float = None):
+        with self._lock:
+            now = self._clock()
+            self._refill_locked(now)
+            self.throttled += 1
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            # Calls already in flight when the endpoint started throttling all come back
+            # with 429s; they count as one congestion signal, not one halving each.
+            if now - self._last_decrease < DECREASE_INTERVAL_SECONDS:
+                return
+            self._last_decrease = now
+            self.rate = max(self.min_rate, self.rate / 2.0)
+            self._tokens = min(self._tokens, 0.0)
+        logger.warning(f"Endpoint '{self.name}' throttled; rate reduced to {self.rate:.2f}/s"
+                       + (f", pausing {retry_after:.1f}s." if retry_after else "."))
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20.0)
+
+    def on_quota(self, headers):
+        """Slows down when the response reports few calls left in the quota window."""
+        remaining = remaining_quota(headers)
+        if remaining is not None and remaining <= LOW_REMAINING_THRESHOLD:
+            with self._lock:
+                self.rate = max(self.min_rate, self.rate * 0.75)
+
+    def response_hook(self, pipeline_response):
+        """azure-core raw_response_hook: feeds ARM quota headers back into the limiter."""
+        http_response = getattr(pipeline_response, 'http_response', None)
+        if http_response is not None:
+            self.on_quota(http_response.headers)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"rate": round(self.rate, 3), "maxRate": self.max_rate, "throttled": self.throttled}
+
+
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(target: str) -> AdaptiveRateLimiter:
+    """
+    Returns the shared limiter for a target, configured from
+    RATE_LIMIT_<TARGET>_PER_SECOND / RATE_LIMIT_<TARGET>_BURST (e.g. RATE_LIMIT_AUTOMATION_PER_SECOND).
+    """
+    limiter = _limiters.get(target)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(target)
+            if limiter is None:
+                rate, burst = DEFAULT_RATES.get(target, DEFAULT_RATE)
+                env_name = target.upper().replace('-', '_')
+                limiter = AdaptiveRateLimiter(
+                    target,
+                    rate=float(os.environ.get(f'RATE_LIMIT_{env_name}_PER_SECOND', rate)),
+                    burst=int(os.environ.get(f'RATE_LIMIT_{env_name}_BURST', burst))
+                )
+                _limiters[target] = limiter
+    return limiter
+
+
+def limiter_stats() -> dict:
+    with _limiters_lock:
+        return {name: limiter.stats() for name, limiter in _limiters.items()}
+
+
+def backoff_delay(attempt: int, error) -> float:
+    """Full-jitter exponential backoff for attempt (1-based), stretched to Retry-After if longer."""
+    delay = random.uniform(0, min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * (2 ** (attempt - 1))))
+    retry_after = retry_after_seconds(error_headers(error))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, RETRY_MAX_DELAY_SECONDS))
+    return delay
+
+
+def _on_failure(limiter: AdaptiveRateLimiter, error):
+    if error_status(error) == 429:
+        limiter.on_throttled(retry_after_seconds(error_headers(error)))
+
+
+def call_with_retry(target: str, func: Callable, *args, max_attempts: int = None, **kwargs):
+    """
+    Runs a blocking call under the target's rate limiter, retrying retryable
+    failures (429, 5xx, timeouts, connection errors) with jittered backoff.
+    The last error is re-raised once attempts run out or it is not retryable.
+    """
+    limiter = get_limiter(target)
+    max_attempts = max_attempts or RETRY_MAX_ATTEMPTS
+    attempt = 0
+    while True:
+        attempt += 1
+        limiter.wait()
+        try:
+            result = func(*args, **kwargs)
+            limiter.on_success()
+            return result
+        except Exception as e:
+            _on_failure(limiter, e)
+            if attempt >= max_attempts or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, e)
+            metrics.increment('retries', target=target)
+            logger.info(f"Retrying call to '{target}' in {delay:.2f}s (attempt {attempt + 1}/{max_attempts}): {e}")
+            time.sleep(delay)
+
+
+async def call_with_retry_async(target: str, func: Callable, *args, max_attempts: int = None, **kwargs):
+    """Coroutine counterpart of call_with_retry(); func must return an awaitable."""
+    limiter = get_limiter(target)
+    max_attempts = max_attempts or RETRY_MAX_ATTEMPTS
+    attempt = 0
+    while True:
+        attempt += 1
+        await limiter.wait_async()
+        try:
+            result = await func(*args, **kwargs)
+            limiter.on_success()
+            return result
+        except Exception as e:
+            _on_failure(limiter, e)
+            if attempt >= max_attempts or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, e)
+            metrics.increment('retries', target=target)
+            logger.info(f"Retrying call to '{target}' in {delay:.2f}s (attempt {attempt + 1}/{max_attempts}): {e}")
+            await asyncio.sleep(delay)
@@ -0,0 +1,239 @@
+# azure-governance-guardian/src/functions/policy-processor/reconcile.py
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List, Optional, Tuple
+
+from .dedup import EventCoalescer
+from .models import NON_COMPLIANT, PolicyEvent
+from .resource_cache import parse_event_time
+
+logger = logging.getLogger(__name__)
+
+# Prefix of the correlation ID of events built from policy states
+RECONCILE_SOURCE = "reconciliation"
+
+_MANAGEMENT_GROUP_PREFIX = "/providers/microsoft.management/managementgroups/"
+
+# Projected columns only, so each page stays small regardless of the policy state payload
+POLICY_STATES_QUERY = """policyresources
+| where type =~ 'microsoft.policyinsights/policystates'
+| where tostring(properties.complianceState) =~ 'NonCompliant'
+| where todatetime(properties.timestamp) > datetime({since}){definition_filter}
+| project stateId = id,
+    resourceId = tostring(properties.resourceId),
+    policyAssignmentId = tostring(properties.policyAssignmentId),
+    policyDefinitionId = tostring(properties.policyDefinitionId),
+    policyDefinitionReferenceId = tostring(properties.policyDefinitionReferenceId),
+    policyDefinitionAction = tostring(properties.policyDefinitionAction),
+    timestamp = tostring(properties.timestamp)"""
+
+
+class ReconcileScope:
+    """
+    A subscription or management group swept as one partition, with its own watermark.
+    Accepts a subscription ID, 'mg:<name>' or a management group resource ID.
+    """
+
+    __slots__ = ('kind', 'name')
+
+    def __init__(self, spec: str):
+        spec = spec.strip()
+        if spec.lower().startswith('mg:'):
+            self.kind, self.name = 'managementGroup', spec[3:]
+        elif spec.lower().startswith(_MANAGEMENT_GROUP_PREFIX):
+            self.kind, self.name = 'managementGroup', spec[len(_MANAGEMENT_GROUP_PREFIX):]
+        else:
+            self.kind, self.name = 'subscription', spec.rsplit('/', 1)[-1]
+
+    @property
+    def key(self) -> str:
+        return f"{self.kind}:{self.name.lower()}"
+
+    def request_scope(self) -> dict:
+        """Keyword arguments for QueryRequest (subscriptions= or management_groups=)."""
+        if self.kind == 'managementGroup':
+            return {"management_groups": [self.name]}
+        return {"subscriptions": [self.name]}
+
+
+def parse_scopes(value: str, default_subscription_id: str = None) -> List[ReconcileScope]:
+    """Parses a comma-separated RECONCILE_SCOPES value; falls back to the Function's own subscription."""
+    specs = [spec for spec in (value or '').split(',') if spec.strip()]
+    if not specs and default_subscription_id:
+        specs = [default_subscription_id]
+    return list({scope.key: scope for scope in map(ReconcileScope, specs)}.values())
+
+
+def format_timestamp(timestamp: float) -> str:
+    """Formats a POSIX timestamp as the ISO 8601 UTC string Resource Graph and Event Grid use."""
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def build_policy_states_query(since: float, routed_keys: Iterable[str] = None) -> str:
+    """
+    Resource Graph query for NonCompliant policy states newer than since (POSIX timestamp).
+    routed_keys (definition names / reference IDs) limits the sweep to policies
+    that have an explicit route, so unrelated built-in assignments are not swept.
+    """
+    definition_filter = ''
+    keys = sorted({key.lower() for key in routed_keys or []})
+    if keys:
+        key_list = ", ".join("'" + key.replace("'", "\\'") + "'" for key in keys)
+        definition_filter = (f"\n| where tolower(tostring(properties.policyDefinitionName)) in ({key_list})"
+                             f" or tolower(tostring(properties.policyDefinitionReferenceId)) in ({key_list})")
+    return POLICY_STATES_QUERY.format(since=format_timestamp(since), definition_filter=definition_filter)
+
+
+def policy_state_to_event(row: dict) -> PolicyEvent:
+    """
+    Converts a projected policy state row into the PolicyEvent that
+    build_policy_actions() expects. The correlation ID is derived from the
+    evaluation timestamp, so re-reading the same state coalesces to one event.
+    """
+    timestamp = row.get('timestamp')
+    return PolicyEvent(
+        event_id=f"reconcile-{row.get('stateId')}",
+        resource_id=row.get('resourceId'),
+        policy_assignment_id=row.get('policyAssignmentId'),
+        policy_definition_id=row.get('policyDefinitionId'),
+        policy_reference_id=row.get('policyDefinitionReferenceId') or None,
+        compliance_state=NON_COMPLIANT,
+        policy_effect=row.get('policyDefinitionAction'),
+        event_time=timestamp,
+        correlation_id=f"{RECONCILE_SOURCE}-{timestamp}"
+    )
+
+
+def _earliest(current: Optional[float], candidate: Optional[float]) -> Optional[float]:
+    if candidate is None:
+        return current
+    return candidate if current is None else min(current, candidate)
+
+
+class Reconciler:
+    """
+    Periodically sweeps Resource Graph policy states for NonCompliant results that
+    the live Event Grid path never handled (dropped deliveries, failed invocations).
+
+    Each scope is a partition with its own watermark in the state store. A run
+    streams the states newer than the watermark (minus overlap_seconds) page by
+    page through skip tokens, converts them into events, drops the ones the live
+    path already handled (see EventCoalescer.seen_since) and hands them to
+    process_batch in batches of batch_size. At most one page and one batch per
+    partition are held in memory, so memory stays flat however many resources
+    the scope contains. The watermark only advances when a partition completes,
+    and never past the oldest policy state whose actions failed, so the next run
+    reads that state again.
+    """
+
+    def __init__(self, fetch_page: Callable[[ReconcileScope, str, Optional[str]], Awaitable[Tuple[List[dict], Optional[str]]]],
+                 process_batch: Callable[[List[PolicyEvent]], Awaitable[Optional[List[PolicyEvent]]]], coalescer: EventCoalescer,
+                 run_blocking: Callable[..., Awaitable], routed_keys: Callable[[], Iterable[str]] = None,
+                 batch_size: int = 100, max_parallel: int = 4, overlap_seconds: float = 900.0,
+                 initial_lookback_seconds: float = 86400.0, seen_skew_seconds: float = 900.0,
+                 clock: Callable[[], float] = time.time):
+        self._fetch_page = fetch_page
+        self._process_batch = process_batch
+        self._coalescer = coalescer
+        self._run_blocking = run_blocking
+        self._routed_keys = routed_keys
+        self.batch_size = max(1, batch_size)
+        self.max_parallel = max(1, max_parallel)
+        self.overlap_seconds = overlap_seconds
+        self.initial_lookback_seconds = initial_lookback_seconds
+        self.seen_skew_seconds = seen_skew_seconds
+        self._clock = clock
+
+    def _watermark_key(self, scope: ReconcileScope) -> str:
+        return f"reconcile:watermark:{scope.key}"
+
+    def load_watermark(self, scope: ReconcileScope) -> float:
+        """Returns the last completed watermark, or now - initial_lookback_seconds for a new scope."""
+        watermark = parse_event_time(self._coalescer.store.get(self._watermark_key(scope)))
+        if watermark is None:
+            watermark = self._clock() - self.initial_lookback_seconds
+        return watermark
+
+    def save_watermark(self, scope: ReconcileScope, watermark: float):
+        self._coalescer.store.set(self._watermark_key(scope), format_timestamp(watermark))
+
+    async def stream_policy_states(self, scope: ReconcileScope, since: float) -> AsyncIterator[dict]:
+        """Yields NonCompliant policy state rows for the scope, one Resource Graph page at a time."""
+        query = build_policy_states_query(since, self._routed_keys() if self._routed_keys else None)
+        skip_token = None
+        while True:
+            rows, skip_token = await self._fetch_page(scope, query, skip_token)
+            for row in rows:
+                yield row
+            if not skip_token:
+                break
+
+    def _unseen(self, events: List[PolicyEvent]) -> List[PolicyEvent]:
+        return [
+            event for event in events
+            if not self._coalescer.seen_since(
+                event.resource_id, event.policy_definition_id, event.event_time, self.seen_skew_seconds
+            )
+        ]
+
+    async def _flush(self, scope: ReconcileScope, batch: List[PolicyEvent], stats: dict) -> Optional[float]:
+        """Processes the unhandled events of a batch; returns the oldest failed state time (-inf if unknown), or None."""
+        unseen = await self._run_blocking('state-store', self._unseen, batch)
+        stats["alreadyHandled"] += len(batch) - len(unseen)
+        if not unseen:
+            return None
+        stats["reprocessed"] += len(unseen)
+        failed = await self._process_batch(unseen) or []
+        if not failed:
+            return None
+        stats["failed"] += len(failed)
+        failed_times = [parse_event_time(event.event_time) for event in failed]
+        return float('-inf') if None in failed_times else min(failed_times)
+
+    async def reconcile_scope(self, scope: ReconcileScope) -> dict:
+        """Sweeps one partition and advances its watermark if the sweep completes."""
+        started = self._clock()
+        stats = {"scope": scope.key, "scanned": 0, "alreadyHandled": 0, "reprocessed": 0, "failed": 0, "completed": False}
+        try:
+            watermark = await self._run_blocking('state-store', self.load_watermark, scope)
+            since = watermark - self.overlap_seconds
+            newest = watermark
+            oldest_failed = None
+            batch = []
+            async for row in self.stream_policy_states(scope, since):
+                if not row.get('resourceId'):
+                    continue
+                stats["scanned"] += 1
+                state_time = parse_event_time(row.get('timestamp'))
+                if state_time is not None and state_time > newest:
+                    newest = state_time
+                batch.append(policy_state_to_event(row))
+                if len(batch) >= self.batch_size:
+                    oldest_failed = _earliest(oldest_failed, await self._flush(scope, batch, stats))
+                    batch = []
+            if batch:
+                oldest_failed = _earliest(oldest_failed, await self._flush(scope, batch, stats))
+
+            if oldest_failed is not None:
+                # Stop short of the oldest failed state so the next run ('timestamp > since') re-reads it
+                newest = max(watermark, min(newest, oldest_failed - 1.0))
+            await self._run_blocking('state-store', self.save_watermark, scope, newest)
+            stats["completed"] = True
+            stats["watermark"] = format_timestamp(newest)
+        except Exception as e:
+            # The watermark is left untouched, so the next run re-reads this window
+            logger.error(f"Reconciliation of {scope.key} failed after {stats['scanned']} policy states: {e}", exc_info=True)
+        stats["seconds"] = round(self._clock() - started, 3)
+        return stats
+
+    async def run(self, scopes: List[ReconcileScope]) -> List[dict]:
+        """Sweeps every scope, at most max_parallel partitions at a time."""
+        semaphore = asyncio.Semaphore(self.max_parallel)
+
+        async def bounded(scope):
+            async with semaphore:
+                return await self.reconcile_scope(scope)
+        return list(await asyncio.gather(*(bounded(scope) for scope in scopes)))
@@ -0,0 +1,133 @@
+# azure-governance-guardian/src/functions/policy-processor/resource_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Optional
+
+
+def parse_event_time(event_time: str) -> Optional[float]:
+    """
+    Converts an Event Grid 'eventTime' string into a POSIX timestamp.
+    Azure emits up to 7 fractional-second digits and a trailing 'Z', neither of
+    which datetime.fromisoformat() accepts on older Pythons, so both are normalised.
+    Returns None when the value is missing or cannot be parsed.
+    """
+    if not event_time or event_time == 'N/A':
+        return None
+    try:
+        value = event_time.strip()
+        if value.endswith('Z'):
+            value = value[:-1] + '+00:00'
+        if '.' in value:
+            head, _, tail = value.partition('.')
+            digits = ''.join(c for c in tail if c.isdigit())
+            offset = tail[len(digits):]
+            value = f"{head}.{digits[:6].ljust(6, '0')}{offset}"
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    except ValueError:
+        return None
+
+
+class ResourceDetailsCache:
+    """
+    Bounded, thread-safe LRU cache of projected Resource Graph rows
+    (ResourceSummary objects) keyed by resource ID.
+
+    Entries expire after ttl_seconds. An entry is also treated as stale when an
+    event arrives whose eventTime is newer than the moment the entry was fetched,
+    since the resource may have changed after we read it.
+    """
+
+    def __init__(self, max_size: int = 5000, ttl_seconds: float = 300.0, clock: Callable[[], float] = time.time):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()  # resource_id -> (details, cached_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl_seconds > 0
+
+    def get(self, resource_id: str, event_time: str = None, columns: Iterable[str] = None):
+        """
+        Returns the cached details for resource_id, or None on a miss.
+        Expired entries and entries older than event_time are dropped. With columns,
+        an entry projected without all of them is a miss (the refetch replaces it).
+        """
+        if not self.enabled:
+            return None
+        key = resource_id.lower()
+        event_ts = parse_event_time(event_time) if event_time else None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            details, cached_at = entry
+            if self._clock() - cached_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            if event_ts is not None and event_ts > cached_at:
+                del self._entries[key]
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            if columns is not None and not details.covers(columns):
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return details
+
+    def put(self, resource_id: str, details):
+        """Stores details for resource_id, evicting the least recently used entries if full."""
+        if not self.enabled:
+            return
+        key = resource_id.lower()
+        with self._lock:
+            self._entries[key] = (details, self._clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, resource_id: str):
+        """Drops any cached entry for resource_id."""
+        with self._lock:
+            if self._entries.pop(resource_id.lower(), None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Returns a snapshot of the cache counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxSize": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,176 @@
+# azure-governance-guardian/src/functions/policy-processor/retry_queue.py
+
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from typing import Callable, List, Optional, Tuple
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RetryQueue:
+    """
+    Durable local queue for remediation / notification actions that still failed
+    after in-line retries.
+
+    Each entry is one JSON file named '<due time ms>-<id>.json' in directory, written
+    atomically (temp file + rename) like the Log Analytics spool, so entries survive
+    a host restart and sort by due time. Draining claims an entry by renaming it to
+    '.claimed'; on a shared mount only one worker can win that rename. Entries that
+    keep failing are rescheduled with exponential backoff and moved to the
+    'dead-letter' subdirectory after max_attempts.
+    """
+
+    def __init__(self, directory: str, max_attempts: int = 8, base_delay_seconds: float = 30.0,
+                 max_delay_seconds: float = 3600.0, claim_timeout_seconds: float = 600.0,
+                 clock: Callable[[], float] = time.time):
+        self.directory = directory
+        self.dead_letter_directory = os.path.join(directory, 'dead-letter')
+        self.max_attempts = max_attempts
+        self.base_delay_seconds = base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.claim_timeout_seconds = claim_timeout_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        # Earliest due time known to this process; None means 'unknown, look on disk'
+        self._next_due: Optional[float] = None
+
+        self.enqueued = 0
+        self.completed = 0
+        self.rescheduled = 0
+        self.dead_lettered = 0
+
+    def _entry_path(self, due: float) -> str:
+        return os.path.join(self.directory, f"{int(due * 1000):015d}-{uuid.uuid4().hex}.json")
+
+    def _write(self, path: str, entry: dict):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def enqueue(self, kind: str, payload: dict, error: str = None, delay_seconds: float = None) -> bool:
+        """Persists an action for a later retry. Returns False if it could not be written."""
+        now = self._clock()
+        due = now + (self.base_delay_seconds if delay_seconds is None else delay_seconds)
+        entry = {"kind": kind, "payload": payload, "attempts": 0, "created": now, "lastError": error}
+        try:
+            self._write(self._entry_path(due), entry)
+        except OSError as e:
+            logger.error(f"Failed to persist {kind} action to the retry queue; action is lost: {e}")
+            return False
+        with self._lock:
+            self.enqueued += 1
+            self._next_due = due if self._next_due is None else min(self._next_due, due)
+        metrics.increment('retry_queue.enqueued', kind=kind)
+        logger.warning(f"Queued failed {kind} action for retry: {error}")
+        return True
+
+    def has_due(self) -> bool:
+        """Cheap check for the hot path: only touches the disk when the earliest due time is unknown."""
+        with self._lock:
+            next_due = self._next_due
+        if next_due is None:
+            paths = sorted(glob.glob(os.path.join(self.directory, '*.json')))
+            next_due = self._due_time(paths[0]) if paths else float('inf')
+            with self._lock:
+                self._next_due = next_due
+        return next_due <= self._clock()
+
+    @staticmethod
+    def _due_time(path: str) -> float:
+        try:
+            return int(os.path.basename(path).split('-', 1)[0]) / 1000.0
+        except ValueError:
+            return 0.0
+
+    def _recover_stale_claims(self):
+        """Returns entries claimed by a worker that died mid-drain to the queue."""
+        cutoff = self._clock() - self.claim_timeout_seconds
+        for path in glob.glob(os.path.join(self.directory, '*.json.claimed')):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.replace(path, path[:-len('.claimed')])
+            except OSError:
+                continue
+
+    def claim_due(self, max_items: int) -> List[Tuple[str, dict]]:
+        """Claims up to max_items due entries, oldest due first. Returns (claim path, entry) pairs."""
+        self._recover_stale_claims()
+        now = self._clock()
+        claimed = []
+        paths = sorted(glob.glob(os.path.join(self.directory, '*.json')))
+        for path in paths:
+            if len(claimed) >= max_items or self._due_time(path) > now:
+                break
+            claim_path = path + '.claimed'
+            try:
+                os.rename(path, claim_path)
+                with open(claim_path, encoding='utf-8') as f:
+                    claimed.append((claim_path, json.load(f)))
+            except (OSError, ValueError) as e:
+                logger.error(f"Failed to claim retry queue entry {path}: {e}")
+        remaining = paths[len(claimed):]
+        with self._lock:
+            self._next_due = self._due_time(remaining[0]) if remaining else float('inf')
+        return claimed
+
+    def complete(self, claim_path: str):
+        try:
+            os.remove(claim_path)
+        except OSError:
+            pass
+        with self._lock:
+            self.completed += 1
+
+    def reschedule(self, claim_path: str, entry: dict, error: str = None):
+        """Puts a failed entry back with exponential backoff, or dead-letters it after max_attempts."""
+        entry["attempts"] = entry.get("attempts", 0) + 1
+        entry["lastError"] = error
+        try:
+            if entry["attempts"] >= self.max_attempts:
+                self._write(os.path.join(self.dead_letter_directory, os.path.basename(claim_path)[:-len('.claimed')]), entry)
+                with self._lock:
+                    self.dead_lettered += 1
+                metrics.increment('retry_queue.dead_lettered', kind=entry.get("kind"))
+                logger.error(f"Giving up on {entry.get('kind')} action after {entry['attempts']} queued retries: {error}")
+            else:
+                delay = min(self.max_delay_seconds, self.base_delay_seconds * (2 ** entry["attempts"]))
+                due = self._clock() + delay
+                self._write(self._entry_path(due), entry)
+                with self._lock:
+                    self.rescheduled += 1
+                    self._next_due = due if self._next_due is None else min(self._next_due, due)
+            os.remove(claim_path)
+        except OSError as e:
+            logger.error(f"Failed to reschedule retry queue entry {claim_path}: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enqueued": self.enqueued,
+                "completed": self.completed,
+                "rescheduled": self.rescheduled,
+                "deadLettered": self.dead_lettered
+            }
+
+
+def create_retry_queue() -> RetryQueue:
+    """
+    Builds the queue from RETRY_QUEUE_DIR (defaults to a temp directory; point it at
+    persistent storage such as /home/data on App Service to survive instance recycling).
+    """
+    return RetryQueue(
+        directory=os.environ.get('RETRY_QUEUE_DIR', os.path.join(tempfile.gettempdir(), 'azgovguardian-retry-queue')),
+        max_attempts=int(os.environ.get('RETRY_QUEUE_MAX_ATTEMPTS', '8')),
+        base_delay_seconds=float(os.environ.get('RETRY_QUEUE_BASE_DELAY_SECONDS', '30')),
+        max_delay_seconds=float(os.environ.get('RETRY_QUEUE_MAX_DELAY_SECONDS', '3600'))
+    )
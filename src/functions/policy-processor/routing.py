@@ -0,0 +1,316 @@
+# azure-governance-guardian/src/functions/policy-processor/routing.py
+
+import glob
+import json
+import logging
+import os
+import re
+import string
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FUNCTION_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Routes live next to the function code; policy JSON is either bundled into the
+# deployment package under ./policies or read from the repository checkout.
+DEFAULT_ROUTES_PATH = os.path.join(FUNCTION_DIR, 'routes.json')
+_BUNDLED_POLICY_ROOT = os.path.join(FUNCTION_DIR, 'policies')
+_REPO_POLICY_ROOT = os.path.normpath(os.path.join(FUNCTION_DIR, '..', '..', '..', 'policies'))
+
+# Placeholders available to notification / runbook message templates
+TEMPLATE_FIELDS = {
+    'resourceId', 'policyName', 'policyDisplayName', 'complianceState', 'policyEffect',
+    'resourceName', 'resourceGroup', 'location'
+}
+
+# Resource Graph columns fetched for a route without a 'project' list: what the
+# notification payload and the resource template fields use. 'id' is always added.
+DEFAULT_PROJECTION = ('name', 'resourceGroup', 'location')
+
+# Template fields filled from enrichment, and the column each one needs
+RESOURCE_TEMPLATE_FIELDS = {'resourceName': 'name', 'resourceGroup': 'resourceGroup', 'location': 'location'}
+
+# Remediation priority classes (lower rank is started first by the job scheduler)
+PRIORITY_CLASSES = {'critical': 0, 'high': 1, 'normal': 2, 'low': 3}
+DEFAULT_PRIORITY = 'normal'
+
+# Notification severities (most severe first), used to group notification digests
+SEVERITY_LEVELS = ('critical', 'high', 'medium', 'low')
+DEFAULT_SEVERITY = 'medium'
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def default_policy_root() -> str:
+    """Returns POLICY_ROOT if set, else the bundled ./policies folder, else the repository's policies/ folder."""
+    configured = os.environ.get('POLICY_ROOT')
+    if configured:
+        return configured
+    if os.path.isdir(_BUNDLED_POLICY_ROOT):
+        return _BUNDLED_POLICY_ROOT
+    return _REPO_POLICY_ROOT
+
+
+def definition_name_from_id(policy_definition_id: str) -> str:
+    """
+    Extracts the lower-cased definition name from a policy definition ARM ID
+    ('/subscriptions/.../providers/Microsoft.Authorization/policyDefinitions/<name>').
+    Bare names are returned lower-cased as-is.
+    """
+    if not policy_definition_id:
+        return ''
+    return policy_definition_id.rstrip('/').rsplit('/', 1)[-1].lower()
+
+
+def _parse_projection(entries, route_key: str) -> Tuple[Tuple[str, ...], frozenset]:
+    """
+    Validates a route's 'project' list and returns (KQL project clauses, output column names).
+    Entries are column names ('tags') or 'alias = expression'
+    ('vmSize = tostring(properties.hardwareProfile.vmSize)').
+    """
+    if not isinstance(entries, (list, tuple)):
+        raise ValueError(f"Route '{route_key}' has a 'project' value that is not a list.")
+    clauses, columns = ['id'], {'id'}
+    for entry in entries:
+        alias, separator, expression = str(entry).partition('=')
+        alias = alias.strip()
+        if not _IDENTIFIER.match(alias) or (separator and not expression.strip()):
+            raise ValueError(f"Route '{route_key}' has an invalid projected column '{entry}'.")
+        if alias in columns:
+            continue
+        columns.add(alias)
+        clauses.append(f"{alias} = {expression.strip()}" if separator else alias)
+    return tuple(clauses), frozenset(columns)
+
+
+def merge_projections(*projections: Tuple[str, ...]) -> Tuple[str, ...]:
+    """Union of several routes' project clauses, in first-seen order."""
+    if len(projections) == 1:
+        return projections[0]
+    return tuple(dict.fromkeys(clause for projection in projections for clause in projection))
+
+
+def projection_columns(projection: Tuple[str, ...]) -> frozenset:
+    """Output column names of a tuple of project clauses."""
+    return frozenset(clause.partition('=')[0].strip() for clause in projection)
+
+
+def _validate_template(template: Optional[str], route_key: str, columns: frozenset):
+    if template is None:
+        return
+    for _, field_name, _, _ in string.Formatter().parse(template):
+        if field_name is None:
+            continue
+        if field_name in RESOURCE_TEMPLATE_FIELDS:
+            if RESOURCE_TEMPLATE_FIELDS[field_name] not in columns:
+                raise ValueError(f"Route '{route_key}' uses template field '{{{field_name}}}' "
+                                 f"but does not project column '{RESOURCE_TEMPLATE_FIELDS[field_name]}'.")
+        elif field_name not in TEMPLATE_FIELDS and (field_name not in columns or field_name in ('id', 'name')):
+            raise ValueError(f"Route '{route_key}' uses unknown template field '{{{field_name}}}'.")
+
+
+class PolicyRoute:
+    """
+    Declarative action for one policy definition: an optional Automation runbook
+    to start and/or an optional Logic App notification to send.
+
+    'project' lists the Resource Graph columns enrichment fetches for the route
+    (DEFAULT_PROJECTION when absent). Projected aliases can be used as template fields.
+    'priority' (one of PRIORITY_CLASSES) overrides the runbook's scheduling priority.
+    The notification's 'severity' (one of SEVERITY_LEVELS) groups it into digests;
+    'immediate' sends it right away instead (None: only for deny-effect policies).
+    """
+
+    __slots__ = (
+        'key', 'display_name', 'effect', 'reference_ids', 'log_message',
+        'runbook', 'runbook_message', 'pass_logic_app_url', 'notification_message',
+        'notification_severity', 'notification_immediate',
+        'projection', 'projected_columns', 'priority', 'hits'
+    )
+
+    def __init__(self, key: str, spec: dict):
+        self.key = key
+        self.display_name = spec.get('displayName')
+        self.effect = spec.get('effect')
+        self.reference_ids = []
+        self.log_message = spec.get('logMessage')
+
+        runbook = spec.get('runbook') or {}
+        self.runbook = runbook.get('name')
+        self.runbook_message = runbook.get('message')
+        self.pass_logic_app_url = bool(runbook.get('passLogicAppUrl', False))
+
+        notification = spec.get('notification') or {}
+        self.notification_message = notification.get('message')
+        self.notification_severity = notification.get('severity', DEFAULT_SEVERITY)
+        if self.notification_severity not in SEVERITY_LEVELS:
+            raise ValueError(f"Route '{key}' has unknown notification severity '{self.notification_severity}' (expected one of {list(SEVERITY_LEVELS)}).")
+        immediate = notification.get('immediate')
+        self.notification_immediate = bool(immediate) if immediate is not None else None
+        self.projection, self.projected_columns = _parse_projection(spec.get('project', DEFAULT_PROJECTION), key)
+        self.priority = spec.get('priority')
+        if self.priority is not None and self.priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Route '{key}' has unknown priority '{self.priority}' (expected one of {sorted(PRIORITY_CLASSES)}).")
+        self.hits = 0
+
+        for template in (self.log_message, self.runbook_message, self.notification_message):
+            _validate_template(template, key, self.projected_columns)
+
+    @staticmethod
+    def render(template: Optional[str], fields: dict) -> Optional[str]:
+        return template.format_map(fields) if template is not None else None
+
+
+class RoutingTable:
+    """
+    O(1) index from policy definition name / reference ID to a PolicyRoute.
+
+    Built once at startup from routes.json plus the initiative and
+    custom-definition metadata, so unknown routes and unrouted definitions are
+    reported up front instead of silently falling through at runtime.
+    """
+
+    def __init__(self, routes: Dict[str, PolicyRoute], default_route: PolicyRoute, name_prefix: str = ''):
+        self.routes = routes
+        self.default_route = default_route
+        self.name_prefix = name_prefix.lower()
+        self.initiative_definitions: List[str] = []
+        self.unknown_routes: List[str] = []
+        self.unrouted_definitions: List[str] = []
+        # Per-runbook scheduling settings (the 'runbooks' section of routes.json)
+        self.runbooks: Dict[str, dict] = {}
+        self._index: Dict[str, PolicyRoute] = {}
+        # Definition names resolved by suffix (deployed under another prefix), or to None
+        self._suffix_matches: Dict[str, Optional[PolicyRoute]] = {}
+        self._lock = threading.Lock()
+        self._reindex()
+
+    def _reindex(self):
+        index = {}
+        for key, route in self.routes.items():
+            index[key] = route
+            if self.name_prefix:
+                # Terraform deploys definitions as '<project_name>-<folder name>'
+                index[f"{self.name_prefix}-{key}"] = route
+            for reference_id in route.reference_ids:
+                index[reference_id.lower()] = route
+        self._index = index
+        self._suffix_matches = {}
+
+    def _match_suffix(self, definition_name: str) -> Optional[PolicyRoute]:
+        """
+        Matches '<any prefix>-<route key>' so definitions deployed under a PROJECT_NAME
+        other than the configured one still route; the longest key wins.
+        """
+        if definition_name in self._suffix_matches:
+            return self._suffix_matches[definition_name]
+        matches = [key for key in self.routes if definition_name.endswith(f"-{key}")]
+        route = self.routes[max(matches, key=len)] if matches else None
+        self._suffix_matches[definition_name] = route
+        return route
+
+    def attach_policy_metadata(self, initiative: dict, definitions: Dict[str, dict]):
+        """
+        Enriches routes with display names, effects and reference IDs from the
+        initiative and custom definitions, and records coverage gaps.
+        """
+        self.initiative_definitions = []
+        for reference in initiative.get('policyDefinitions', []):
+            definition_key = reference.get('policyDefinitionId', '').lower()
+            self.initiative_definitions.append(definition_key)
+            route = self.routes.get(definition_key)
+            if route is None:
+                continue
+            reference_id = reference.get('policyDefinitionReferenceId')
+            if reference_id and reference_id not in route.reference_ids:
+                route.reference_ids.append(reference_id)
+            definition = definitions.get(definition_key, {})
+            route.display_name = route.display_name or definition.get('displayName')
+            route.effect = route.effect or definition.get('policyRule', {}).get('then', {}).get('effect')
+
+        known = set(self.initiative_definitions) | set(definitions)
+        self.unknown_routes = sorted(key for key in self.routes if key not in known)
+        self.unrouted_definitions = sorted(key for key in self.initiative_definitions if key not in self.routes)
+        self._reindex()
+
+    def resolve(self, policy_definition_id: str, policy_reference_id: str = None) -> PolicyRoute:
+        """Returns the route for a definition ID (or reference ID), falling back to the default route."""
+        definition_name = definition_name_from_id(policy_definition_id)
+        route = self._index.get(definition_name)
+        if route is None and definition_name:
+            route = self._match_suffix(definition_name)
+        if route is None and policy_reference_id:
+            route = self._index.get(policy_reference_id.lower())
+        if route is None:
+            route = self.default_route
+        with self._lock:
+            route.hits += 1
+        return route
+
+    def routed_keys(self) -> List[str]:
+        """Definition names (with and without the deployment prefix) and reference IDs that have an explicit route."""
+        return sorted(self._index)
+
+    def coverage_report(self) -> dict:
+        """Summarises routing gaps: routes for unknown definitions, unrouted definitions, and routes never hit so far."""
+        return {
+            "routes": len(self.routes),
+            "initiativeDefinitions": len(self.initiative_definitions),
+            "unknownRoutes": self.unknown_routes,
+            "unroutedDefinitions": self.unrouted_definitions,
+            "neverMatched": sorted(key for key, route in self.routes.items() if route.hits == 0),
+            "defaultRouteHits": self.default_route.hits
+        }
+
+
+def _load_json(path: str) -> dict:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_policy_definitions(policy_root: str) -> Dict[str, dict]:
+    """Loads policies/custom-definitions/*/policy.json keyed by folder name."""
+    definitions = {}
+    for path in sorted(glob.glob(os.path.join(policy_root, 'custom-definitions', '*', 'policy.json'))):
+        definitions[os.path.basename(os.path.dirname(path)).lower()] = _load_json(path)
+    return definitions
+
+
+def load_initiatives(policy_root: str) -> dict:
+    """Merges every initiative under policies/initiatives into one list of definition references."""
+    references = []
+    for path in sorted(glob.glob(os.path.join(policy_root, 'initiatives', '*.json'))):
+        references.extend(_load_json(path).get('policyDefinitions', []))
+    return {"policyDefinitions": references}
+
+
+def load_routing_table(routes_path: str = None, policy_root: str = None, name_prefix: str = None) -> RoutingTable:
+    """
+    Builds the routing table from routes.json and attaches initiative / definition
+    metadata. Missing policy files only disable the coverage report; routing by
+    definition name keeps working.
+    """
+    routes_path = routes_path or os.environ.get('POLICY_ROUTES_PATH', DEFAULT_ROUTES_PATH)
+    policy_root = policy_root or default_policy_root()
+    if name_prefix is None:
+        name_prefix = os.environ.get('PROJECT_NAME', 'azgovguardian')
+
+    config = _load_json(routes_path)
+    routes = {key.lower(): PolicyRoute(key.lower(), spec) for key, spec in config.get('routes', {}).items()}
+    default_route = PolicyRoute('default', config.get('defaultRoute', {}))
+    table = RoutingTable(routes, default_route, name_prefix)
+    table.runbooks = config.get('runbooks', {})
+
+    if os.path.isdir(policy_root):
+        table.attach_policy_metadata(load_initiatives(policy_root), load_policy_definitions(policy_root))
+        if table.unknown_routes:
+            logger.warning(f"Routes configured for definitions not found in the initiative or custom definitions: {table.unknown_routes}")
+        if table.unrouted_definitions:
+            logger.warning(f"Initiative definitions without a route (default route will be used): {table.unrouted_definitions}")
+    else:
+        logger.warning(f"Policy root '{policy_root}' not found. Routing coverage report is unavailable.")
+
+    logger.info(f"Loaded {len(routes)} policy routes from {routes_path}.")
+    return table
@@ -0,0 +1,420 @@
+# azure-governance-guardian/src/functions/policy-processor/scheduler.py
+
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from . import metrics
+from .dedup import idempotency_key
+from .routing import DEFAULT_PRIORITY, PRIORITY_CLASSES
+
+logger = logging.getLogger(__name__)
+
+# Automation job statuses after which the job no longer holds a concurrency slot
+TERMINAL_JOB_STATUSES = {'completed', 'failed', 'stopped', 'suspended'}
+
+
+def job_status_name(status) -> Optional[str]:
+    """
+    Normalises a job status to its lower-cased name. The SDK returns a
+    JobStatus(str, Enum), whose str() is 'JobStatus.COMPLETED', so the enum
+    value is used rather than str().
+    """
+    if status is None:
+        return None
+    return str(getattr(status, 'value', status)).lower()
+
+
+class RunbookSettings:
+    """
+    Scheduling settings for one runbook, from the 'runbooks' section of routes.json:
+        "fix-public-ip-config": {"priority": "critical", "maxConcurrentJobs": 10, "maxBatchSize": 100}
+    maxBatchSize > 1 means the runbook accepts a 'resourceIds' list in its WebhookData,
+    so pending jobs can be merged into one multi-resource job.
+    """
+
+    __slots__ = ('name', 'priority', 'max_concurrent_jobs', 'max_batch_size')
+
+    def __init__(self, name: str, spec: dict = None, default_max_concurrent_jobs: int = 20):
+        spec = spec or {}
+        self.name = name
+        self.priority = spec.get('priority', DEFAULT_PRIORITY)
+        if self.priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Runbook '{name}' has unknown priority '{self.priority}' (expected one of {sorted(PRIORITY_CLASSES)}).")
+        self.max_concurrent_jobs = max(1, int(spec.get('maxConcurrentJobs', default_max_concurrent_jobs)))
+        self.max_batch_size = max(1, int(spec.get('maxBatchSize', 1)))
+
+    @property
+    def batched(self) -> bool:
+        return self.max_batch_size > 1
+
+
+class ScheduledJob:
+    """One pending runbook start, resolved through future once it is started, failed or deferred."""
+
+    __slots__ = (
+        'runbook', 'parameters', 'job_key', 'priority', 'resource_id', 'policy_name',
+        'requeue_on_failure', 'enqueued_at', 'future'
+    )
+
+    def __init__(self, runbook: str, parameters: dict, job_key: Optional[str], priority: str,
+                 resource_id: Optional[str], policy_name: Optional[str], requeue_on_failure: bool,
+                 enqueued_at: float, future: asyncio.Future):
+        self.runbook = runbook
+        self.parameters = parameters
+        self.job_key = job_key
+        self.priority = priority
+        self.resource_id = resource_id
+        self.policy_name = policy_name
+        self.requeue_on_failure = requeue_on_failure
+        self.enqueued_at = enqueued_at
+        self.future = future
+
+
+class RunningJob:
+    __slots__ = ('runbook', 'started_at', 'size')
+
+    def __init__(self, runbook: str, started_at: float, size: int):
+        self.runbook = runbook
+        self.started_at = started_at
+        self.size = size
+
+
+class RemediationScheduler:
+    """
+    Sits between the policy processor and the Automation account.
+
+    Runbook starts are queued per runbook and started by priority class (critical
+    before high before normal before low, oldest first within a class), subject
+    to a per-runbook cap and an account-wide cap on jobs that are starting or
+    running. For runbooks with maxBatchSize > 1 the pending jobs are merged into
+    one job whose WebhookData carries 'resourceIds'; the scheduler waits up to
+    batch_linger_seconds for a batch to fill.
+
+    A started job keeps its slot until polling (get_job_status) reports a terminal
+    status; polling only covers the jobs whose cap is holding pending jobs back,
+    at most once per poll_interval_seconds. A job that still finds no free slot
+    is handed to requeue (the durable retry queue) straight away, so an
+    invocation never waits for slots held by long-running jobs; the retry queue
+    drain starts it later. submit() resolves to True once the job is started or
+    durably deferred, and to False if starting it failed.
+
+    All state is owned by the event loop; the Automation calls are supplied as
+    coroutines (start_job raises on failure), so the scheduler can be driven by
+    a fake Automation endpoint.
+    """
+
+    def __init__(self, start_job: Callable[[str, str, dict], Awaitable],
+                 get_job_status: Callable[[str], Awaitable[Optional[str]]],
+                 requeue: Callable[[List[ScheduledJob], Optional[Exception]], Awaitable[bool]],
+                 runbooks: Dict[str, dict] = None, default_max_concurrent_jobs: int = 20,
+                 max_running_jobs: int = 200, batch_linger_seconds: float = 0.25, poll_interval_seconds: float = 10.0,
+                 job_timeout_seconds: float = 10800.0, clock: Callable[[], float] = time.monotonic):
+        self._start_job = start_job
+        self._get_job_status = get_job_status
+        self._requeue = requeue
+        self.default_max_concurrent_jobs = default_max_concurrent_jobs
+        self.runbooks = {
+            name: RunbookSettings(name, spec, default_max_concurrent_jobs) for name, spec in (runbooks or {}).items()
+        }
+        self.max_running_jobs = max(1, max_running_jobs)
+        self.batch_linger_seconds = batch_linger_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self.job_timeout_seconds = job_timeout_seconds
+        self._clock = clock
+
+        self._pending: Dict[str, list] = {}  # runbook -> heap of (priority rank, sequence, ScheduledJob)
+        self._pending_count = 0
+        self._sequence = itertools.count()
+        self._active: Dict[str, int] = {}  # runbook -> jobs starting or running
+        self._active_total = 0
+        self._running: Dict[str, RunningJob] = {}  # job name -> job
+        self._last_poll = float('-inf')
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+
+        self.started_jobs = 0
+        self.started_resources = 0
+        self.batched_jobs = 0
+        self.failed_starts = 0
+        self.deferred = 0
+        self.finished: Dict[str, int] = {}
+
+    def settings_for(self, runbook: str) -> RunbookSettings:
+        settings = self.runbooks.get(runbook)
+        if settings is None:
+            settings = self.runbooks[runbook] = RunbookSettings(runbook, None, self.default_max_concurrent_jobs)
+        return settings
+
+    def _bind_to_running_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Futures and the dispatcher belong to the old loop; running jobs still hold their slots
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._task = None
+            self._pending = {}
+            self._pending_count = 0
+            self._active = {}
+            for running in self._running.values():
+                self._active[running.runbook] = self._active.get(running.runbook, 0) + 1
+            self._active_total = len(self._running)
+
+    async def submit(self, runbook: str, parameters: dict, job_key: str = None, priority: str = None,
+                     resource_id: str = None, policy_name: str = None, requeue_on_failure: bool = True) -> bool:
+        """
+        Queues a runbook start and waits until it is started or durably queued for
+        retry (True), or failed without being queued (False).
+        """
+        self._bind_to_running_loop()
+        settings = self.settings_for(runbook)
+        priority = priority if priority in PRIORITY_CLASSES else settings.priority
+        job = ScheduledJob(runbook, parameters, job_key, priority, resource_id, policy_name,
+                           requeue_on_failure, self._clock(), self._loop.create_future())
+        queue = self._pending.setdefault(runbook, [])
+        heapq.heappush(queue, (PRIORITY_CLASSES[priority], next(self._sequence), job))
+        self._pending_count += 1
+        metrics.observe('scheduler.queue_depth', len(queue), runbook=runbook)
+
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._dispatch())
+        return await job.future
+
+    async def _dispatch(self):
+        polled = False
+        while self._pending_count:
+            delay = self._launch_ready(self._clock())
+            capped = self._capped_runbooks()
+            if capped:
+                blocked = self._blocked_runbooks()
+                if blocked and not polled and self._clock() - self._last_poll >= self.poll_interval_seconds:
+                    # One status round frees the slots of jobs that finished since the last poll
+                    await self._poll_running(blocked)
+                    polled = True
+                    continue
+                await self._defer(capped)
+            polled = False
+            if not self._pending_count:
+                break
+
+            # Only batches lingering for more violations are left
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _oldest_by_runbook(self) -> Dict[str, float]:
+        return {
+            runbook: min(entry[2].enqueued_at for entry in queue)
+            for runbook, queue in self._pending.items() if queue
+        }
+
+    def _capped_runbooks(self) -> set:
+        """Runbooks with pending jobs and no free slot under their own or the account-wide cap."""
+        account_full = self._active_total >= self.max_running_jobs
+        return {
+            runbook for runbook, queue in self._pending.items()
+            if queue and (account_full or self._active.get(runbook, 0) >= self.settings_for(runbook).max_concurrent_jobs)
+        }
+
+    def _blocked_runbooks(self) -> Optional[set]:
+        """
+        Runbooks whose running jobs hold pending jobs back through a concurrency cap
+        (not batching): all of them when the account-wide cap is reached.
+        """
+        if not self._running:
+            return None
+        if self._active_total >= self.max_running_jobs:
+            return {running.runbook for running in self._running.values()}
+        return {
+            runbook for runbook, queue in self._pending.items()
+            if queue and self._active.get(runbook, 0) >= self.settings_for(runbook).max_concurrent_jobs
+        } or None
+
+    def _launch_ready(self, now: float) -> Optional[float]:
+        """
+        Starts as many batches as the caps allow, highest priority first.
+        Returns the seconds until a lingering batch becomes due, or None.
+        """
+        linger_delay = None
+        oldest = self._oldest_by_runbook() if self.batch_linger_seconds > 0 else {}
+        while self._active_total < self.max_running_jobs:
+            best = None
+            for runbook, queue in self._pending.items():
+                if not queue:
+                    continue
+                settings = self.settings_for(runbook)
+                if self._active.get(runbook, 0) >= settings.max_concurrent_jobs:
+                    continue
+                if settings.batched and len(queue) < settings.max_batch_size and runbook in oldest:
+                    # Give more violations for this runbook a moment to arrive and join the batch
+                    due = oldest[runbook] + self.batch_linger_seconds
+                    if due > now:
+                        linger_delay = due - now if linger_delay is None else min(linger_delay, due - now)
+                        continue
+                head = queue[0][:2]
+                if best is None or head < best[0]:
+                    best = (head, runbook)
+            if best is None:
+                break
+
+            runbook = best[1]
+            queue = self._pending[runbook]
+            batch = [heapq.heappop(queue)[2] for _ in range(min(len(queue), self.settings_for(runbook).max_batch_size))]
+            self._pending_count -= len(batch)
+            if queue and runbook in oldest:
+                oldest[runbook] = min(entry[2].enqueued_at for entry in queue)
+            self._active[runbook] = self._active.get(runbook, 0) + 1
+            self._active_total += 1
+            asyncio.ensure_future(self._start(runbook, batch))
+        return linger_delay
+
+    def _job_request(self, runbook: str, batch: List[ScheduledJob]) -> tuple:
+        """Returns (job name, parameters); several jobs become one job over 'resourceIds'."""
+        if len(batch) == 1:
+            job = batch[0]
+            return f"{runbook}-{job.job_key or os.urandom(4).hex()}", job.parameters
+
+        resource_ids = list(dict.fromkeys(job.resource_id for job in batch if job.resource_id))
+        webhook_data = {
+            "resourceIds": resource_ids,
+            "policyNames": sorted({job.policy_name for job in batch if job.policy_name}),
+            "complianceState": "NonCompliant"
+        }
+        parameters = {key: value for key, value in batch[0].parameters.items() if key != 'WebhookData'}
+        parameters["WebhookData"] = json.dumps(webhook_data)
+        # Deterministic per set of violations, so a retried batch maps to the same job
+        batch_key = idempotency_key(*sorted(job.job_key or job.resource_id or '' for job in batch))
+        return f"{runbook}-batch-{batch_key}", parameters
+
+    async def _start(self, runbook: str, batch: List[ScheduledJob]):
+        now = self._clock()
+        for job in batch:
+            metrics.observe('scheduler.wait_ms', (now - job.enqueued_at) * 1000.0, runbook=runbook, priority=job.priority)
+        job_name, parameters = self._job_request(runbook, batch)
+        try:
+            await self._start_job(runbook, job_name, parameters)
+        except Exception as e:
+            self._release_slot(runbook)
+            self.failed_starts += 1
+            metrics.increment('scheduler.start_failures', runbook=runbook)
+            logger.error(f"Failed to start Automation job '{job_name}' for {len(batch)} violation(s): {e}")
+            # Every job goes to the requeue callback so its idempotency claim is released,
+            # including retry queue redrives, whose entry the drain then reschedules.
+            requeued = await self._hand_over(batch, e)
+            for job in batch:
+                if not job.future.done():
+                    job.future.set_result(requeued and job.requeue_on_failure)
+            return
+
+        self._running[job_name] = RunningJob(runbook, self._clock(), len(batch))
+        self.started_jobs += 1
+        self.started_resources += len(batch)
+        if len(batch) > 1:
+            self.batched_jobs += 1
+        metrics.increment('scheduler.jobs_started', runbook=runbook)
+        metrics.observe('scheduler.batch_size', len(batch), runbook=runbook)
+        logger.info(f"Started Automation job '{job_name}' for {len(batch)} violation(s) of runbook '{runbook}'.")
+        for job in batch:
+            if not job.future.done():
+                job.future.set_result(True)
+        self._wakeup.set()
+
+    async def _hand_over(self, jobs: List[ScheduledJob], error: Optional[Exception]) -> bool:
+        if not jobs:
+            return False
+        try:
+            return bool(await self._requeue(jobs, error))
+        except Exception as e:
+            logger.error(f"Failed to requeue {len(jobs)} remediation job(s): {e}", exc_info=True)
+            return False
+
+    async def _defer(self, runbooks: set):
+        """Hands the pending jobs of runbooks without a free slot to the durable queue."""
+        deferred_jobs = []
+        for runbook in runbooks:
+            deferred_jobs.extend(entry[2] for entry in self._pending.get(runbook, []))
+            self._pending[runbook] = []
+        if not deferred_jobs:
+            return
+        self._pending_count -= len(deferred_jobs)
+        self.deferred += len(deferred_jobs)
+        metrics.increment('scheduler.jobs_deferred', len(deferred_jobs))
+        logger.warning(f"Deferring {len(deferred_jobs)} remediation job(s): no free Automation job slot.")
+        deferred = await self._hand_over(deferred_jobs, None)
+        for job in deferred_jobs:
+            if not job.future.done():
+                job.future.set_result(deferred and job.requeue_on_failure)
+
+    def _release_slot(self, runbook: str):
+        self._active[runbook] = max(0, self._active.get(runbook, 0) - 1)
+        self._active_total = max(0, self._active_total - 1)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _finish(self, job_name: str, status: str):
+        running = self._running.pop(job_name)
+        self._release_slot(running.runbook)
+        self.finished[status] = self.finished.get(status, 0) + 1
+        metrics.increment('scheduler.jobs_finished', runbook=running.runbook, status=status)
+        metrics.observe('scheduler.job_duration_ms', (self._clock() - running.started_at) * 1000.0, runbook=running.runbook)
+        if status != 'completed':
+            logger.warning(f"Automation job '{job_name}' ({running.size} violation(s)) ended with status '{status}'.")
+
+    async def _poll_running(self, runbooks: set):
+        """Polls the runbooks' running jobs and frees the slots of those that finished (or exceeded job_timeout_seconds)."""
+        self._last_poll = self._clock()
+        job_names = [job_name for job_name, running in self._running.items() if running.runbook in runbooks]
+        statuses = await asyncio.gather(*(self._get_job_status(name) for name in job_names), return_exceptions=True)
+        now = self._clock()
+        for job_name, status in zip(job_names, statuses):
+            running = self._running.get(job_name)
+            if running is None:
+                continue
+            if isinstance(status, Exception):
+                logger.error(f"Failed to poll status of Automation job '{job_name}': {status}")
+                status = None
+            status = job_status_name(status) or ''
+            if status in TERMINAL_JOB_STATUSES:
+                self._finish(job_name, status)
+            elif now - running.started_at > self.job_timeout_seconds:
+                self._finish(job_name, 'timedout')
+        if self._wakeup is not None:
+            # Let dispatch schedule the next poll even if no job finished
+            self._wakeup.set()
+
+    def stats(self) -> dict:
+        return {
+            "pending": {runbook: len(queue) for runbook, queue in self._pending.items() if queue},
+            "active": {runbook: count for runbook, count in self._active.items() if count},
+            "startedJobs": self.started_jobs,
+            "startedResources": self.started_resources,
+            "batchedJobs": self.batched_jobs,
+            "failedStarts": self.failed_starts,
+            "deferred": self.deferred,
+            "finished": dict(self.finished)
+        }
+
+
+def create_scheduler(start_job, get_job_status, requeue, runbooks: Dict[str, dict] = None) -> RemediationScheduler:
+    """
+    Builds the scheduler from the runbook settings in routes.json and
+    AUTOMATION_MAX_RUNNING_JOBS (the account's concurrent job quota),
+    SCHEDULER_DEFAULT_MAX_CONCURRENT_JOBS, SCHEDULER_BATCH_LINGER_SECONDS
+    and SCHEDULER_POLL_INTERVAL_SECONDS.
+    """
+    return RemediationScheduler(
+        start_job, get_job_status, requeue, runbooks,
+        default_max_concurrent_jobs=int(os.environ.get('SCHEDULER_DEFAULT_MAX_CONCURRENT_JOBS', '20')),
+        max_running_jobs=int(os.environ.get('AUTOMATION_MAX_RUNNING_JOBS', '200')),
+        batch_linger_seconds=float(os.environ.get('SCHEDULER_BATCH_LINGER_SECONDS', '0.25')),
+        poll_interval_seconds=float(os.environ.get('SCHEDULER_POLL_INTERVAL_SECONDS', '10'))
+    )
@@ -0,0 +1,306 @@
+# azure-governance-guardian/src/functions/policy-processor/state_store.py
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore:
+    """
+    Minimal key/value store with expiring entries, shared by the de-duplication
+    layer and other components that need state across scaled-out instances.
+
+    add() is the only operation that must be atomic: it stores a value only if the
+    key is absent (or its previous entry has expired) and reports whether it won.
+    """
+
+    def add(self, key: str, value: str, ttl_seconds: float) -> bool:
+        raise NotImplementedError
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl_seconds: float = None):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+
+class InMemoryStateStore(StateStore):
+    """Process-local store; used for tests and single-instance deployments."""
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._entries = {}  # key -> (value, expires_at or None)
+        self._lock = threading.Lock()
+
+    def _live(self, key: str):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= self._clock():
+            del self._entries[key]
+            return None
+        return entry
+
+    def add(self, key: str, value: str, ttl_seconds: float) -> bool:
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._entries[key] = (value, self._clock() + ttl_seconds)
+            return True
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._live(key)
+            return entry[0] if entry else None
+
+    def set(self, key: str, value: str, ttl_seconds: float = None):
+        with self._lock:
+            self._entries[key] = (value, self._clock() + ttl_seconds if ttl_seconds else None)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class FileStateStore(StateStore):
+    """
+    One JSON file per key in a local (or shared-mount) directory.
+    Claims use O_CREAT | O_EXCL so concurrent workers on the same filesystem
+    cannot both win the same key. Taking over an expired entry and deleting one
+    happen under a '<entry>.lock' file (also O_EXCL), so a worker that saw the
+    entry expired cannot remove a claim another worker has just written. Locks
+    older than lock_timeout_seconds are left by a crashed worker and are broken.
+    """
+
+    def __init__(self, directory: str, clock: Callable[[], float] = time.time, lock_timeout_seconds: float = 30.0):
+        self.directory = directory
+        self._clock = clock
+        self.lock_timeout_seconds = lock_timeout_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _read(self, path: str) -> Optional[dict]:
+        try:
+            with open(path, encoding='utf-8') as f:
+                record = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        expires_at = record.get('expiresAt')
+        if expires_at is not None and expires_at <= self._clock():
+            return None
+        return record
+
+    def _record(self, key: str, value: str, ttl_seconds: Optional[float]) -> bytes:
+        expires_at = self._clock() + ttl_seconds if ttl_seconds else None
+        return json.dumps({"key": key, "value": value, "expiresAt": expires_at}).encode('utf-8')
+
+    def _claimable(self, path: str) -> bool:
+        """
+        True if the entry has expired or is gone. An unreadable entry is only claimable
+        once older than lock_timeout_seconds: until then it may be a claim whose
+        creator has not written it yet.
+        """
+        try:
+            with open(path, encoding='utf-8') as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return True
+        except ValueError:
+            try:
+                return time.time() - os.path.getmtime(path) > self.lock_timeout_seconds
+            except FileNotFoundError:
+                return True
+        expires_at = record.get('expiresAt')
+        return expires_at is not None and expires_at <= self._clock()
+
+    def _lock(self, path: str, wait: bool) -> bool:
+        """Takes the entry's lock file; without wait, gives up as soon as another worker holds it."""
+        lock_path = path + '.lock'
+        deadline = time.monotonic() + self.lock_timeout_seconds
+        while True:
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600))
+                return True
+            except FileExistsError:
+                pass
+            try:
+                if time.time() - os.path.getmtime(lock_path) > self.lock_timeout_seconds:
+                    logger.warning(f"Breaking stale state store lock {lock_path}.")
+                    os.remove(lock_path)
+                    continue
+            except FileNotFoundError:
+                continue
+            if not wait or time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+
+    def _unlock(self, path: str):
+        try:
+            os.remove(path + '.lock')
+        except FileNotFoundError:
+            pass
+
+    def _create(self, path: str, record: bytes) -> bool:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'wb') as f:
+            f.write(record)
+        return True
+
+    def _replace(self, path: str, record: bytes):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(record)
+        os.replace(tmp_path, path)
+
+    def add(self, key: str, value: str, ttl_seconds: float) -> bool:
+        path = self._path(key)
+        record = self._record(key, value, ttl_seconds)
+        if self._create(path, record):
+            return True
+        if not self._claimable(path):
+            return False
+        # Expired entry. Whoever holds the lock takes it over; a worker that loses
+        # the lock race loses the claim too.
+        if not self._lock(path, wait=False):
+            return False
+        try:
+            if not os.path.exists(path):
+                return self._create(path, record)
+            if not self._claimable(path):
+                return False  # Re-claimed after we first looked
+            self._replace(path, record)
+            return True
+        finally:
+            self._unlock(path)
+
+    def get(self, key: str) -> Optional[str]:
+        record = self._read(self._path(key))
+        return record['value'] if record else None
+
+    def set(self, key: str, value: str, ttl_seconds: float = None):
+        path = self._path(key)
+        self._replace(path, self._record(key, value, ttl_seconds))
+
+    def delete(self, key: str):
+        path = self._path(key)
+        # Under the lock, so an expired-entry takeover never races a delete followed by a new claim
+        locked = self._lock(path, wait=True)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        finally:
+            if locked:
+                self._unlock(path)
+
+
+class TableStateStore(StateStore):
+    """
+    Azure Table Storage backed store, shared by every scaled-out instance.
+    Works against Azurite locally with 'UseDevelopmentStorage=true'.
+    Entities are partitioned by the first two hex digits of the key hash.
+    """
+
+    def __init__(self, connection_string: str, table_name: str, clock: Callable[[], float] = time.time):
+        from azure.data.tables import TableServiceClient
+
+        self._clock = clock
+        service = TableServiceClient.from_connection_string(connection_string)
+        self._table = service.create_table_if_not_exists(table_name)
+
+    @staticmethod
+    def _entity_keys(key: str):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return digest[:2], digest
+
+    def _entity(self, key: str, value: str, ttl_seconds: Optional[float]) -> dict:
+        partition_key, row_key = self._entity_keys(key)
+        return {
+            "PartitionKey": partition_key,
+            "RowKey": row_key,
+            "Key": key,
+            "Value": value,
+            "ExpiresAt": float(self._clock() + ttl_seconds) if ttl_seconds else 0.0
+        }
+
+    def _expired(self, entity) -> bool:
+        expires_at = entity.get('ExpiresAt') or 0.0
+        return bool(expires_at) and expires_at <= self._clock()
+
+    def add(self, key: str, value: str, ttl_seconds: float) -> bool:
+        from azure.core import MatchConditions
+        from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+        from azure.data.tables import UpdateMode
+
+        entity = self._entity(key, value, ttl_seconds)
+        try:
+            self._table.create_entity(entity)
+            return True
+        except ResourceExistsError:
+            pass
+
+        # Key exists; take it over only if it has expired and nobody else beat us to it.
+        try:
+            existing = self._table.get_entity(entity['PartitionKey'], entity['RowKey'])
+            if not self._expired(existing):
+                return False
+            self._table.update_entity(
+                entity,
+                mode=UpdateMode.REPLACE,
+                etag=existing.metadata['etag'],
+                match_condition=MatchConditions.IfNotModified
+            )
+            return True
+        except (ResourceModifiedError, ResourceNotFoundError):
+            return False
+
+    def get(self, key: str) -> Optional[str]:
+        from azure.core.exceptions import ResourceNotFoundError
+
+        partition_key, row_key = self._entity_keys(key)
+        try:
+            entity = self._table.get_entity(partition_key, row_key)
+        except ResourceNotFoundError:
+            return None
+        return None if self._expired(entity) else entity.get('Value')
+
+    def set(self, key: str, value: str, ttl_seconds: float = None):
+        from azure.data.tables import UpdateMode
+
+        self._table.upsert_entity(self._entity(key, value, ttl_seconds), mode=UpdateMode.REPLACE)
+
+    def delete(self, key: str):
+        partition_key, row_key = self._entity_keys(key)
+        self._table.delete_entity(partition_key, row_key)
+
+
+def create_state_store(backend: str = None) -> StateStore:
+    """
+    Builds the state store selected by STATE_STORE_BACKEND ('memory', 'file' or 'table').
+    The table backend defaults to the Function App's own AzureWebJobsStorage account.
+    """
+    backend = (backend or os.environ.get('STATE_STORE_BACKEND', 'memory')).lower()
+    if backend == 'file':
+        directory = os.environ.get('STATE_STORE_DIR', os.path.join(tempfile.gettempdir(), 'azgovguardian-state'))
+        return FileStateStore(directory)
+    if backend == 'table':
+        connection_string = os.environ.get('STATE_STORE_CONNECTION_STRING') or os.environ.get('AzureWebJobsStorage')
+        if not connection_string:
+            raise ValueError("STATE_STORE_BACKEND is 'table' but no STATE_STORE_CONNECTION_STRING or AzureWebJobsStorage is set.")
+        return TableStateStore(connection_string, os.environ.get('STATE_STORE_TABLE_NAME', 'azgovguardianstate'))
+    if backend != 'memory':
+        logger.warning(f"Unknown STATE_STORE_BACKEND '{backend}'. Falling back to in-memory state.")
+    return InMemoryStateStore()
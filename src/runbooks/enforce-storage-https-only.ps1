@@ -1,5 +1,6 @@
-# This PowerShell runbook enables HTTPS-only traffic for a given Azure Storage Account.
-# It expects a JSON payload containing the resource ID of the non-compliant storage account.
+# This PowerShell runbook enables HTTPS-only traffic for one or more Azure Storage Accounts.
+# It expects a JSON payload containing either the resource ID of a non-compliant storage account
+# ("resourceId") or, for batch jobs started by the remediation scheduler, a list of them ("resourceIds").
 # The Automation Account's Managed Identity must have 'Storage Account Contributor' or 'Contributor'
 # role on the scope where the storage account resides.
 
@@ -14,40 +15,65 @@ try {
     # Convert WebhookData (JSON string) to PowerShell object
     $data = ConvertFrom-Json $WebhookData
 
-    $resourceId = $data.resourceId
+    $resourceIds = @()
+    if ($data.resourceId) {
+        $resourceIds += $data.resourceId
+    }
+    if ($data.resourceIds) {
+        $resourceIds += $data.resourceIds
+    }
+    $resourceIds = $resourceIds | Select-Object -Unique
     $policyName = $data.policyName # For logging context
 
-    Write-Output "Processing storage account: $resourceId for HTTPS-only enforcement."
+    if (-not $resourceIds) {
+        Write-Warning "No storage account resource IDs in WebhookData. Exiting."
+        exit
+    }
+
+    Write-Output "Processing $($resourceIds.Count) storage account(s) for HTTPS-only enforcement."
 
     # Connect to Azure using Managed Identity
     Connect-AzAccount -Identity
 
-    # Get the storage account
-    $storageAccount = Get-AzStorageAccount -ResourceId $resourceId -ErrorAction Stop
+    $failed = @()
+    foreach ($resourceId in $resourceIds) {
+        try {
+            # Get the storage account
+            $storageAccount = Get-AzStorageAccount -ResourceId $resourceId -ErrorAction Stop
 
-    if (-not $storageAccount) {
-        Write-Warning "Storage Account $resourceId not found. Exiting."
-        exit
-    }
+            if (-not $storageAccount) {
+                Write-Warning "Storage Account $resourceId not found. Skipping."
+                continue
+            }
 
-    # Check if HTTPS-only is already enabled
-    if ($storageAccount.EnableHttpsTrafficOnly) {
-        Write-Output "Storage Account $resourceId already has HTTPS-only traffic enabled. No action needed."
-        exit
-    }
+            # Check if HTTPS-only is already enabled
+            if ($storageAccount.EnableHttpsTrafficOnly) {
+                Write-Output "Storage Account $resourceId already has HTTPS-only traffic enabled. No action needed."
+                continue
+            }
 
-    Write-Output "Enabling HTTPS-only traffic for Storage Account: $resourceId"
+            Write-Output "Enabling HTTPS-only traffic for Storage Account: $resourceId"
 
-    # Set the property to true
-    Set-AzStorageAccount -ResourceId $resourceId -EnableHttpsTrafficOnly $true -ErrorAction Stop
+            # Set the property to true
+            Set-AzStorageAccount -ResourceId $resourceId -EnableHttpsTrafficOnly $true -ErrorAction Stop
 
-    Write-Output "Successfully enabled HTTPS-only traffic for Storage Account $resourceId."
+            Write-Output "Successfully enabled HTTPS-only traffic for Storage Account $resourceId."
+        } catch {
+            # Keep going so one bad account does not block the rest of a batch
+            Write-Error "Failed to enforce HTTPS-only for Storage Account $($resourceId): $($_.Exception.Message)" -ErrorAction Continue
+            $failed += $resourceId
+        }
+    }
+
+    if ($failed.Count -gt 0) {
+        throw "HTTPS-only enforcement failed for $($failed.Count) of $($resourceIds.Count) storage account(s): $($failed -join ', ')"
+    }
 
 } catch {
-    Write-Error "An error occurred: $($_.Exception.Message)"
+    Write-Error "An error occurred: $($_.Exception.Message)" -ErrorAction Continue
     # You might want to send a failure notification here
     throw $_.Exception # Re-throw to indicate failure in Automation Job
 }
 
 Write-Output "Enforce-Storage-HTTPS-Only Runbook Finished."
-# End of Runbook
\ No newline at end of file
+# End of Runbook
@@ -1,58 +1,120 @@
 # This Python runbook is designed to detach public IP configurations from network interfaces.
-# It expects a JSON payload containing the resource ID of the non-compliant network interface.
+# It expects a JSON payload identifying the non-compliant network interfaces, either:
+#   - "resourceId":  a single network interface resource ID (original single-NIC form)
+#   - "resourceIds": a list of network interface resource IDs
+#   - "resourceGroup" + "subscriptionId": every NIC in a resource group
+#   - "subnetId": every NIC with an IP configuration in a subnet
+# NICs are grouped by subscription and resource group, share one credential and one
+# NetworkManagementClient per subscription, and are updated in parallel (bounded by
+# MAX_PARALLEL_UPDATES). A per-NIC result summary is written to the job output.
 # The Automation Account's Managed Identity must have 'Network Contributor' or 'Contributor'
-# role on the scope where the network interface resides.
+# role on the scope where the network interfaces reside.
 
 import os
 import json
 import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from azure.identity import DefaultAzureCredential
 from azure.mgmt.network import NetworkManagementClient
-from azure.mgmt.resource import ResourceManagementClient
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger()
 
-def get_subscription_id():
-    """Retrieves the subscription ID from environment variables or Azure context."""
-    # In Azure Automation, this might be available as an environment variable
-    # or can be inferred from the context of the managed identity.
-    # For simplicity, we'll assume it's passed or can be derived.
-    # In a real scenario, you might pass it from the Azure Function.
-    subscription_id = os.environ.get('AZURE_SUBSCRIPTION_ID')
-    if not subscription_id:
-        # Fallback for local testing or if not explicitly passed
-        # This requires Azure CLI or environment variables to be set up
-        try:
-            credential = DefaultAzureCredential()
-            # Attempt to get subscription from credential context
-            # This might not work directly in all Automation scenarios
-            # A more robust way is to pass it as a runbook parameter
-            logger.warning("AZURE_SUBSCRIPTION_ID not found in environment. Attempting to infer from credential.")
-            # This is a placeholder. For production, ensure subscription_id is reliably passed.
-            return "YOUR_SUBSCRIPTION_ID_HERE" # <<< IMPORTANT: Replace with actual subscription ID or pass as parameter
-        except Exception as e:
-            logger.error(f"Could not infer subscription ID: {e}")
-            raise Exception("Subscription ID is required.")
-    return subscription_id
+# Maximum number of NIC updates (get + begin_create_or_update + wait) in flight at once
+MAX_PARALLEL_UPDATES = int(os.environ.get('MAX_PARALLEL_UPDATES', '8'))
+
+# Per-NIC result statuses
+STATUS_REMEDIATED = "remediated"
+STATUS_ALREADY_COMPLIANT = "skipped-already-compliant"
+STATUS_NOT_FOUND = "skipped-not-found"
+STATUS_FAILED = "failed"
+
+def parse_resource_id(resource_id):
+    """
+    Splits an ARM resource ID into (subscription_id, resource_group_name, resource_name).
+    '/subscriptions/<sub>/resourceGroups/<rg>/providers/.../<name>'
+    """
+    parts = resource_id.strip('/').split('/')
+    if len(parts) < 4 or parts[0].lower() != 'subscriptions' or parts[2].lower() != 'resourcegroups':
+        raise ValueError(f"Not a resource-group scoped resource ID: {resource_id}")
+    return parts[1], parts[3], parts[-1]
+
+class NetworkClients:
+    """One shared credential and one NetworkManagementClient per subscription for the whole job."""
+
+    def __init__(self):
+        self.credential = DefaultAzureCredential()
+        self._clients = {}
+        self._lock = threading.Lock()
 
-def fix_public_ip_config(resource_id):
+    def get(self, subscription_id):
+        with self._lock:
+            client = self._clients.get(subscription_id.lower())
+            if client is None:
+                client = NetworkManagementClient(self.credential, subscription_id)
+                self._clients[subscription_id.lower()] = client
+            return client
+
+def nic_ids_in_resource_group(clients, subscription_id, resource_group_name):
+    """Lists every network interface ID in a resource group."""
+    network_client = clients.get(subscription_id)
+    return [nic.id for nic in network_client.network_interfaces.list(resource_group_name)]
+
+def nic_ids_in_subnet(clients, subnet_id):
+    """
+    Lists the network interfaces attached to a subnet, derived from the subnet's
+    IP configuration references ('.../networkInterfaces/<nic>/ipConfigurations/<name>').
+    """
+    subscription_id, resource_group_name, subnet_name = parse_resource_id(subnet_id)
+    vnet_name = subnet_id.strip('/').split('/')[-3]
+    subnet = clients.get(subscription_id).subnets.get(resource_group_name, vnet_name, subnet_name)
+
+    nic_ids = []
+    for ip_config in subnet.ip_configurations or []:
+        marker = '/ipconfigurations/'
+        index = ip_config.id.lower().find(marker)
+        if '/networkinterfaces/' in ip_config.id.lower() and index != -1:
+            nic_ids.append(ip_config.id[:index])
+    return list(dict.fromkeys(nic_ids))
+
+def resolve_target_nic_ids(clients, webhook_data):
+    """
+    Expands the WebhookData payload into a de-duplicated list of NIC resource IDs.
+    Raises ValueError for a 'resourceGroup' without its 'subscriptionId'.
+    """
+    nic_ids = []
+    if webhook_data.get('resourceId'):
+        nic_ids.append(webhook_data['resourceId'])
+    nic_ids.extend(webhook_data.get('resourceIds') or [])
+    if webhook_data.get('resourceGroup'):
+        subscription_id = webhook_data.get('subscriptionId')
+        if not subscription_id:
+            raise ValueError(f"'subscriptionId' is required in WebhookData to target resource group '{webhook_data['resourceGroup']}'.")
+        nic_ids.extend(nic_ids_in_resource_group(clients, subscription_id, webhook_data['resourceGroup']))
+    if webhook_data.get('subnetId'):
+        nic_ids.extend(nic_ids_in_subnet(clients, webhook_data['subnetId']))
+
+    unique = {}
+    for nic_id in nic_ids:
+        unique.setdefault(nic_id.lower(), nic_id)
+    return list(unique.values())
+
+def fix_public_ip_config(resource_id, clients=None):
     """
     Detaches public IP configurations from a given network interface.
+    Returns a per-NIC result dict; errors are captured in the result rather than
+    raised so one bad NIC does not stop the rest of a bulk run.
     """
     logger.info(f"Attempting to fix public IP configuration for Network Interface: {resource_id}")
+    result = {"resourceId": resource_id, "status": STATUS_FAILED, "publicIpsDetached": 0}
 
     try:
-        subscription_id = get_subscription_id()
-        credential = DefaultAzureCredential()
-        network_client = NetworkManagementClient(credential, subscription_id)
-        resource_client = ResourceManagementClient(credential, subscription_id)
-
-        # Parse resource ID to get resource group and resource name
-        parts = resource_id.split('/')
-        resource_group_name = parts[4]
-        nic_name = parts[-1]
+        clients = clients or NetworkClients()
+        subscription_id, resource_group_name, nic_name = parse_resource_id(resource_id)
+        network_client = clients.get(subscription_id)
 
         logger.info(f"Resource Group: {resource_group_name}, NIC Name: {nic_name}")
 
@@ -61,23 +123,20 @@ def fix_public_ip_config(resource_id):
 
         if not nic:
             logger.warning(f"Network Interface {resource_id} not found.")
-            return
+            result["status"] = STATUS_NOT_FOUND
+            return result
 
-        updated_ip_configurations = []
         public_ips_detached = 0
-
         for ip_config in nic.ip_configurations:
             if ip_config.public_ip_address:
                 logger.info(f"Detaching Public IP '{ip_config.public_ip_address.id}' from IP configuration '{ip_config.name}'.")
                 ip_config.public_ip_address = None # Detach the public IP
                 public_ips_detached += 1
-            updated_ip_configurations.append(ip_config)
 
         if public_ips_detached > 0:
             logger.info(f"Updating Network Interface {nic_name} with detached Public IPs.")
-            # Update the network interface
-            # Note: The `begin_create_or_update` method returns a poller object.
-            # We need to wait for the operation to complete.
+            # Update the network interface and wait for the long-running operation.
+            # Other NICs are updated concurrently on sibling worker threads.
             poller = network_client.network_interfaces.begin_create_or_update(
                 resource_group_name,
                 nic_name,
@@ -85,33 +144,87 @@ def fix_public_ip_config(resource_id):
             )
             poller.result() # Wait for the operation to finish
             logger.info(f"Successfully detached {public_ips_detached} Public IP(s) from {resource_id}.")
+            result["status"] = STATUS_REMEDIATED
+            result["publicIpsDetached"] = public_ips_detached
         else:
             logger.info(f"No Public IPs found to detach for {resource_id}. Resource already compliant or no public IP.")
+            result["status"] = STATUS_ALREADY_COMPLIANT
 
     except Exception as e:
-        logger.error(f"Error fixing public IP configuration for {resource_id}: {e}", exc_info=True)
-        raise # Re-raise the exception to indicate failure in Automation Job
+        if getattr(e, 'status_code', None) == 404:
+            logger.warning(f"Network Interface {resource_id} not found.")
+            result["status"] = STATUS_NOT_FOUND
+        else:
+            logger.error(f"Error fixing public IP configuration for {resource_id}: {e}", exc_info=True)
+            result["error"] = str(e)
+    return result
+
+def fix_public_ip_configs(resource_ids, clients=None, max_parallel=MAX_PARALLEL_UPDATES):
+    """
+    Remediates many network interfaces with a shared credential/client, grouped by
+    subscription and resource group, running at most max_parallel updates at once.
+    Returns the per-NIC results in input order.
+    """
+    clients = clients or NetworkClients()
+
+    groups = defaultdict(list)
+    invalid_results = {}
+    for resource_id in resource_ids:
+        try:
+            subscription_id, resource_group_name, _ = parse_resource_id(resource_id)
+            groups[(subscription_id.lower(), resource_group_name.lower())].append(resource_id)
+        except ValueError as e:
+            invalid_results[resource_id] = {"resourceId": resource_id, "status": STATUS_FAILED, "publicIpsDetached": 0, "error": str(e)}
+
+    for (subscription_id, resource_group_name), group_ids in groups.items():
+        logger.info(f"Queued {len(group_ids)} Network Interface(s) in resource group '{resource_group_name}' (subscription {subscription_id}).")
+
+    # Submit group by group so updates for one resource group are issued together
+    ordered_ids = [resource_id for group_ids in groups.values() for resource_id in group_ids]
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as executor:
+        results_by_id = dict(zip(ordered_ids, executor.map(lambda rid: fix_public_ip_config(rid, clients), ordered_ids)))
+    results_by_id.update(invalid_results)
+    return [results_by_id[resource_id] for resource_id in resource_ids]
+
+def summarize_results(results):
+    """Counts results per status for the job output."""
+    summary = defaultdict(int)
+    for result in results:
+        summary[result["status"]] += 1
+    return dict(summary)
 
 # Main entry point for Azure Automation Runbook
 if __name__ == "__main__":
     # When run from Azure Automation, WebhookData will be passed as the first argument
     # If testing locally, you can simulate it.
     import sys
+    exit_code = 0
     if len(sys.argv) > 1:
         webhook_data_str = sys.argv[1]
         try:
             webhook_data = json.loads(webhook_data_str)
-            resource_id = webhook_data.get('resourceId')
-            if resource_id:
-                fix_public_ip_config(resource_id)
+            clients = NetworkClients()
+            resource_ids = resolve_target_nic_ids(clients, webhook_data)
+            if resource_ids:
+                results = fix_public_ip_configs(resource_ids, clients)
+                print(json.dumps({"summary": summarize_results(results), "results": results}, indent=2))
+                failed = [r["resourceId"] for r in results if r["status"] == STATUS_FAILED]
+                if failed:
+                    # Fail the Automation job so the failure is visible, after all NICs were attempted
+                    logger.error(f"Failed to remediate {len(failed)} of {len(results)} Network Interface(s): {failed}")
+                    exit_code = 1
             else:
-                logger.error("Missing 'resourceId' in WebhookData payload.")
+                logger.error("No network interfaces to process. Provide 'resourceId', 'resourceIds', 'resourceGroup' or 'subnetId' in WebhookData payload.")
+                exit_code = 1
         except json.JSONDecodeError:
             logger.error(f"Invalid JSON in WebhookData: {webhook_data_str}")
+            exit_code = 1
         except Exception as e:
-            logger.error(f"Runbook execution failed: {e}")
+            logger.error(f"Runbook execution failed: {e}", exc_info=True)
+            exit_code = 1
     else:
         logger.error("No WebhookData provided. This runbook expects a JSON payload via WebhookData parameter.")
+        exit_code = 1
         # Example for local testing:
-        # fix_public_ip_config("/subscriptions/YOUR_SUBSCRIPTION_ID/resourceGroups/YOUR_RG/providers/Microsoft.Network/networkInterfaces/YOUR_NIC_NAME")
-
+        # fix_public_ip_configs(["/subscriptions/YOUR_SUBSCRIPTION_ID/resourceGroups/YOUR_RG/providers/Microsoft.Network/networkInterfaces/YOUR_NIC_NAME"])
+    sys.exit(exit_code)
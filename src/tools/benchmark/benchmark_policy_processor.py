@@ -0,0 +1,455 @@
+# azure-governance-guardian/src/tools/benchmark/benchmark_policy_processor.py
+#
+# Replayable load generator and benchmark for the policy-processor Function.
+# Builds synthetic Event Grid policy events at a configurable mix, replays them
+# through the Function's main() against local fake Resource Graph, Automation and
+# Logic App endpoints (with configurable latency and throttling), and writes
+# machine-readable results that can be diffed between versions.
+#
+# Usage:
+#   python benchmark_policy_processor.py --events 20000 --output results.json
+#   python benchmark_policy_processor.py --events 20000 --compare baseline.json
+#
+# Requires the Function's own dependencies (src/functions/policy-processor/requirements.txt).
+# No Azure credentials are needed: all outbound calls go to the local fakes.
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import os
+import random
+import re
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+REPO_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+FUNCTION_DIR = os.path.join(REPO_ROOT, 'src', 'functions', 'policy-processor')
+
+# Default per-policy mix of NonCompliant events (definition folder name -> weight)
+DEFAULT_POLICY_MIX = {
+    'enforce-mandatory-tags': 0.4,
+    'enforce-allowed-locations': 0.15,
+    'enforce-storage-account-https-only': 0.2,
+    'audit-vm-size-restrictions': 0.15,
+    'deny-public-ip-on-subnets': 0.1,
+}
+
+
+# --- Local fakes ---------------------------------------------------------------
+
+class CallCounter:
+    """Thread-safe counters shared by the fakes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    def add(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + amount
+
+    def get(self, name: str) -> int:
+        with self._lock:
+            return self.counts.get(name, 0)
+
+
+def _http_error(status_code: int, message: str):
+    from azure.core.exceptions import HttpResponseError
+
+    error = HttpResponseError(message=message)
+    error.status_code = status_code
+    return error
+
+
+def _throttled_error(message: str):
+    return _http_error(429, message)
+
+
+class FakeResourceGraphClient:
+    """Answers 'resources | where id in~ (...) [| project ...]' queries from the synthetic resource pool."""
+
+    def __init__(self, counter: CallCounter, latency_ms: float, throttle_rate: float, rng: random.Random):
+        self._counter = counter
+        self._latency = latency_ms / 1000.0
+        self._throttle_rate = throttle_rate
+        self._rng = rng
+        self._lock = threading.Lock()
+
+    def resources(self, request, **kwargs):
+        self._counter.add('resourceGraph')
+        time.sleep(self._latency)
+        with self._lock:
+            throttled = self._rng.random() < self._throttle_rate
+        if throttled:
+            self._counter.add('resourceGraphThrottled')
+            raise _throttled_error("Fake Resource Graph throttled the request.")
+
+        where_clause, _, project_clause = request.query.partition('| project ')
+        columns = [column.partition('=')[0].strip() for column in project_clause.split(',')] if project_clause else None
+        rows = []
+        for resource_id in re.findall(r"'([^']+)'", where_clause):
+            name = resource_id.rsplit('/', 1)[-1]
+            row = {
+                'id': resource_id, 'name': name, 'type': 'microsoft.fake/resources',
+                'resourceGroup': 'rg-bench', 'location': 'eastus', 'tags': {},
+                'properties': {'padding': 'x' * 512}
+            }
+            if columns is not None:
+                # Computed columns ('alias = expression') come back as a short placeholder
+                row = {column: row.get(column, 'fake') for column in columns}
+            rows.append(row)
+        response = type('FakeQueryResponse', (), {})()
+        response.data = rows
+        response.skip_token = None
+        return response
+
+
+class FakeAutomationClient:
+    """
+    Accepts jobs.create() calls and records job names (duplicates are counted);
+    jobs.get() reports a job as Completed job_seconds after it was created.
+    """
+
+    def __init__(self, counter: CallCounter, latency_ms: float, throttle_rate: float, rng: random.Random,
+                 job_seconds: float = 0.2):
+        self._counter = counter
+        self._latency = latency_ms / 1000.0
+        self._throttle_rate = throttle_rate
+        self._rng = rng
+        self._job_seconds = job_seconds
+        self._lock = threading.Lock()
+        self._job_names = {}  # job name -> creation time
+        self.jobs = self
+
+    def create(self, resource_group_name=None, automation_account_name=None, job_name=None, parameters=None, **kwargs):
+        self._counter.add('automation')
+        time.sleep(self._latency)
+        with self._lock:
+            throttled = self._rng.random() < self._throttle_rate
+            duplicate = not throttled and job_name in self._job_names
+            if not throttled and not duplicate:
+                self._job_names[job_name] = time.monotonic()
+        if throttled:
+            self._counter.add('automationThrottled')
+            raise _throttled_error("Fake Automation account throttled the request.")
+        if duplicate:
+            self._counter.add('automationDuplicateJobs')
+        webhook_data = json.loads((parameters or {}).get('WebhookData') or '{}')
+        if webhook_data.get('resourceIds'):
+            self._counter.add('automationBatchJobs')
+            self._counter.add('automationBatchedResources', len(webhook_data['resourceIds']))
+        return self._job(job_name, 'Running')
+
+    def get(self, resource_group_name=None, automation_account_name=None, job_name=None, **kwargs):
+        self._counter.add('automationStatus')
+        time.sleep(self._latency)
+        with self._lock:
+            created = self._job_names.get(job_name)
+        if created is None:
+            raise _http_error(404, f"Fake Automation job '{job_name}' not found.")
+        return self._job(job_name, 'Completed' if time.monotonic() - created >= self._job_seconds else 'Running')
+
+    @staticmethod
+    def _job(job_name, status):
+        job = type('FakeJob', (), {})()
+        job.name = job_name
+        job.id = f"/fake/jobs/{job_name}"
+        job.status = status
+        return job
+
+
+class FakeLogicAppServer:
+    """Local HTTP endpoint standing in for the Logic App trigger."""
+
+    def __init__(self, counter: CallCounter, latency_ms: float, throttle_rate: float, seed: int):
+        latency = latency_ms / 1000.0
+        rng = random.Random(seed)
+        rng_lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                counter.add('logicApp')
+                counter.add('logicAppBytes', len(body))
+                time.sleep(latency)
+                with rng_lock:
+                    throttled = rng.random() < throttle_rate
+                status = 429 if throttled else 202
+                if throttled:
+                    counter.add('logicAppThrottled')
+                else:
+                    payload = json.loads(body or b'{}')
+                    if payload.get('digest'):
+                        counter.add('logicAppDigests')
+                        counter.add('logicAppDigestResources', len(payload.get('resourceIds') or []))
+                self.send_response(status)
+                if throttled:
+                    self.send_header('Retry-After', '1')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}/trigger"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# --- Synthetic events --------------------------------------------------------
+
+def delivery_request(batch: List[dict]):
+    """Builds the HTTP request Event Grid posts to the Function's webhook for one batch."""
+    import azure.functions as func
+
+    return func.HttpRequest(
+        method='POST', url='/api/policy-processor', headers={'Content-Type': 'application/json'},
+        body=json.dumps(batch).encode('utf-8')
+    )
+
+
+def generate_events(count: int, compliant_ratio: float, duplicate_rate: float, policy_mix: Dict[str, float],
+                    resource_pool: int, subscription_id: str, seed: int) -> List[dict]:
+    """Builds a deterministic list of synthetic policy evaluation events."""
+    rng = random.Random(seed)
+    policies = list(policy_mix)
+    weights = [policy_mix[p] for p in policies]
+    events, emitted = [], []
+    for index in range(count):
+        if emitted and rng.random() < duplicate_rate:
+            # At-least-once redelivery / re-evaluation storm: repeat an earlier event verbatim
+            body = dict(rng.choice(emitted), id=str(uuid.UUID(int=rng.getrandbits(128))))
+        else:
+            policy = rng.choices(policies, weights)[0]
+            resource_id = (f"/subscriptions/{subscription_id}/resourceGroups/rg-bench/providers/"
+                           f"Microsoft.Fake/resources/res-{rng.randrange(resource_pool)}")
+            body = {
+                'id': str(uuid.UUID(int=rng.getrandbits(128))),
+                'subject': resource_id,
+                'eventTime': f"2024-01-01T00:{(index // 60) % 60:02d}:{index % 60:02d}Z",
+                'data': {
+                    'policyAssignmentId': f"/subscriptions/{subscription_id}/providers/Microsoft.Authorization/policyAssignments/bench",
+                    'policyDefinitionId': f"/subscriptions/{subscription_id}/providers/Microsoft.Authorization/policyDefinitions/azgovguardian-{policy}",
+                    'complianceState': 'Compliant' if rng.random() < compliant_ratio else 'NonCompliant',
+                    'policyDefinitionEffect': 'audit',
+                    'correlationId': str(uuid.UUID(int=rng.getrandbits(128)))
+                }
+            }
+            emitted.append(body)
+        events.append(body)
+    return events
+
+
+# --- Harness -----------------------------------------------------------------
+
+def load_policy_processor():
+    """
+    Imports the Function package from its folder (the name contains a hyphen) and
+    checks its entry points against function.json the way the Functions worker does.
+    """
+    spec = importlib.util.spec_from_file_location(
+        'policy_processor', os.path.join(FUNCTION_DIR, '__init__.py'), submodule_search_locations=[FUNCTION_DIR]
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['policy_processor'] = module
+    spec.loader.exec_module(module)
+
+    bindings = importlib.import_module('policy_processor.bindings')
+    problems = bindings.check_entry_point_bindings(FUNCTION_DIR, module.main)
+    problems += bindings.check_entry_point_bindings(os.path.join(os.path.dirname(FUNCTION_DIR), 'policy-reconciler'), module.reconcile)
+    if problems:
+        raise RuntimeError(f"The Functions worker would not load the policy processor: {problems}")
+    return module
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def run_benchmark(args) -> dict:
+    counter = CallCounter()
+    rng = random.Random(args.seed)
+    policy_mix = json.loads(args.policy_mix) if args.policy_mix else DEFAULT_POLICY_MIX
+    events = generate_events(args.events, args.compliant_ratio, args.duplicate_rate, policy_mix,
+                             args.resource_pool, args.subscription_id, args.seed)
+    batches = [events[i:i + args.batch_size] for i in range(0, len(events), args.batch_size)]
+
+    with FakeLogicAppServer(counter, args.logic_app_latency_ms, args.logic_app_throttle_rate, args.seed) as logic_app, \
+            tempfile.TemporaryDirectory(prefix='azgovguardian-benchmark-') as state_dir:
+        # The Function reads its configuration from the environment at import time
+        os.environ['LOGIC_APP_HTTP_TRIGGER_URL'] = logic_app.url
+        # Fresh durable state per run, so entries left by an earlier run are not replayed into this one
+        os.environ['RETRY_QUEUE_DIR'] = os.path.join(state_dir, 'retry-queue')
+        os.environ['NOTIFICATION_DIGEST_DIR'] = os.path.join(state_dir, 'digests')
+        os.environ['LOGS_INGESTION_SPOOL_DIR'] = os.path.join(state_dir, 'la-spool')
+        os.environ['SUBSCRIPTION_ID'] = args.subscription_id
+        os.environ.setdefault('STATE_STORE_BACKEND', 'memory')
+        # Poll the fake jobs at a pace that matches their run time, so capped runbooks free their slots
+        os.environ.setdefault('SCHEDULER_POLL_INTERVAL_SECONDS', str(args.automation_job_seconds / 2))
+        os.environ.pop('LOGS_INGESTION_ENDPOINT', None)
+
+        import_started = time.perf_counter()
+        processor = load_policy_processor()
+        import_seconds = time.perf_counter() - import_started
+        logging.getLogger().setLevel(args.log_level)
+
+        processor.clients.set_instance('resource_graph', FakeResourceGraphClient(counter, args.resource_graph_latency_ms, args.resource_graph_throttle_rate, rng))
+        processor.clients.set_instance('automation', FakeAutomationClient(counter, args.automation_latency_ms, args.automation_throttle_rate, rng,
+                                                                         args.automation_job_seconds))
+        if args.stage_metrics:
+            processor.metrics.set_exporter(processor.metrics.InMemoryExporter())
+
+        invocation_latencies = []
+        per_event_latencies = []
+
+        async def invoke(batch):
+            request = delivery_request(batch)
+            started = time.perf_counter()
+            response = await processor.main(request)
+            if response.status_code != 200:
+                raise RuntimeError(f"Webhook rejected the batch with status {response.status_code}.")
+            elapsed = time.perf_counter() - started
+            invocation_latencies.append(elapsed * 1000.0)
+            per_event_latencies.append(elapsed * 1000.0 / len(batch))
+
+        async def replay():
+            # Up to --concurrency invocations in flight, like a warm instance handling overlapping batches
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def bounded(batch):
+                async with semaphore:
+                    await invoke(batch)
+            await asyncio.gather(*(bounded(batch) for batch in batches))
+            # Digests still inside their window are sent as they would be once it closes
+            await processor.flush_notification_digests_async(force=True)
+            await processor.async_io.close()
+
+        started = time.perf_counter()
+        asyncio.run(replay())
+        wall_seconds = time.perf_counter() - started
+
+    outbound = counter.get('resourceGraph') + counter.get('automation') + counter.get('logicApp')
+    results = {
+        "label": args.label,
+        "config": {
+            "events": args.events, "batchSize": args.batch_size, "concurrency": args.concurrency,
+            "compliantRatio": args.compliant_ratio, "duplicateRate": args.duplicate_rate,
+            "resourcePool": args.resource_pool, "policyMix": policy_mix, "seed": args.seed,
+            "latencyMs": {"resourceGraph": args.resource_graph_latency_ms, "automation": args.automation_latency_ms, "logicApp": args.logic_app_latency_ms},
+            "throttleRate": {"resourceGraph": args.resource_graph_throttle_rate, "automation": args.automation_throttle_rate, "logicApp": args.logic_app_throttle_rate}
+        },
+        "metrics": {
+            "wallSeconds": round(wall_seconds, 3),
+            "importSeconds": round(import_seconds, 3),
+            "eventsPerSecond": round(args.events / wall_seconds, 1) if wall_seconds else None,
+            "invocationLatencyMs": {
+                "p50": round(percentile(invocation_latencies, 50), 3),
+                "p95": round(percentile(invocation_latencies, 95), 3),
+                "p99": round(percentile(invocation_latencies, 99), 3),
+                "mean": round(statistics.fmean(invocation_latencies), 3) if invocation_latencies else 0.0
+            },
+            "perEventLatencyMs": {
+                "p50": round(percentile(per_event_latencies, 50), 3),
+                "p95": round(percentile(per_event_latencies, 95), 3),
+                "p99": round(percentile(per_event_latencies, 99), 3)
+            },
+            # ru_maxrss is reported in kilobytes on Linux
+            "peakRssMb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+            "outboundCalls": dict(sorted(counter.counts.items())),
+            "outboundCallsPerEvent": round(outbound / args.events, 4) if args.events else 0.0
+        }
+    }
+    if args.stage_metrics:
+        # Per-stage / per-call histograms and counters recorded by the Function itself
+        results["stageMetrics"] = processor.metrics.snapshot()
+    results["scheduler"] = processor.remediation_scheduler.stats()
+    results["notificationDigest"] = processor.notification_digest.stats()
+    return results
+
+
+def compare_results(current: dict, baseline: dict) -> dict:
+    """Returns the relative change (%) of every numeric metric versus a baseline result."""
+    def flatten(prefix, value, out):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                flatten(f"{prefix}.{key}" if prefix else key, item, out)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[prefix] = value
+        return out
+
+    now, before = flatten('', current['metrics'], {}), flatten('', baseline['metrics'], {})
+    changes = {}
+    for key in sorted(set(now) | set(before)):
+        old, new = before.get(key), now.get(key)
+        changes[key] = {
+            "baseline": old, "current": new,
+            "changePct": round((new - old) / old * 100.0, 2) if old not in (None, 0) and new is not None else None
+        }
+    return changes
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the policy-processor Function against local fake endpoints.")
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--batch-size', type=int, default=100, help="Events per invocation (Event Grid max_events_per_batch).")
+    parser.add_argument('--concurrency', type=int, default=1, help="Invocations in flight at once.")
+    parser.add_argument('--compliant-ratio', type=float, default=0.5)
+    parser.add_argument('--duplicate-rate', type=float, default=0.1, help="Share of events that repeat an earlier event.")
+    parser.add_argument('--policy-mix', help="JSON object of definition name -> weight.")
+    parser.add_argument('--resource-pool', type=int, default=5000, help="Distinct resources events are drawn from.")
+    parser.add_argument('--resource-graph-latency-ms', type=float, default=50.0)
+    parser.add_argument('--automation-latency-ms', type=float, default=100.0)
+    parser.add_argument('--automation-job-seconds', type=float, default=0.2,
+                        help="Time a fake Automation job runs before jobs.get() reports it Completed.")
+    parser.add_argument('--logic-app-latency-ms', type=float, default=30.0)
+    parser.add_argument('--resource-graph-throttle-rate', type=float, default=0.0)
+    parser.add_argument('--automation-throttle-rate', type=float, default=0.0)
+    parser.add_argument('--logic-app-throttle-rate', type=float, default=0.0)
+    parser.add_argument('--subscription-id', default='00000000-0000-0000-0000-000000000000')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--label', default='local', help="Free-form label stored with the results (e.g. a git SHA).")
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--stage-metrics', action='store_true',
+                        help="Record the Function's per-stage spans in memory and include them in the results.")
+    parser.add_argument('--output', help="Write the results JSON to this file.")
+    parser.add_argument('--compare', help="Baseline results JSON to diff against.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = run_benchmark(args)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            results["comparison"] = compare_results(results, json.load(f))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    print(output)
@@ -0,0 +1,460 @@
+# azure-governance-guardian/src/tools/policy-evaluator/policy_evaluator.py
+#
+# Offline, vectorized evaluator for the custom policy definitions in policies/.
+# Compiles each definition's policyRule into NumPy predicates and evaluates them
+# column-wise over chunks of a Resource Graph export (JSONL, one resource per line),
+# so the impact of a policy or assignment change can be measured before rollout.
+#
+# Usage:
+#   python policy_evaluator.py --resources export.jsonl
+#   python policy_evaluator.py --resources export.jsonl --baseline-policy-root /path/to/old/policies
+#   python policy_evaluator.py --resources export.jsonl --output non-compliant.jsonl
+
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import sys
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLICY_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'policies'))
+DEFAULT_CHUNK_SIZE = 50_000
+
+# Every column is a NumPy unicode array, so comparisons run as vectorized string
+# operations. Missing values are stored as '' and tracked in a separate presence
+# mask: NumPy strips trailing NULs, so no sentinel string can tell a missing value
+# from an empty one.
+MISSING = ''
+
+# Resource types that Azure Policy only evaluates in 'All' mode
+NON_INDEXED_TYPES = ('microsoft.resources/subscriptions', 'microsoft.resources/subscriptions/resourcegroups')
+
+# Policy aliases used by our definitions, mapped to Resource Graph document paths.
+# A list means "first path that has a value" (e.g. VM vs. VM scale set SKU).
+# Unlisted '<Namespace>/<type>/<path>' aliases fall back to 'properties.<path>'.
+ALIAS_PATHS = {
+    'microsoft.compute/virtualmachines/sku.name': ['properties.hardwareProfile.vmSize', 'sku.name'],
+    'microsoft.storage/storageaccounts/supportshttpstrafficonly': ['properties.supportsHttpsTrafficOnly'],
+    'microsoft.network/networkinterfaces/ipconfigurations[*].publicipaddress.id': ['properties.ipConfigurations[*].properties.publicIPAddress.id'],
+    'microsoft.network/networkinterfaces/ipconfigurations[*].subnet.id': ['properties.ipConfigurations[*].properties.subnet.id'],
+}
+TOP_LEVEL_FIELDS = {'id', 'name', 'type', 'location', 'kind', 'fullname'}
+
+_PARAMETER_EXPRESSION = re.compile(r"^\[parameters\('([^']+)'\)\]$")
+_TAG_FIELD = re.compile(r"^tags(?:\['(.+)'\]|\[(.+)\]|\.(.+))$", re.IGNORECASE)
+
+
+class UnsupportedConditionError(ValueError):
+    """Raised when a policyRule uses grammar this evaluator does not compile."""
+
+
+# --- Value normalization -----------------------------------------------------
+
+def normalize_value(value) -> str:
+    """
+    Maps a JSON value onto the comparison domain used by every column:
+    strings are lower-cased (policy string comparisons are case-insensitive),
+    booleans become 'true'/'false', integral numbers lose their fraction (so 1
+    and 1.0 compare equal), missing values become MISSING.
+    """
+    if value is None:
+        return MISSING
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, str):
+        return value.lower()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return json.dumps(value, sort_keys=True).lower()
+
+
+def _lookup(obj, key: str):
+    """Case-insensitive dict lookup (aliases and documents disagree on casing)."""
+    if not isinstance(obj, dict):
+        return None
+    if key in obj:
+        return obj[key]
+    lowered = key.lower()
+    for candidate, value in obj.items():
+        if candidate.lower() == lowered:
+            return value
+    return None
+
+
+def get_path(obj, path: str):
+    """Resolves a dotted path (no '[*]') inside a JSON document."""
+    for segment in path.split('.'):
+        obj = _lookup(obj, segment)
+        if obj is None:
+            return None
+    return obj
+
+
+def resolve_field_paths(field: str) -> List[str]:
+    """Maps a policy 'field' (top-level name, tag or alias) to document paths."""
+    lowered = field.lower()
+    if lowered in TOP_LEVEL_FIELDS:
+        return [lowered]
+    tag = _TAG_FIELD.match(field)
+    if tag:
+        return ['tags.' + next(group for group in tag.groups() if group)]
+    if lowered in ALIAS_PATHS:
+        return ALIAS_PATHS[lowered]
+    parts = field.split('/')
+    if len(parts) >= 3:
+        return ['properties.' + '/'.join(parts[2:])]
+    raise UnsupportedConditionError(f"Cannot resolve field '{field}'.")
+
+
+# --- Columnar resource table -------------------------------------------------
+
+class ResourceTable:
+    """
+    A chunk of resources stored column-wise. Each referenced path is extracted
+    once into a normalized NumPy unicode column plus a boolean presence mask and
+    cached; predicates then run as array operations over the whole chunk.
+    """
+
+    def __init__(self, rows: List[dict]):
+        self.rows = rows
+        self.size = len(rows)
+        self._columns: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._elements: Dict[str, Tuple[np.ndarray, 'ResourceTable']] = {}
+
+    def column(self, paths: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (normalized values, presence mask) for the first path that has a value."""
+        key = '|'.join(paths)
+        column = self._columns.get(key)
+        if column is None:
+            values, present = [], []
+            for row in self.rows:
+                value = None
+                for path in paths:
+                    value = get_path(row, path)
+                    if value is not None:
+                        break
+                values.append(normalize_value(value))
+                present.append(value is not None)
+            column = (np.array(values, dtype=str), np.array(present, dtype=bool))
+            self._columns[key] = column
+        return column
+
+    def elements(self, array_path: str) -> Tuple[np.ndarray, 'ResourceTable']:
+        """
+        Flattens the array at array_path across all rows into an element table.
+        Returns (owning row index per element, element table).
+        """
+        cached = self._elements.get(array_path)
+        if cached is None:
+            owners, items = [], []
+            for index, row in enumerate(self.rows):
+                array = get_path(row, array_path)
+                if isinstance(array, list):
+                    for item in array:
+                        owners.append(index)
+                        items.append(item if isinstance(item, dict) else {'': item})
+            cached = (np.array(owners, dtype=np.int64), ResourceTable(items))
+            self._elements[array_path] = cached
+        return cached
+
+
+# --- Compiler ----------------------------------------------------------------
+
+Predicate = Callable[[ResourceTable], np.ndarray]
+
+_STRING_OPERATORS = ('equals', 'notEquals', 'in', 'notIn', 'exists', 'contains', 'notContains')
+_NUMERIC_OPERATORS = ('greater', 'greaterOrEquals', 'less', 'lessOrEquals')
+
+
+def substitute_parameters(value, parameters: dict):
+    """Replaces "[parameters('name')]" expressions with their assigned values."""
+    if isinstance(value, str):
+        match = _PARAMETER_EXPRESSION.match(value)
+        if match:
+            name = match.group(1)
+            if name not in parameters:
+                raise UnsupportedConditionError(f"No value for parameter '{name}'.")
+            return parameters[name]
+        if value.startswith('[') and not value.startswith('[['):
+            raise UnsupportedConditionError(f"Unsupported template expression '{value}'.")
+    return value
+
+
+def _compare(column: Tuple[np.ndarray, np.ndarray], operator: str, operand) -> np.ndarray:
+    """A missing value never equals, is in or contains anything (so it matches the negated operators)."""
+    values, present = column
+    if operator == 'exists':
+        return present if normalize_value(operand) == 'true' else ~present
+    if operator in ('in', 'notIn'):
+        if not isinstance(operand, list):
+            raise UnsupportedConditionError(f"'{operator}' expects an array, got {operand!r}.")
+        mask = np.isin(values, np.array([normalize_value(v) for v in operand], dtype=str)) & present
+        return mask if operator == 'in' else ~mask
+    if operator in ('equals', 'notEquals'):
+        mask = (values == normalize_value(operand)) & present
+        return mask if operator == 'equals' else ~mask
+    if operator in ('contains', 'notContains'):
+        mask = (np.char.find(values, normalize_value(operand)) >= 0) & present
+        return mask if operator == 'contains' else ~mask
+    raise UnsupportedConditionError(f"Unsupported operator '{operator}'.")
+
+
+def _compare_numeric(values: np.ndarray, operator: str, operand) -> np.ndarray:
+    operand = float(operand)
+    if operator == 'greater':
+        return values > operand
+    if operator == 'greaterOrEquals':
+        return values >= operand
+    if operator == 'less':
+        return values < operand
+    return values <= operand
+
+
+def _operator_of(condition: dict, operators: Tuple[str, ...]) -> Optional[str]:
+    found = [op for op in operators if op in condition]
+    if len(found) > 1:
+        raise UnsupportedConditionError(f"Condition has multiple operators: {found}.")
+    return found[0] if found else None
+
+
+def _split_array_path(paths: List[str]) -> Tuple[str, List[str]]:
+    """Splits '[*]' paths into the array path and the element-relative paths."""
+    prefixes = {path.split('[*]', 1)[0] for path in paths}
+    if len(prefixes) != 1 or any('[*]' not in path for path in paths):
+        raise UnsupportedConditionError(f"Count field must reference a single '[*]' array: {paths}.")
+    relative = [path.split('[*]', 1)[1].lstrip('.') for path in paths]
+    return prefixes.pop(), relative
+
+
+def compile_condition(condition: dict, parameters: dict, array_prefix: str = None) -> Predicate:
+    """
+    Compiles a policyRule 'if' condition into a predicate over a ResourceTable.
+    Supports field conditions (equals/notEquals/in/notIn/exists/contains/notContains),
+    allOf/anyOf/not, and field 'count' with an optional 'where'.
+    array_prefix is set while compiling a count's 'where' so '[*]' fields resolve
+    against the element table.
+    """
+    if 'allOf' in condition:
+        parts = [compile_condition(c, parameters, array_prefix) for c in condition['allOf']]
+        return lambda table: np.logical_and.reduce([p(table) for p in parts]) if parts else np.ones(table.size, bool)
+    if 'anyOf' in condition:
+        parts = [compile_condition(c, parameters, array_prefix) for c in condition['anyOf']]
+        return lambda table: np.logical_or.reduce([p(table) for p in parts]) if parts else np.zeros(table.size, bool)
+    if 'not' in condition:
+        inner = compile_condition(condition['not'], parameters, array_prefix)
+        return lambda table: ~inner(table)
+    if 'count' in condition:
+        return _compile_count(condition, parameters)
+    if 'field' in condition:
+        paths = resolve_field_paths(substitute_parameters(condition['field'], parameters))
+        if array_prefix is not None:
+            array_path, paths = _split_array_path(paths)
+            if array_path != array_prefix:
+                raise UnsupportedConditionError(f"Field '{condition['field']}' is outside the counted array.")
+        elif any('[*]' in path for path in paths):
+            raise UnsupportedConditionError(f"Array field '{condition['field']}' outside a count is not supported.")
+        operator = _operator_of(condition, _STRING_OPERATORS)
+        if operator is None:
+            raise UnsupportedConditionError(f"Unsupported field condition: {condition}.")
+        operand = substitute_parameters(condition[operator], parameters)
+        return lambda table: _compare(table.column(paths), operator, operand)
+    raise UnsupportedConditionError(f"Unsupported condition: {condition}.")
+
+
+def _compile_count(condition: dict, parameters: dict) -> Predicate:
+    count = condition['count']
+    if 'field' not in count:
+        raise UnsupportedConditionError("Only field counts are supported (not value counts).")
+    paths = resolve_field_paths(substitute_parameters(count['field'], parameters))
+    array_path, _ = _split_array_path(paths)
+    where = compile_condition(count['where'], parameters, array_path) if 'where' in count else None
+    operator = _operator_of(condition, _NUMERIC_OPERATORS + ('equals', 'notEquals'))
+    if operator is None:
+        raise UnsupportedConditionError(f"Count condition has no comparison: {condition}.")
+    operand = substitute_parameters(condition[operator], parameters)
+
+    def predicate(table: ResourceTable) -> np.ndarray:
+        owners, elements = table.elements(array_path)
+        weights = where(elements).astype(np.float64) if where is not None else None
+        counts = np.bincount(owners, weights=weights, minlength=table.size)[:table.size]
+        if operator == 'equals':
+            return counts == float(operand)
+        if operator == 'notEquals':
+            return counts != float(operand)
+        return _compare_numeric(counts, operator, operand)
+    return predicate
+
+
+def indexed_resources(table: ResourceTable) -> np.ndarray:
+    """Mask of the resources an 'Indexed' mode definition applies to: types that support tags and location."""
+    types, _ = table.column(['type'])
+    locations, has_location = table.column(['location'])
+    return has_location & (locations != '') & ~np.isin(types, np.array(NON_INDEXED_TYPES, dtype=str))
+
+
+def apply_mode(predicate: Predicate, mode: str) -> Predicate:
+    """Restricts a compiled policyRule to the resources its definition's mode evaluates."""
+    mode = (mode or 'All').lower()
+    if mode == 'all':
+        return predicate
+    if mode == 'indexed':
+        return lambda table: predicate(table) & indexed_resources(table)
+    raise UnsupportedConditionError(f"Unsupported mode '{mode}'.")
+
+
+# --- Policy loading ----------------------------------------------------------
+
+class CompiledPolicy:
+    """A policy definition compiled against the parameter values assigned in the initiative."""
+
+    __slots__ = ('name', 'reference_id', 'effect', 'predicate')
+
+    def __init__(self, name: str, reference_id: str, effect: str, predicate: Predicate):
+        self.name = name
+        self.reference_id = reference_id
+        self.effect = effect
+        self.predicate = predicate
+
+
+def load_compiled_policies(policy_root: str) -> List[CompiledPolicy]:
+    """
+    Compiles every definition referenced by the initiatives under policy_root,
+    using the initiative's parameter values (falling back to definition defaults).
+    'Indexed' mode definitions only apply to resources with a location (see
+    indexed_resources()). Definitions with unsupported grammar or a resource
+    provider mode are skipped with a warning.
+    """
+    definitions = {}
+    for path in glob.glob(os.path.join(policy_root, 'custom-definitions', '*', 'policy.json')):
+        with open(path, encoding='utf-8') as f:
+            definitions[os.path.basename(os.path.dirname(path))] = json.load(f)
+
+    compiled = []
+    for path in sorted(glob.glob(os.path.join(policy_root, 'initiatives', '*.json'))):
+        with open(path, encoding='utf-8') as f:
+            initiative = json.load(f)
+        for reference in initiative.get('policyDefinitions', []):
+            name = reference['policyDefinitionId']
+            definition = definitions.get(name)
+            if definition is None:
+                logger.warning(f"Initiative references unknown definition '{name}'. Skipping.")
+                continue
+            parameters = {
+                key: spec.get('defaultValue') for key, spec in definition.get('parameters', {}).items()
+            }
+            parameters.update({key: spec.get('value') for key, spec in reference.get('parameters', {}).items()})
+            rule = definition['policyRule']
+            try:
+                predicate = apply_mode(compile_condition(rule['if'], parameters), definition.get('mode'))
+            except UnsupportedConditionError as e:
+                logger.warning(f"Skipping '{name}': {e}")
+                continue
+            compiled.append(CompiledPolicy(name, reference.get('policyDefinitionReferenceId'), rule['then'].get('effect'), predicate))
+    return compiled
+
+
+# --- Streaming evaluation ----------------------------------------------------
+
+def read_jsonl_chunks(path: str, chunk_size: int) -> Iterator[List[dict]]:
+    """Yields lists of at most chunk_size resources from a JSONL file ('-' for stdin)."""
+    handle = sys.stdin if path == '-' else open(path, encoding='utf-8')
+    try:
+        chunk = []
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            chunk.append(json.loads(line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+def evaluate_chunks(chunks: Iterable[List[dict]], policy_sets: Dict[str, List[CompiledPolicy]]) -> Iterator[Tuple[ResourceTable, Dict[str, Dict[str, np.ndarray]]]]:
+    """
+    Evaluates each chunk against every policy set. Yields (table, masks) where
+    masks[set_name][policy_name] is the boolean non-compliance mask for the chunk.
+    Only one chunk is held in memory at a time.
+    """
+    for rows in chunks:
+        table = ResourceTable(rows)
+        masks = {
+            set_name: {policy.name: policy.predicate(table) for policy in policies}
+            for set_name, policies in policy_sets.items()
+        }
+        yield table, masks
+
+
+def run(resources_path: str, policy_root: str, baseline_policy_root: str = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE, output_path: str = None) -> dict:
+    """Evaluates a resource export and returns per-policy non-compliance counts (and deltas vs. a baseline)."""
+    started = time.perf_counter()
+    policy_sets = {'candidate': load_compiled_policies(policy_root)}
+    if baseline_policy_root:
+        policy_sets['baseline'] = load_compiled_policies(baseline_policy_root)
+
+    counts = {set_name: {p.name: 0 for p in policies} for set_name, policies in policy_sets.items()}
+    effects = {p.name: p.effect for policies in policy_sets.values() for p in policies}
+    evaluated = 0
+    output = open(output_path, 'w', encoding='utf-8') if output_path else None
+    try:
+        for table, masks in evaluate_chunks(read_jsonl_chunks(resources_path, chunk_size), policy_sets):
+            evaluated += table.size
+            for set_name, policy_masks in masks.items():
+                for name, mask in policy_masks.items():
+                    counts[set_name][name] += int(np.count_nonzero(mask))
+            if output is not None:
+                for name, mask in masks['candidate'].items():
+                    for index in np.flatnonzero(mask):
+                        output.write(json.dumps({"resourceId": table.rows[index].get('id'), "policy": name, "effect": effects[name]}) + '\n')
+    finally:
+        if output is not None:
+            output.close()
+
+    policies = {}
+    for name in sorted(set().union(*(c.keys() for c in counts.values()))):
+        entry = {"effect": effects.get(name), "nonCompliant": counts['candidate'].get(name)}
+        if 'baseline' in counts:
+            baseline = counts['baseline'].get(name)
+            entry["baselineNonCompliant"] = baseline
+            entry["delta"] = (entry["nonCompliant"] or 0) - (baseline or 0)
+        policies[name] = entry
+
+    elapsed = time.perf_counter() - started
+    return {
+        "resourcesEvaluated": evaluated,
+        "elapsedSeconds": round(elapsed, 3),
+        "resourcesPerSecond": round(evaluated / elapsed, 1) if elapsed else None,
+        "policies": policies
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate custom policy definitions against a Resource Graph export (JSONL).")
+    parser.add_argument('--resources', required=True, help="JSONL file with one Resource Graph resource per line ('-' for stdin).")
+    parser.add_argument('--policy-root', default=DEFAULT_POLICY_ROOT, help="Folder containing custom-definitions/ and initiatives/.")
+    parser.add_argument('--baseline-policy-root', help="Second policy folder to compare against (e.g. the currently deployed version).")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Resources evaluated per vectorized chunk.")
+    parser.add_argument('--output', help="Optional JSONL file receiving one line per non-compliant (resource, policy) pair.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    summary = run(args.resources, args.policy_root, args.baseline_policy_root, args.chunk_size, args.output)
+    print(json.dumps(summary, indent=2))
@@ -69,6 +69,28 @@ resource "azurerm_function_app" "policy_processor_func" {
     "LOGIC_APP_HTTP_TRIGGER_URL" = var.logic_app_http_trigger_url # Pass Logic App URL for notifications
     "AUTOMATION_ACCOUNT_RESOURCE_GROUP" = var.automation_account_resource_group_name # New: Pass Automation Account's RG name
     "AUTOMATION_ACCOUNT_NAME" = var.automation_account_name # New: Pass Automation Account's name
+    "PROJECT_NAME"            = var.project_name # Prefix of the deployed policy definition names, used for routing
+    "STATE_STORE_BACKEND"     = "table" # Share event de-duplication state across instances via AzureWebJobsStorage
+    "DEDUP_WINDOW_SECONDS"    = "600"
+    "AZURE_CREDENTIAL_KIND"   = "managedidentity" # Skip DefaultAzureCredential's probing chain on cold start
+    "METRICS_EXPORTER"        = "none" # 'otel' exports per-stage latency histograms and counters via OpenTelemetry
+    "RETRY_QUEUE_DIR"         = "/home/data/azgovguardian-retry-queue" # Persistent storage, survives instance recycling
+    "AUTOMATION_MAX_RUNNING_JOBS" = "200" # Remediation scheduler's account-wide cap; match the Automation account's job quota
+    # One Logic App run per (policy, resource group, severity) per window instead of one per violation.
+    # "0" sends every notification immediately; deny-effect policies always bypass the window.
+    "NOTIFICATION_DIGEST_WINDOW_SECONDS" = "300"
+    "NOTIFICATION_DIGEST_DIR" = "/home/data/azgovguardian-notification-digests" # Open digests survive instance recycling
+    # Scheduled reconciliation sweep (policy-reconciler function). Management group scopes
+    # need the Function's identity to have 'Reader' on those management groups.
+    "RECONCILE_SCHEDULE"      = var.reconcile_schedule
+    "RECONCILE_SCOPES"        = var.reconcile_scopes
+    # Direct, batched ingestion into a Log Analytics custom table (Logs Ingestion API).
+    # Leave the endpoint empty to keep logging compliance events as trace lines.
+    # The Function's identity needs 'Monitoring Metrics Publisher' on the DCR.
+    "LOGS_INGESTION_ENDPOINT" = var.logs_ingestion_endpoint
+    "LOGS_INGESTION_DCR_ID"   = var.logs_ingestion_dcr_immutable_id
+    "LOGS_INGESTION_STREAM"   = var.logs_ingestion_stream_name
+    "LOGS_INGESTION_SPOOL_DIR" = "/home/data/azgovguardian-la-spool" # Failed batches survive instance recycling
     # Add other environment variables needed by your function
   }
 
@@ -126,6 +148,12 @@ resource "azurerm_role_assignment" "func_log_analytics_contributor" {
   principal_id         = azurerm_function_app.policy_processor_func.identity[0].principal_id
 }
 
+# Function key used in the Event Grid webhook URL (the HTTP trigger uses authLevel 'function')
+data "azurerm_function_app_host_keys" "policy_processor_keys" {
+  name                = azurerm_function_app.policy_processor_func.name
+  resource_group_name = azurerm_resource_group.func_rg.name
+}
+
 # Event Grid System Topic Subscription for Policy Evaluations
 # This subscribes to events from the Activity Log related to policy evaluations.
 # We'll filter for 'Microsoft.Authorization/policyEvaluations/audit/action' events.
@@ -144,10 +172,14 @@ resource "azurerm_eventgrid_event_subscription" "policy_evaluation_sub" {
   }
 
   # Further filtering can be done within the Azure Function based on 'data.json.effect' etc.
-  azure_function_endpoint {
-    function_id = azurerm_function_app.policy_processor_func.id
-    max_events_per_batch = 10
-    preferred_batch_size_in_kilobytes = 64
+  # Events are delivered to the function's HTTP webhook rather than an Event Grid trigger:
+  # the Python Event Grid binding invokes the function once per event, while the webhook
+  # receives whole batches and enriches them with chunked Resource Graph queries, so
+  # larger batches mean fewer ARM calls. The function answers the validation handshake.
+  webhook_endpoint {
+    url                               = "https://${azurerm_function_app.policy_processor_func.default_hostname}/api/policy-processor?code=${data.azurerm_function_app_host_keys.policy_processor_keys.default_function_key}"
+    max_events_per_batch              = 100
+    preferred_batch_size_in_kilobytes = 256
   }
 
   labels = ["policy-governance"]
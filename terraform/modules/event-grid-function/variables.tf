@@ -62,4 +62,34 @@ variable "automation_account_resource_group_name" {
 variable "automation_account_name" {
   description = "The name of the Automation Account."
   type        = string
-}
\ No newline at end of file
+}
+
+variable "logs_ingestion_endpoint" {
+  description = "Logs ingestion URL of the Data Collection Endpoint used for direct compliance event ingestion. Leave empty to disable."
+  type        = string
+  default     = ""
+}
+
+variable "logs_ingestion_dcr_immutable_id" {
+  description = "Immutable ID of the Data Collection Rule that routes compliance events to the Log Analytics workspace."
+  type        = string
+  default     = ""
+}
+
+variable "logs_ingestion_stream_name" {
+  description = "Stream name declared in the Data Collection Rule for compliance events."
+  type        = string
+  default     = "Custom-PolicyCompliance_CL"
+}
+
+variable "reconcile_schedule" {
+  description = "NCRONTAB schedule of the policy-reconciler timer function that re-reads NonCompliant policy states missed by Event Grid."
+  type        = string
+  default     = "0 0 */6 * * *"
+}
+
+variable "reconcile_scopes" {
+  description = "Comma-separated subscription IDs and/or 'mg:<management group name>' scopes swept by the reconciler. Empty sweeps the Function's own subscription."
+  type        = string
+  default     = ""
+}
@@ -61,7 +61,17 @@ resource "azurerm_logic_app_workflow" "notifier_logic_app" {
               "location" = { "type": "string" },
               "tags" = { "type": "object" },
               "networkInterfaces" = { "type": "array" },
-              "disks" = { "type": "array" }
+              "disks" = { "type": "array" },
+              # Notification digests (one summary per policy / resource group / severity)
+              "digest" = { "type": "boolean" },
+              "policyDisplayName" = { "type": "string" },
+              "severity" = { "type": "string" },
+              "count" = { "type": "integer" },
+              "resourceIds" = { "type": "array" },
+              "windowStart" = { "type": "string" },
+              "windowEnd" = { "type": "string" },
+              "part" = { "type": "integer" },
+              "parts" = { "type": "integer" }
             }
           }
         }
@@ -91,6 +101,8 @@ resource "azurerm_logic_app_workflow" "notifier_logic_app" {
 <p><b>Resource ID:</b> @{triggerBody()?['resourceId']}</p>
 <p><b>Compliance State:</b> <span style='color: @{if(equals(triggerBody()?['complianceState'], 'NonCompliant'), 'red', 'green')}'>@{triggerBody()?['complianceState']}</span></p>
 <p><b>Message:</b> @{triggerBody()?['message']}</p>
+<p><b>Severity:</b> @{triggerBody()?['severity']}</p>
+<p><b>Affected Resources:</b><br>@{join(coalesce(triggerBody()?['resourceIds'], createArray()), '<br>')}</p>
 <br>
 <h4>Resource Details:</h4> \n
 <ul>
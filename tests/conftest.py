@@ -0,0 +1,51 @@
+# azure-governance-guardian/tests/conftest.py
+#
+# The Function package lives in a folder whose name contains a hyphen, so it is
+# imported from its path as 'policy_processor' (as the benchmark does). Settings the
+# package reads at import time point at in-memory / temporary stand-ins.
+
+import atexit
+import importlib
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FUNCTIONS_DIR = os.path.join(REPO_ROOT, 'src', 'functions')
+FUNCTION_DIR = os.path.join(FUNCTIONS_DIR, 'policy-processor')
+
+# Created at import because the package reads these settings when it is loaded,
+# before any fixture (tmp_path_factory included) is available
+_TEST_STATE_DIR = tempfile.mkdtemp(prefix='azgovguardian-tests-')
+atexit.register(shutil.rmtree, _TEST_STATE_DIR, ignore_errors=True)
+os.environ.setdefault('STATE_STORE_BACKEND', 'memory')
+os.environ.setdefault('RETRY_QUEUE_DIR', os.path.join(_TEST_STATE_DIR, 'retry-queue'))
+os.environ.setdefault('NOTIFICATION_DIGEST_DIR', os.path.join(_TEST_STATE_DIR, 'digests'))
+os.environ.pop('LOGS_INGESTION_ENDPOINT', None)
+os.environ.pop('LOGIC_APP_HTTP_TRIGGER_URL', None)
+
+
+def load_policy_processor():
+    module = sys.modules.get('policy_processor')
+    if module is None:
+        spec = importlib.util.spec_from_file_location(
+            'policy_processor', os.path.join(FUNCTION_DIR, '__init__.py'), submodule_search_locations=[FUNCTION_DIR]
+        )
+        module = importlib.util.module_from_spec(spec)
+        sys.modules['policy_processor'] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+def load_submodule(name: str):
+    load_policy_processor()
+    return importlib.import_module(f'policy_processor.{name}')
+
+
+@pytest.fixture(scope='session')
+def processor():
+    return load_policy_processor()
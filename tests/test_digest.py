@@ -0,0 +1,68 @@
+# azure-governance-guardian/tests/test_digest.py
+
+import json
+import os
+import time
+
+from conftest import load_submodule
+
+RESOURCE = "/subscriptions/s/resourceGroups/rg-app/providers/Microsoft.Network/publicIPAddresses/ip{}"
+
+
+def _digest(directory, stale_seconds=600.0, clock=time.time):
+    digest = load_submodule('digest')
+    journal = digest.DigestJournal(str(directory), stale_seconds=stale_seconds, clock=clock)
+    return digest.NotificationDigest(window_seconds=300, journal=journal, clock=clock)
+
+
+def _notify(digest, index):
+    digest.add({"policyName": "deny-public-ip", "resourceId": RESOURCE.format(index), "message": "Public IP found."}, "high")
+
+
+def test_pending_groups_survive_a_recycled_instance(tmp_path):
+    recycled = _digest(tmp_path)
+    for index in range(3):
+        _notify(recycled, index)
+    recycled.save()
+    assert os.path.exists(recycled._journal.path)
+
+    # A fresh journal belongs to a live instance and is left alone
+    survivor = _digest(tmp_path, stale_seconds=60.0)
+    survivor.save()
+    assert survivor.stats()["buffered"] == 0
+
+    later = lambda: time.time() + 120
+    survivor = _digest(tmp_path, stale_seconds=60.0, clock=later)
+    _notify(survivor, 3)
+    survivor.save()
+    assert survivor.stats()["recovered"] == 3
+    assert not os.path.exists(recycled._journal.path)
+    assert [os.path.basename(path) for path in tmp_path.iterdir()] == [os.path.basename(survivor._journal.path)]
+
+    payloads = survivor.take_all()
+    assert len(payloads) == 1
+    assert sorted(payloads[0]["resourceIds"]) == [RESOURCE.format(index) for index in range(4)]
+    survivor.save()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_journal_is_compacted_after_due_groups_are_taken(tmp_path):
+    now = [1000.0]
+    digest = _digest(tmp_path, clock=lambda: now[0])
+    _notify(digest, 1)
+    digest.add({"policyName": "require-tags", "resourceId": RESOURCE.format(2)}, "low")
+    digest.save()
+    with open(digest._journal.path) as f:
+        assert len(f.readlines()) == 2
+
+    now[0] += 301
+    _notify(digest, 3)  # Joins the open, now due, group
+    digest.add({"policyName": "allowed-locations", "resourceId": RESOURCE.format(4)}, "low")
+    assert len(digest.take_due()) == 2
+    digest.save()
+
+    restored = _digest(tmp_path / 'other')
+    with open(digest._journal.path) as f:
+        restored._restore([json.loads(line) for line in f])
+    assert restored.stats()["buffered"] == 1
+    assert restored.take_all()[0]["policyName"] == "allowed-locations"
@@ -0,0 +1,143 @@
+# azure-governance-guardian/tests/test_log_sink.py
+
+import asyncio
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from conftest import load_submodule
+
+
+class IngestionStandIn:
+    """Local HTTP stand-in for the Logs Ingestion endpoint; answers with the queued statuses, then 204."""
+
+    def __init__(self):
+        self.statuses = []
+        self.batches = []
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                status = stand_in.statuses.pop(0) if stand_in.statuses else 204
+                if status < 300:
+                    assert self.headers['Authorization'] == 'Bearer test-token'
+                    assert self.headers['Content-Encoding'] == 'gzip'
+                    stand_in.batches.append(json.loads(gzip.decompress(body)))
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.endpoint = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def stand_in():
+    server = IngestionStandIn()
+    yield server
+    server.server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    rate_limit = load_submodule('rate_limit')
+    monkeypatch.setattr(rate_limit, 'RETRY_BASE_DELAY_SECONDS', 0.01)
+
+
+def _sink(stand_in, tmp_path, clock=None, **kwargs):
+    log_sink = load_submodule('log_sink')
+    settings = dict(max_records=3, max_age_seconds=10.0, max_attempts=2, session_factory=requests.Session)
+    if clock is not None:
+        settings['clock'] = clock
+    settings.update(kwargs)
+    return log_sink.LogAnalyticsSink(stand_in.endpoint, 'dcr-1', 'Custom-PolicyCompliance_CL',
+                                     lambda: 'test-token', str(tmp_path / 'spool'), **settings)
+
+
+def test_full_batches_are_sealed_and_old_records_become_due(stand_in, tmp_path):
+    now = [1000.0]
+    sink = _sink(stand_in, tmp_path, clock=lambda: now[0])
+    for index in range(4):
+        sink.add({"resourceId": f"r{index}"})
+    assert sink.flush_due and sink.seconds_until_due() == 0.0
+
+    sink.flush_if_due()
+    assert [len(batch) for batch in stand_in.batches] == [3]
+    assert not sink.flush_due and sink.seconds_until_due() == 10.0
+
+    now[0] += 10.0
+    assert sink.flush_due
+    sink.flush_if_due()
+    assert stand_in.batches[1] == [{"resourceId": "r3"}]
+    assert sink.seconds_until_due() is None
+
+
+def test_transient_failures_are_retried(stand_in, tmp_path):
+    sink = _sink(stand_in, tmp_path)
+    stand_in.statuses = [503]
+    sink.add({"resourceId": "r1"})
+    sink.flush()
+    assert stand_in.batches == [[{"resourceId": "r1"}]]
+    assert sink.stats()["batchesSpooled"] == 0
+
+
+def test_failed_batches_are_spooled_and_replayed(stand_in, tmp_path):
+    sink = _sink(stand_in, tmp_path)
+    stand_in.statuses = [503, 503]
+    sink.add({"resourceId": "r1"})
+    sink.flush()
+    assert stand_in.batches == []
+    assert len(list((tmp_path / 'spool').glob('*.json.gz'))) == 1
+
+    # A new process sends its own batch first, then replays the spool
+    sink = _sink(stand_in, tmp_path)
+    sink.add({"resourceId": "r2"})
+    sink.flush()
+    assert stand_in.batches == [[{"resourceId": "r2"}], [{"resourceId": "r1"}]]
+    assert list((tmp_path / 'spool').glob('*.json.gz')) == []
+    assert sink.stats()["batchesReplayed"] == 1
+
+
+def test_rejected_batches_are_dead_lettered_and_skipped_on_replay(stand_in, tmp_path):
+    sink = _sink(stand_in, tmp_path, max_records=1)
+    stand_in.statuses = [400, 503, 503, 503, 503]
+    for index in range(3):
+        sink.add({"resourceId": f"r{index}"})
+    sink.flush()
+    assert sink.stats()["batchesDeadLettered"] == 1
+    assert sink.stats()["batchesSpooled"] == 2
+    assert len(list((tmp_path / 'spool' / 'dead-letter').glob('*.json.gz'))) == 1
+
+    # The oldest spooled batch is now rejected; replay moves it aside and carries on
+    sink = _sink(stand_in, tmp_path)
+    stand_in.statuses = [204, 400]
+    sink.add({"resourceId": "r3"})
+    sink.flush()
+    assert stand_in.batches == [[{"resourceId": "r3"}], [{"resourceId": "r2"}]]
+    assert list((tmp_path / 'spool').glob('*.json.gz')) == []
+    assert len(list((tmp_path / 'spool' / 'dead-letter').glob('*.json.gz'))) == 2
+    assert sink.stats()["batchesReplayed"] == 1
+
+
+def test_timer_ships_records_without_another_invocation(processor, stand_in, tmp_path, monkeypatch):
+    sink = _sink(stand_in, tmp_path, max_age_seconds=0.05)
+    monkeypatch.setattr(processor, 'log_sink', sink)
+    monkeypatch.setattr(processor, '_sink_timer', None)
+
+    async def scenario():
+        await processor.process_event_batch([])
+        sink.add({"resourceId": "r1"})
+        processor._arm_sink_timer()
+        await asyncio.sleep(0.5)
+
+    asyncio.run(scenario())
+    assert stand_in.batches == [[{"resourceId": "r1"}]]
@@ -0,0 +1,50 @@
+# azure-governance-guardian/tests/test_policy_evaluator.py
+
+import importlib.util
+import os
+
+import pytest
+
+from conftest import REPO_ROOT
+
+pytest.importorskip('numpy')
+
+
+@pytest.fixture(scope='module')
+def evaluator():
+    path = os.path.join(REPO_ROOT, 'src', 'tools', 'policy-evaluator', 'policy_evaluator.py')
+    spec = importlib.util.spec_from_file_location('policy_evaluator', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _evaluate(evaluator, condition, rows, mode='All'):
+    predicate = evaluator.apply_mode(evaluator.compile_condition(condition, {}), mode)
+    return predicate(evaluator.ResourceTable(rows)).tolist()
+
+
+def test_empty_values_are_present(evaluator):
+    rows = [{"tags": {"env": ""}}, {"tags": {}}, {"tags": {"env": "prod"}}]
+    assert _evaluate(evaluator, {"field": "tags['env']", "exists": "true"}, rows) == [True, False, True]
+    assert _evaluate(evaluator, {"field": "tags['env']", "equals": ""}, rows) == [True, False, False]
+    assert _evaluate(evaluator, {"field": "tags['env']", "notIn": ["prod"]}, rows) == [True, True, False]
+
+
+def test_integral_numbers_compare_equal(evaluator):
+    rows = [{"properties": {"replicas": 1.0}}, {"properties": {"replicas": 1}}, {"properties": {"replicas": 1.5}}]
+    condition = {"field": "Microsoft.Web/sites/replicas", "equals": 1}
+    assert _evaluate(evaluator, condition, rows) == [True, True, False]
+
+
+def test_indexed_mode_skips_resources_without_location(evaluator):
+    rows = [
+        {"type": "microsoft.compute/virtualmachines", "location": "westeurope"},
+        {"type": "microsoft.resources/subscriptions/resourcegroups", "location": "westeurope"},
+        {"type": "microsoft.authorization/roleassignments"},
+    ]
+    condition = {"field": "tags['owner']", "exists": "false"}
+    assert _evaluate(evaluator, condition, rows) == [True, True, True]
+    assert _evaluate(evaluator, condition, rows, mode='Indexed') == [True, False, False]
+    with pytest.raises(evaluator.UnsupportedConditionError):
+        _evaluate(evaluator, condition, rows, mode='Microsoft.KeyVault.Data')
@@ -0,0 +1,84 @@
+# azure-governance-guardian/tests/test_reconcile.py
+
+import asyncio
+
+from conftest import load_submodule
+
+RESOURCE = "/subscriptions/s/resourceGroups/rg/providers/Microsoft.Compute/virtualMachines/vm{}"
+POLICY = "/providers/Microsoft.Authorization/policyDefinitions/deny-public-ip"
+
+
+def _event(models, index, event_time="2026-10-01T10:00:00Z"):
+    return models.PolicyEvent(event_id=f"e{index}", resource_id=RESOURCE.format(index), policy_definition_id=POLICY,
+                              compliance_state=models.NON_COMPLIANT, event_time=event_time, correlation_id=f"c{index}")
+
+
+def test_only_handled_events_are_marked_seen(processor, monkeypatch):
+    models = load_submodule('models')
+    dedup = load_submodule('dedup')
+    store = load_submodule('state_store')
+    coalescer = dedup.EventCoalescer(store.InMemoryStateStore(), window_seconds=600, seen_ttl_seconds=3600)
+    monkeypatch.setattr(processor, 'event_coalescer', coalescer)
+    monkeypatch.setattr(processor, 'get_resource_details_batch', lambda *args: {})
+    monkeypatch.setattr(processor, 'build_policy_actions', lambda event, resource=None: [
+        (processor.RUNBOOK_ACTION, "fix", {}, event.event_id, None)
+    ])
+
+    async def invoke(runbook, parameters, job_key=None, **kwargs):
+        return job_key != "e2"
+    monkeypatch.setattr(processor, 'invoke_automation_runbook_async', invoke)
+
+    handled, failing = _event(models, 1), _event(models, 2)
+    failed = asyncio.run(processor.process_event_batch([handled, failing]))
+
+    assert failed == [failing]
+    assert coalescer.seen_since(handled.resource_id, POLICY, handled.event_time)
+    assert not coalescer.seen_since(failing.resource_id, POLICY, failing.event_time)
+    # The failed event's coalescing claim is released, so its redelivery is processed
+    assert coalescer.admit(failing.resource_id, POLICY, failing.correlation_id)
+    assert not coalescer.admit(handled.resource_id, POLICY, handled.correlation_id)
+
+
+def _reconciler(rows, process_batch, coalescer, now):
+    reconcile = load_submodule('reconcile')
+
+    async def fetch_page(scope, query, skip_token=None):
+        return rows, None
+
+    async def run_blocking(target, func, *args):
+        return func(*args)
+
+    return reconcile.Reconciler(fetch_page, process_batch, coalescer, run_blocking, overlap_seconds=60,
+                                initial_lookback_seconds=3600, clock=lambda: now)
+
+
+def test_watermark_stops_before_the_oldest_failed_state():
+    reconcile = load_submodule('reconcile')
+    dedup = load_submodule('dedup')
+    store = load_submodule('state_store')
+    resource_cache = load_submodule('resource_cache')
+    coalescer = dedup.EventCoalescer(store.InMemoryStateStore(), seen_ttl_seconds=3600)
+    rows = [
+        {"stateId": f"s{index}", "resourceId": RESOURCE.format(index), "policyDefinitionId": POLICY, "timestamp": timestamp}
+        for index, timestamp in enumerate(["2026-10-01T10:00:00Z", "2026-10-01T10:05:00Z", "2026-10-01T10:10:00Z"])
+    ]
+    now = resource_cache.parse_event_time("2026-10-01T10:30:00Z")
+
+    async def process_batch(events):
+        return [event for event in events if event.event_time == "2026-10-01T10:05:00Z"]
+
+    reconciler = _reconciler(rows, process_batch, coalescer, now)
+    scope = reconcile.ReconcileScope("sub-1")
+    result = asyncio.run(reconciler.reconcile_scope(scope))
+
+    assert result["completed"] and result["failed"] == 1
+    failed_at = resource_cache.parse_event_time("2026-10-01T10:05:00Z")
+    watermark = reconciler.load_watermark(scope)
+    assert watermark < failed_at and watermark - reconciler.overlap_seconds < failed_at
+
+    # Once nothing fails the watermark moves on to the newest state
+    async def process_all(events):
+        return []
+    reconciler._process_batch = process_all
+    asyncio.run(reconciler.reconcile_scope(scope))
+    assert reconciler.load_watermark(scope) == resource_cache.parse_event_time("2026-10-01T10:10:00Z")
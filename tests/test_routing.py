@@ -0,0 +1,33 @@
+# azure-governance-guardian/tests/test_routing.py
+
+import json
+import logging
+
+from conftest import load_submodule
+
+DEFINITION_ID = "/subscriptions/s/providers/Microsoft.Authorization/policyDefinitions/{}"
+
+
+def _table(prefix):
+    routing = load_submodule('routing')
+    return routing.load_routing_table(name_prefix=prefix)
+
+
+def test_prefixed_and_suffix_matched_definitions_route():
+    table = _table('azgovguardian')
+    route = table.resolve(DEFINITION_ID.format('azgovguardian-deny-public-ip-on-subnets'))
+    assert route.key == 'deny-public-ip-on-subnets'
+    # Deployed under a different project_name than the Function was told about
+    assert table.resolve(DEFINITION_ID.format('contoso-gov-deny-public-ip-on-subnets')) is route
+    assert table.resolve(DEFINITION_ID.format('unrelated-definition')) is table.default_route
+    assert 'deny-public-ip-on-subnets' not in table.coverage_report()["neverMatched"]
+
+
+def test_coverage_report_is_logged_with_the_invocation_stats(processor, caplog):
+    processor.routing_table.resolve(DEFINITION_ID.format('azgovguardian-enforce-mandatory-tags'))
+    with caplog.at_level(logging.INFO, logger='policy_processor'):
+        processor._log_invocation_stats()
+    reports = [record.getMessage() for record in caplog.records if record.getMessage().startswith("Policy routing coverage: ")]
+    assert len(reports) == 1
+    report = json.loads(reports[0][len("Policy routing coverage: "):])
+    assert 'enforce-mandatory-tags' not in report["neverMatched"]
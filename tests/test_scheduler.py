@@ -0,0 +1,117 @@
+# azure-governance-guardian/tests/test_scheduler.py
+
+import asyncio
+import json
+
+from azure.mgmt.automation.models import Job, JobStatus
+
+from conftest import load_submodule
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeAutomation:
+    """Starts jobs instantly; jobs.get-style status lookups return the SDK's JobStatus enum."""
+
+    def __init__(self):
+        self.started = []
+        self.statuses = {}
+        self.requeued = []
+
+    async def start_job(self, runbook, job_name, parameters):
+        self.started.append((runbook, job_name, json.loads(parameters['WebhookData'])))
+        self.statuses[job_name] = JobStatus.RUNNING
+
+    async def get_job_status(self, job_name):
+        return self.statuses[job_name]
+
+    async def requeue(self, jobs, error):
+        self.requeued.extend(jobs)
+        return True
+
+
+def _scheduler(automation, clock, runbooks, **kwargs):
+    scheduler = load_submodule('scheduler')
+    settings = dict(batch_linger_seconds=0.0, poll_interval_seconds=0.0, clock=clock)
+    settings.update(kwargs)
+    return scheduler.RemediationScheduler(automation.start_job, automation.get_job_status, automation.requeue,
+                                          runbooks, **settings)
+
+
+def _submit(scheduler, runbook, index, priority=None, requeue_on_failure=True):
+    return scheduler.submit(runbook, {"WebhookData": json.dumps({"resourceId": f"r{index}"})}, f"k{index}",
+                            priority, f"r{index}", "policy", requeue_on_failure=requeue_on_failure)
+
+
+def test_job_status_name_uses_the_enum_value():
+    scheduler = load_submodule('scheduler')
+    assert str(JobStatus.COMPLETED) != 'Completed'
+    assert scheduler.job_status_name(JobStatus.COMPLETED) == 'completed'
+    assert scheduler.job_status_name('Failed') == 'failed'
+    assert scheduler.job_status_name(None) is None
+
+
+def test_completed_sdk_status_frees_the_slot():
+    automation, clock = FakeAutomation(), FakeClock()
+    scheduler = _scheduler(automation, clock, {"fix": {"maxConcurrentJobs": 1}})
+
+    async def scenario():
+        assert await _submit(scheduler, "fix", 1) is True
+        # The cap is held by the running first job, so the second one is deferred rather than parked
+        assert await asyncio.wait_for(_submit(scheduler, "fix", 2), timeout=1.0) is True
+        automation.statuses[automation.started[0][1]] = JobStatus.COMPLETED
+        assert await asyncio.wait_for(_submit(scheduler, "fix", 3), timeout=1.0) is True
+
+    asyncio.run(scenario())
+    assert [data["resourceId"] for _, _, data in automation.started] == ["r1", "r3"]
+    assert scheduler.finished == {'completed': 1}
+    assert [job.resource_id for job in automation.requeued] == ["r2"]
+
+
+def test_priority_order_and_batching():
+    automation, clock = FakeAutomation(), FakeClock()
+    scheduler = _scheduler(automation, clock, {
+        "low": {"priority": "low"}, "critical": {"priority": "critical"}, "batched": {"maxBatchSize": 3}
+    }, max_running_jobs=2)
+
+    async def scenario():
+        pending = [_submit(scheduler, "low", 1), _submit(scheduler, "critical", 2)]
+        pending += [_submit(scheduler, "batched", index) for index in range(3, 6)]
+        return await asyncio.wait_for(asyncio.gather(*pending), timeout=1.0)
+
+    assert asyncio.run(scenario()) == [True] * 5
+    assert [runbook for runbook, _, _ in automation.started] == ["critical", "batched"]
+    assert automation.started[1][2]["resourceIds"] == ["r3", "r4", "r5"]
+    assert [job.resource_id for job in automation.requeued] == ["r1"]
+
+
+def test_jobs_without_a_free_slot_are_deferred_without_waiting_for_a_poll():
+    automation, clock = FakeAutomation(), FakeClock()
+    scheduler = _scheduler(automation, clock, {"fix": {"maxConcurrentJobs": 1}}, poll_interval_seconds=3600.0)
+
+    async def scenario():
+        assert await _submit(scheduler, "fix", 1) is True
+        deferred = await asyncio.wait_for(_submit(scheduler, "fix", 2), timeout=1.0)
+        # A retry queue redrive is not re-enqueued; the drain reschedules its entry
+        redrive = await asyncio.wait_for(_submit(scheduler, "fix", 3, requeue_on_failure=False), timeout=1.0)
+        return deferred, redrive
+
+    assert asyncio.run(scenario()) == (True, False)
+    assert [job.resource_id for job in automation.requeued] == ["r2", "r3"]
+    assert scheduler.deferred == 2
+
+
+def test_get_automation_job_status_normalises_the_sdk_enum(processor):
+    class Jobs:
+        def get(self, resource_group_name=None, automation_account_name=None, job_name=None, **kwargs):
+            return Job(status=JobStatus.COMPLETED)
+
+    client = type('FakeAutomationClient', (), {'jobs': Jobs()})()
+    processor.clients.set_instance('automation', client)
+    assert processor.get_automation_job_status('fix-k1') == 'completed'
@@ -0,0 +1,120 @@
+# azure-governance-guardian/tests/test_state_store.py
+
+import os
+import threading
+
+import pytest
+
+from conftest import load_submodule
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(params=['memory', 'file'])
+def store_and_clock(request, tmp_path):
+    state_store = load_submodule('state_store')
+    clock = FakeClock()
+    if request.param == 'memory':
+        return state_store.InMemoryStateStore(clock=clock), clock
+    return state_store.FileStateStore(str(tmp_path), clock=clock), clock
+
+
+def test_add_claims_a_key_until_its_ttl_expires(store_and_clock):
+    store, clock = store_and_clock
+    assert store.add('event:a', 'first', 60)
+    assert not store.add('event:a', 'second', 60)
+    clock.now += 59
+    assert not store.add('event:a', 'second', 60)
+    assert store.get('event:a') == 'first'
+    clock.now += 1
+    assert store.get('event:a') is None
+    assert store.add('event:a', 'second', 60)
+    assert store.get('event:a') == 'second'
+    store.delete('event:a')
+    assert store.add('event:a', 'third', 60)
+
+
+def test_coalescer_window_job_claims_and_seen_markers(store_and_clock):
+    store, clock = store_and_clock
+    dedup = load_submodule('dedup')
+    coalescer = dedup.EventCoalescer(store, window_seconds=600, seen_ttl_seconds=3600)
+
+    assert coalescer.admit('/r/1', 'policy', 'corr-1')
+    assert not coalescer.admit('/R/1', 'POLICY', 'corr-1')  # Keys are case-insensitive
+    assert coalescer.admit('/r/1', 'policy', 'corr-2')
+    clock.now += 600
+    assert coalescer.admit('/r/1', 'policy', 'corr-1')
+    assert coalescer.stats()["coalesced"] == 1
+
+    assert coalescer.claim_job('job-1') and not coalescer.claim_job('job-1')
+    coalescer.release_job('job-1')
+    assert coalescer.claim_job('job-1')
+
+    coalescer.mark_seen('/r/1', 'policy', '2026-10-01T10:00:00Z')
+    assert coalescer.seen_since('/r/1', 'policy', '2026-10-01T10:00:00Z')
+    assert not coalescer.seen_since('/r/1', 'policy', '2026-10-01T10:20:00Z')
+    assert coalescer.seen_since('/r/1', 'policy', '2026-10-01T10:20:00Z', skew_seconds=1200)
+
+
+def test_disabled_window_admits_everything(store_and_clock):
+    store, _ = store_and_clock
+    dedup = load_submodule('dedup')
+    coalescer = dedup.EventCoalescer(store, window_seconds=0)
+    assert coalescer.admit('/r/1', 'policy', 'corr-1') and coalescer.admit('/r/1', 'policy', 'corr-1')
+
+
+def test_expired_file_entry_is_taken_over_by_exactly_one_worker(tmp_path):
+    state_store = load_submodule('state_store')
+    clock = FakeClock()
+    store = state_store.FileStateStore(str(tmp_path), clock=clock)
+
+    for round_number in range(20):
+        key = f"job:{round_number}"
+        assert store.add(key, 'stale', 1)
+        clock.now += 2
+        barrier = threading.Barrier(8)
+        results = []
+
+        def claim(worker):
+            barrier.wait()
+            results.append(store.add(key, f"worker-{worker}", 60))
+
+        threads = [threading.Thread(target=claim, args=(worker,)) for worker in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results.count(True) == 1
+        assert store.get(key) != 'stale'
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(('.lock', '.tmp'))]
+
+
+def test_lock_holder_wins_and_stale_locks_are_broken(tmp_path):
+    state_store = load_submodule('state_store')
+    clock = FakeClock()
+    store = state_store.FileStateStore(str(tmp_path), clock=clock, lock_timeout_seconds=30)
+    assert store.add('event:a', 'stale', 1)
+    clock.now += 2
+    lock_path = store._path('event:a') + '.lock'
+
+    open(lock_path, 'w').close()  # Another worker is taking the entry over
+    assert not store.add('event:a', 'mine', 60)
+    assert os.path.exists(store._path('event:a'))
+
+    os.utime(lock_path, (0, 0))  # Its worker crashed long ago
+    assert store.add('event:a', 'mine', 60)
+    assert store.get('event:a') == 'mine'
+    assert not os.path.exists(lock_path)
+
+
+def test_claim_being_written_is_not_taken_over(tmp_path):
+    state_store = load_submodule('state_store')
+    store = state_store.FileStateStore(str(tmp_path))
+    open(store._path('event:a'), 'w').close()  # Created with O_EXCL, not written yet
+    assert not store.add('event:a', 'mine', 60)
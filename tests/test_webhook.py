@@ -0,0 +1,96 @@
+# azure-governance-guardian/tests/test_webhook.py
+
+import asyncio
+import json
+import os
+from typing import List
+
+import azure.functions as func
+
+from conftest import FUNCTION_DIR, FUNCTIONS_DIR, load_submodule
+
+
+def _request(body, method='POST', headers=None):
+    return func.HttpRequest(method=method, url='/api/policy-processor', headers=headers or {},
+                            body=body if isinstance(body, bytes) else json.dumps(body).encode('utf-8'))
+
+
+def test_entry_points_pass_the_workers_binding_check(processor):
+    bindings = load_submodule('bindings')
+    assert bindings.check_entry_point_bindings(FUNCTION_DIR, processor.main) == []
+    assert bindings.check_entry_point_bindings(os.path.join(FUNCTIONS_DIR, 'policy-reconciler'), processor.reconcile) == []
+
+
+def test_binding_check_rejects_an_event_grid_list_annotation(tmp_path):
+    bindings = load_submodule('bindings')
+    (tmp_path / 'function.json').write_text(json.dumps({
+        "bindings": [{"type": "eventGridTrigger", "name": "events", "direction": "in", "cardinality": "many"}]
+    }))
+
+    async def main(events: List[func.EventGridEvent]):
+        pass
+
+    assert len(bindings.check_entry_point_bindings(str(tmp_path), main)) == 1
+
+
+def test_subscription_validation_event_is_answered(processor):
+    response = asyncio.run(processor.main(_request([{
+        "id": "1", "eventType": processor.SUBSCRIPTION_VALIDATION_EVENT, "data": {"validationCode": "abc"}
+    }])))
+    assert response.status_code == 200
+    assert json.loads(response.get_body()) == {"validationResponse": "abc"}
+
+
+def test_cloudevents_handshake_echoes_the_origin(processor):
+    response = asyncio.run(processor.main(_request(b'', method='OPTIONS', headers={'WebHook-Request-Origin': 'eventgrid.azure.net'})))
+    assert response.status_code == 200
+    assert response.headers['WebHook-Allowed-Origin'] == 'eventgrid.azure.net'
+
+
+def test_invalid_body_is_rejected(processor):
+    assert asyncio.run(processor.main(_request(b'not json'))).status_code == 400
+    assert asyncio.run(processor.main(_request(42))).status_code == 400
+    assert asyncio.run(processor.main(_request("event"))).status_code == 400
+
+
+def test_batch_is_parsed_into_policy_events(processor, monkeypatch):
+    received = []
+
+    async def process_event_batch(events):
+        received.extend(events)
+
+    monkeypatch.setattr(processor, 'process_event_batch', process_event_batch)
+    events = [{
+        "id": str(index), "subject": f"/subscriptions/s/resourceGroups/rg/providers/Microsoft.Storage/storageAccounts/a{index}",
+        "time": "2024-01-01T00:00:00Z",
+        "data": {"policyDefinitionId": "/providers/Microsoft.Authorization/policyDefinitions/x", "complianceState": "NonCompliant"}
+    } for index in range(3)]
+    response = asyncio.run(processor.main(_request(events)))
+    assert response.status_code == 200
+    assert [event.event_id for event in received] == ['0', '1', '2']
+    assert received[0].event_time == "2024-01-01T00:00:00Z"
+    assert received[0].non_compliant
+
+
+def test_failed_redrive_start_reschedules_the_entry_and_releases_its_claim(processor, monkeypatch, tmp_path):
+    retry_queue = load_submodule('retry_queue')
+    queue = retry_queue.RetryQueue(str(tmp_path))
+    monkeypatch.setattr(processor, 'retry_queue', queue)
+
+    class ServiceUnavailable(Exception):
+        status_code = 503
+
+    def start_automation_job(runbook_name, job_name, parameters):
+        raise ServiceUnavailable('Automation is unavailable')
+
+    monkeypatch.setattr(processor, 'start_automation_job', start_automation_job)
+    queue.enqueue(processor.RUNBOOK_RETRY, {
+        "runbook": "Fix-Redrive", "parameters": {"ResourceId": "/r/1"}, "jobKey": "redrive-key"
+    }, "initial failure", delay_seconds=0)
+
+    assert asyncio.run(processor.drain_retry_queue()) == 0
+    assert queue.stats()["completed"] == 0
+    assert queue.stats()["rescheduled"] == 1
+    assert queue.stats()["enqueued"] == 1
+    assert processor.event_coalescer.claim_job("redrive-key")
+    processor.event_coalescer.release_job("redrive-key")